@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+class OrderedNodeSet:
+    """
+    An insertion ordered set of attack graph nodes. AttackGraphNode instances are not
+    hashable, so the nodes are stored in a dictionary keyed by node id, which makes
+    membership tests and adding O(1) instead of scanning a list.
+    """
+
+    def __init__(self, nodes=()):
+        """
+        Parameters:
+        - nodes: An iterable of AttackGraphNode to add.
+        """
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._nodes.values())
+
+    def __contains__(self, node):
+        # A node or a node id.
+        return getattr(node, "id", node) in self._nodes
+
+    def __eq__(self, other):
+        if isinstance(other, OrderedNodeSet):
+            return list(self._nodes) == list(other._nodes)
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"OrderedNodeSet({list(self._nodes)})"
+
+    def add(self, node):
+        """
+        Add a node, if it is not already in the set.
+        """
+        self._nodes.setdefault(node.id, node)
+
+    def update(self, nodes):
+        """
+        Add all nodes of an iterable.
+        """
+        for node in nodes:
+            self.add(node)
+
+    def ids(self):
+        """
+        Get the ids of the nodes in insertion order.
+        """
+        return self._nodes.keys()
+
+def new_path():
+    """
+    Create an empty attack path: a dictionary mapping a node id to the OrderedNodeSet of
+    the nodes it leads to. Only nodes on the path get an entry, so the path grows with
+    the result and not with the attack graph.
+    """
+    return defaultdict(OrderedNodeSet)
+
+def node_record(node, cost, is_horizon_node):
+    """
+    Get the exported record of an attack step in a traversal result.
+
+    Parameters:
+    - node: The AttackGraphNode.
+    - cost: The cost of the attack step, or None.
+    - is_horizon_node: True if the node is in the attacker horizon.
+
+    Returns:
+    - record: A dictionary with the id, name, full_name, type, ttc, is_necessary,
+      is_viable, is_horizon_node and cost of the attack step.
+    """
+    return {
+        "id": node.id,
+        "name": node.name,
+        "full_name": node.full_name,
+        "type": node.type,
+        "ttc": node.ttc,
+        "is_necessary": node.is_necessary,
+        "is_viable": node.is_viable,
+        "is_horizon_node": is_horizon_node,
+        "cost": cost,
+    }
@@ -1,18 +1,25 @@
 import maltoolbox.attackgraph.query
-import maltoolbox
-import maltoolbox.attackgraph.attackgraph
 from maltoolbox.attackgraph import Attacker, AttackGraph, AttackGraphNode
-from py2neo import Node, Relationship
 from collections import deque
-import heapq
 import random
+import threading
 
+import attack_path
 import help_functions
 import constants
+import cost_table
+import exporters
+import heuristics
+import instrumentation
+import monte_carlo
+import neo4j_export
+import shortest_path
+import traversal
+from compiled_graph import CompiledAttackGraph
 
 class AttackSimulation:
     
-    def __init__(self, attackgraph_instance: AttackGraph, attacker: Attacker, use_ttc=True):
+    def __init__(self, attackgraph_instance: AttackGraph, attacker: Attacker, use_ttc=True, rng=None, use_compiled_graph=False, cost_file=constants.COST_FILE, profiler=None):
         """
         Initialize the AttackSimulation instance.
 
@@ -20,6 +27,13 @@ class AttackSimulation:
         - attackgraph_instance: An instance of the AttackGraph class.
         - attacker: An instance of the Attacker class.
         - use_ttc: Boolean indicating whether Time-To-Compromise (TTC) is used. Default is True.
+        - rng: A numpy.random.Generator or seed used to sample the TTC costs. Default is None.
+        - use_compiled_graph: Boolean indicating whether bfs runs on a compiled, array-backed view of
+          the attack graph. dijkstra, random_path and the step by step attack always do. Default is False.
+        - cost_file: The json file, or the cost table (see cost_table.py), with the attack step costs used if use_ttc
+          is False. Default is constants.COST_FILE.
+        - profiler: An instrumentation.Profiler that records the phases and counters of the simulation,
+          or None to not profile it. Default is None.
         """
 
         attacker_node = AttackGraphNode(
@@ -43,15 +57,346 @@ class AttackSimulation:
         self.target_node = None
         self.attacker_cost_budget = None
         self.use_ttc = use_ttc
+        self.rng = rng
+        self.cost_file = cost_file
         self.horizon = []
-        self.visited = []
-        self.path = {node.id: [] for node in attackgraph_instance.nodes}
+        self.visited = attack_path.OrderedNodeSet()
+        self.path = attack_path.new_path()
+        self.profiler = profiler if profiler is not None else instrumentation.DISABLED
+
+        with self.profiler.phase('get_costs'):
+            if not use_ttc and cost_table.is_cost_table(cost_file):
+                # A binary cost table is already keyed by id and is memory-mapped.
+                self.id_to_cost = cost_table.CostTable.load(cost_file)
+            else:
+                full_name_to_cost = self.get_costs()
+                self.id_to_cost = {
+                    attackgraph_instance.get_node_by_full_name(full_name).id: cost
+                    for full_name, cost in full_name_to_cost.items()
+                }
+
+        self.use_compiled_graph = use_compiled_graph
+        self.compiled_graph = None
+        self.shortest_path_result = None
+        self.landmark_heuristic = None
+        # The read-only search core of the compiled graph, and the search state of each thread.
+        self.search_core = None
+        self.search_core_lock = threading.Lock()
+        self.query_states = threading.local()
+        # The query result cache, and the fingerprint of the compiled graph used in its keys.
+        self.query_cache = None
+        self.graph_fingerprint = None
+        if use_compiled_graph:
+            self.compile_graph()
+
+    def compile_graph(self):
+        """
+        Compile the attack graph and the attack step costs into a CompiledAttackGraph.
 
-        full_name_to_cost = self.get_costs()
-        self.id_to_cost = {
-            attackgraph_instance.get_node_by_full_name(full_name).id: cost
-            for full_name, cost in full_name_to_cost.items()
-        }
+        Returns:
+        - compiled_graph: The CompiledAttackGraph instance.
+        """
+        with self.profiler.phase('compile_graph'):
+            self.compiled_graph = CompiledAttackGraph.from_attackgraph(
+                self.attackgraph_instance.nodes, self.id_to_cost
+            )
+        self.landmark_heuristic = None
+        self.search_core = None
+        self.graph_fingerprint = None
+        return self.compiled_graph
+
+    def get_compiled_graph(self):
+        """
+        Get the CompiledAttackGraph, the attack graph is compiled on the first call.
+        """
+        if self.compiled_graph is None:
+            self.compile_graph()
+        return self.compiled_graph
+
+    def get_search_core(self):
+        """
+        Get the shortest_path.SearchCore of the compiled graph, it is built on the first call
+        and shared by all searches and threads.
+        """
+        with self.search_core_lock:
+            if self.search_core is None or self.search_core.graph is not self.compiled_graph:
+                self.search_core = shortest_path.SearchCore(self.get_compiled_graph())
+            return self.search_core
+
+    def query_state(self):
+        """
+        Get the shortest_path.SearchState of the current thread. It is reset in time
+        proportional to the nodes the last search touched, so searches run back-to-back
+        without allocating.
+        """
+        core = self.get_search_core()
+        state = getattr(self.query_states, 'state', None)
+        if state is None or state.core is not core:
+            state = shortest_path.SearchState(core)
+            self.query_states.state = state
+        return state
+
+    def search(self, target_node_id=None, and_cost='sum', heuristic=None, budget=None):
+        """
+        Run a search from the start node with the AND/OR shortest path engine, see
+        shortest_path.shortest_attack_paths. The search does not change the simulation, the
+        attacker or the attack graph, and uses the search state of the current thread, so
+        searches can run back-to-back or on several threads at once. dijkstra, random_path,
+        bfs and reachable_within_budget store their results in self.visited, self.path and
+        self.shortest_path_result, so only this method and the iter_* generators are safe to
+        call from several threads.
+
+        Parameters:
+        - target_node_id: The id of the node where the search stops, or None to search all
+          reachable nodes.
+        - and_cost: 'sum' or 'max', see dijkstra.
+        - heuristic: None, 'reverse' or 'landmarks', see dijkstra. It needs a target node.
+        - budget: The attacker cost budget, or None.
+
+        Returns:
+        - result: A ShortestPathResult.
+        """
+        graph = self.get_search_core().graph
+        target = graph.index(target_node_id) if target_node_id is not None else None
+        with self.profiler.phase('search'):
+            result = shortest_path.shortest_attack_paths(
+                graph, [graph.index(self.start_node)], target, and_cost, self.search_heuristic(target, heuristic),
+                budget, state=self.query_state()
+            )
+        self.profiler.record_search(result)
+        return result
+
+    def search_heuristic(self, target, heuristic):
+        """
+        Get the A* heuristic array of a target index, see search.
+        """
+        if heuristic == 'reverse':
+            return heuristics.reverse_heuristic(self.compiled_graph, target)
+        if heuristic == 'landmarks':
+            if self.landmark_heuristic is None:
+                self.load_landmarks()
+            return self.landmark_heuristic.for_target(target)
+        if heuristic is not None:
+            raise ValueError(f"Unknown heuristic {heuristic!r}, use None, 'reverse' or 'landmarks'")
+        return None
+
+    def iter_search(self, target_node_id=None, and_cost='sum', heuristic=None, budget=None):
+        """
+        Run a search like search, and yield every attack step when its minimal cost is
+        settled, the cheapest first. The settled attack steps are not collected, so the
+        memory is bounded by the search state and the frontier, not by the result, and the
+        caller can stop the search at any time. The search has its own search state, so other
+        searches can run while it is suspended.
+
+        Returns:
+        - events: A generator of (node, cost, parent) tuples, where the parent is the
+          AttackGraphNode the node was reached from, None for the start node. For 'and'
+          nodes it is the necessary parent that was settled last.
+        """
+        core = self.get_search_core()
+        graph = core.graph
+        target = graph.index(target_node_id) if target_node_id is not None else None
+        nodes = self.attackgraph_dictionary
+        node_id = graph.node_id
+        events = shortest_path.iter_attack_paths(
+            graph, [graph.index(self.start_node)], target, and_cost, self.search_heuristic(target, heuristic),
+            budget, state=shortest_path.SearchState(core)
+        )
+        for index, cost, predecessor in events:
+            yield nodes[node_id(index)], cost, nodes[node_id(predecessor)] if predecessor >= 0 else None
+
+    def iter_dijkstra(self, and_cost='sum', heuristic=None):
+        """
+        Yield the attack steps settled by dijkstra until the target node, see iter_search.
+        """
+        return self.iter_search(self.target_node, and_cost, heuristic)
+
+    def iter_reachable_within_budget(self, and_cost='sum'):
+        """
+        Yield the attack steps reachable within the attacker cost budget, the cheapest first,
+        see iter_search and reachable_within_budget.
+        """
+        return self.iter_search(and_cost=and_cost, budget=self.attacker_cost_budget)
+
+    def iter_random_path(self, seed=None):
+        """
+        Yield the attack steps of a random path when they are compromised, see random_path.
+
+        Returns:
+        - events: A generator of (node, cost, parent) tuples, with the total cost of the path
+          so far, the parent is None for the start node.
+        """
+        graph = self.get_compiled_graph()
+        target = graph.index(self.target_node) if self.target_node is not None else None
+        rng = random.Random(seed) if seed is not None else random
+        events = traversal.iter_random_path(graph, graph.index(self.start_node), self.attacker_cost_budget, target, rng)
+        return self.nodes_from_events(events)
+
+    def iter_bfs(self):
+        """
+        Yield the attack steps explored by bfs on the compiled graph, see bfs. An attack step
+        is yielded again for every path that reaches it within the attacker cost budget.
+
+        Returns:
+        - events: A generator of (node, cost, parent) tuples, with the cost of the explored
+          path, the parent is None for the start node.
+        """
+        graph = self.get_compiled_graph()
+        return self.nodes_from_events(traversal.iter_bfs(graph, graph.index(self.start_node), self.attacker_cost_budget))
+
+    def nodes_from_events(self, events):
+        """
+        Turn (index, cost, parent index) events of the compiled graph into (node, cost, parent)
+        events with AttackGraphNode instances.
+        """
+        nodes = self.attackgraph_dictionary
+        node_id = self.compiled_graph.node_id
+        for index, cost, parent in events:
+            yield nodes[node_id(index)], float(cost), nodes[node_id(parent)] if parent >= 0 else None
+
+    def export_events(self, events, exporter, unique=True):
+        """
+        Stream the attack steps of an iter_* generator to an exporter as they come, instead of
+        collecting them in self.visited first.
+
+        With unique, the events give every attack step once, as those of iter_dijkstra,
+        iter_reachable_within_budget and iter_random_path do. Nothing is kept per attack step,
+        and the edges are spooled to a temporary file until the attack steps are written, see
+        exporters.EdgeSpool. The memory of a file export is then bounded by the search state
+        and frontier of the generator. iter_bfs explores attack steps again for every path,
+        export it with unique=False: the ids of the written attack steps and edges are then
+        kept so that each is written once, and the memory grows with the output.
+
+        Parameters:
+        - events: A generator of (node, cost, parent) tuples, e.g. of iter_reachable_within_budget.
+        - exporter: An exporters.ResultExporter instance.
+        - unique: True if the events give every attack step once. Default is True.
+        """
+        if unique:
+            edges = exporters.EdgeSpool()
+            add_edge = edges.add
+        else:
+            exported = set()
+            edges = {}
+
+            def add_edge(from_id, to_id):
+                edges[(from_id, to_id)] = None
+
+        def records():
+            for node, _, parent in events:
+                if parent is not None:
+                    add_edge(parent.id, node.id)
+                if not unique:
+                    if node.id in exported:
+                        continue
+                    exported.add(node.id)
+                yield self.build_node_record(node, False)
+
+        try:
+            with self.profiler.phase('export_results'):
+                exporter.export(records(), edges)
+                self.profiler.count('db_round_trips', exporter.round_trips)
+        finally:
+            if unique:
+                edges.close()
+
+    def set_profiler(self, profiler):
+        """
+        Profile the simulation, see instrumentation.Profiler.
+
+        Parameters:
+        - profiler: An instrumentation.Profiler, or None to stop profiling.
+        """
+        self.profiler = profiler if profiler is not None else instrumentation.DISABLED
+
+    def set_query_cache(self, query_cache):
+        """
+        Cache the results of dijkstra, random_path with a seed and reachable_within_budget.
+
+        Parameters:
+        - query_cache: A query_cache.QueryResultCache, it can be shared by several simulations.
+          None disables the cache.
+        """
+        self.query_cache = query_cache
+
+    def query_cache_key(self, *query):
+        """
+        Get the cache key of a query: the fingerprint of the compiled graph, which changes when
+        the graph is compiled with other costs or defenses, the start node, the entry points
+        and the query.
+        """
+        if self.graph_fingerprint is None:
+            self.graph_fingerprint = self.get_compiled_graph().fingerprint()
+        entry_points = tuple(sorted(node.id for node in self.attackgraph_dictionary[self.start_node].children))
+        return (self.graph_fingerprint, self.start_node, entry_points) + query
+
+    def cached_query(self, query, run):
+        """
+        Run a query that stores its path in self.visited and self.path, or restore the path
+        and the cost from the query cache. A query that sets self.shortest_path_result, like
+        dijkstra, gets it restored too, so path_to_target and cost_frontier read the search
+        of the restored path.
+
+        Parameters:
+        - query: A tuple with the algorithm and the settings the result depends on.
+        - run: A function without arguments that runs the query and returns the cost.
+
+        Returns:
+        - cost: The cost returned by run.
+        """
+        if self.query_cache is None:
+            return run()
+        key = self.query_cache_key(*query)
+        cached = self.query_cache.get(key)
+        nodes = self.attackgraph_dictionary
+        if cached is not None:
+            self.profiler.count('query_cache_hits')
+            cost, visited, edges, result = cached
+            self.visited = attack_path.OrderedNodeSet(nodes[node_id] for node_id in visited)
+            self.path = attack_path.new_path()
+            for parent_id, child_id in edges:
+                self.path[parent_id].add(nodes[child_id])
+            if result is not None:
+                self.shortest_path_result = result
+            return cost
+        previous_result = self.shortest_path_result
+        cost = run()
+        visited = tuple(self.visited.ids())
+        edges = tuple((parent_id, child.id) for parent_id, children in self.path.items() for child in children)
+        size = len(visited) + len(edges)
+        result = self.shortest_path_result if self.shortest_path_result is not previous_result else None
+        if result is not None:
+            size += len(result.touched) if result.touched is not None else result.graph.num_nodes
+        self.query_cache.put(key, (cost, visited, edges, result), size)
+        return cost
+
+    def nodes_from_indices(self, indices):
+        """
+        Get the AttackGraphNode instances of compiled graph indices.
+
+        Parameters:
+        - indices: An iterable of node indices.
+
+        Returns:
+        - nodes: A list of AttackGraphNode.
+        """
+        graph = self.compiled_graph
+        return [self.attackgraph_dictionary[graph.node_id(index)] for index in indices]
+
+    def add_compiled_path(self, visited, edges):
+        """
+        Add a traversal result on the compiled graph to self.visited and self.path.
+
+        Parameters:
+        - visited: The indices of the visited nodes.
+        - edges: The (parent, child) index pairs of the path.
+        """
+        graph = self.compiled_graph
+        nodes = self.attackgraph_dictionary
+        self.visited = attack_path.OrderedNodeSet(self.nodes_from_indices(visited))
+        self.path = attack_path.new_path()
+        for parent, child in edges:
+            self.path[graph.node_id(parent)].add(nodes[graph.node_id(child)])
 
     def set_target_node(self, target_node_id):
         """
@@ -107,15 +452,22 @@ class AttackSimulation:
         Parameters:
         - neo4j_graph_connection: The Neo4j Graph instance.
         """
-        self.horizon = maltoolbox.attackgraph.query.get_attack_surface(self.attacker)
-        self.visited = self.attacker.reached_attack_steps
-
-        # Add all children nodes to the path attribute.     
-        for node in self.attackgraph_instance.nodes:
-            self.path[node.id] = node.children.copy()
-
-        # Upload attacker path and horizon.
-        self.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=True)
+        graph = self.get_compiled_graph()
+        attack_horizon = traversal.AttackHorizon(
+            graph, [graph.index(node.id) for node in self.attacker.reached_attack_steps]
+        )
+        self.horizon = self.nodes_from_indices(attack_horizon)
+        self.visited = attack_path.OrderedNodeSet(self.attacker.reached_attack_steps)
+
+        # Add the children of the visited nodes to the path attribute.
+        for node in self.visited:
+            self.path[node.id] = attack_path.OrderedNodeSet(node.children)
+
+        # Upload attacker path and horizon, later actions only write the changes.
+        neo4j_sync = neo4j_export.Neo4jDiffSync(neo4j_graph_connection)
+        with self.profiler.phase('upload_graph_to_neo4j'):
+            neo4j_sync.upload(*self.build_neo4j_graph(add_horizon=True))
+            self.profiler.count('db_round_trips', neo4j_sync.round_trips)
             
         # Begin step by step attack simulation.
         while True:
@@ -137,16 +489,20 @@ class AttackSimulation:
                 attacked_node = self.attackgraph_dictionary[attacked_node_id]
 
                 # Update horizon if the node can be visited.
-                if attacked_node in self.horizon:
+                attacked_index = graph.index(attacked_node_id)
+                if attacked_index in attack_horizon:
                     # Update the path.
                     self.attacker.compromise(attacked_node)
-                    self.visited = self.attacker.reached_attack_steps
-                    self.horizon = maltoolbox.attackgraph.query.get_attack_surface(self.attacker)
-                    self.horizon = [node for node in self.horizon \
-                        if self.attacker not in node.compromised_by]
+                    added = attack_horizon.compromise(attacked_index)
+                    self.visited.add(attacked_node)
+                    self.path[attacked_node.id] = attack_path.OrderedNodeSet(attacked_node.children)
+                    self.horizon = self.nodes_from_indices(attack_horizon)
                    
-                    # Upload attacker path and horizon.
-                    self.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=True)
+                    # Update attacker path and horizon in Neo4j.
+                    round_trips = neo4j_sync.round_trips
+                    with self.profiler.phase('sync_step_to_neo4j'):
+                        self.sync_step_to_neo4j(neo4j_sync, attacked_node, self.nodes_from_indices(added))
+                        self.profiler.count('db_round_trips', neo4j_sync.round_trips - round_trips)
                     print("Attack step was compromised.")
                 else:
                     print("The node does not exist in the attack surface")
@@ -156,180 +512,320 @@ class AttackSimulation:
                 # Return.
                 return
     
-    def create_neo4j_node(self, neo4j_graph_connection, set_of_nodes, neo4j_node_dict, is_horizon_node=False):
-        for node in set_of_nodes:
-            if not node.id in neo4j_node_dict.keys():
-                asset_and_id = node.full_name.split(':')
-                asset_and_id = asset_and_id[0] + ':' + asset_and_id[1]
-                neo4j_node = Node(
-                    str(asset_and_id),
-                    str(is_horizon_node),
-                    is_horizon_node = is_horizon_node,
-                    name = node.name,
-                    full_name = node.id,
-                    type = node.type,
-                    ttc = str(node.ttc),
-                    cost = str(self.id_to_cost[node.id]) if node.name != "firstSteps" else None,
-                    is_necessary = str(node.is_necessary),
-                    is_viable = str(node.is_viable),
-                )
-                neo4j_graph_connection.create(neo4j_node)
-                neo4j_node_dict[node.id] = neo4j_node
-        return neo4j_node_dict
-        
-    def upload_graph_to_neo4j(self, neo4j_graph_connection, add_horizon=False):
+    def upload_graph_to_neo4j(self, neo4j_graph_connection, add_horizon=False, batch_size=neo4j_export.NEO4J_BATCH_SIZE):
         """
         Uploads the traversed path and attacker horizon (optional) by the attacker to the Neo4j database.
+        The nodes and relationships are written in batches, see neo4j_export.Neo4jBatchExporter.
 
         Parameters:
         - neo4j_graph_connection: The Neo4j Graph instance.
         - add_horizon: Flag which if True, adds on the horizon to Neo4j.
+        - batch_size: The number of nodes or relationships written per statement.
+        """
+        with self.profiler.phase('upload_graph_to_neo4j'):
+            self.export_results(exporters.Neo4jExporter(neo4j_graph_connection, batch_size), add_horizon)
+
+    def export_results(self, exporter, add_horizon=False):
+        """
+        Write the traversed path and attacker horizon (optional) with an exporter, e.g. to
+        Neo4j or to JSON Lines, GraphML or Parquet files, see exporters.py.
+
+        Parameters:
+        - exporter: An exporters.ResultExporter instance.
+        - add_horizon: Flag which if True, adds on the horizon.
 
         Notes:
         - The function assumes the existence of the following variables:
-            - self.visited: A list of visited nodes.
+            - self.visited: An OrderedNodeSet of visited nodes.
             - self.horizon: A list of horizon nodes.
-            - self.attackgraph_dictionary: A dictionary representing the attack graph.
-            - self.path: A dictionary containing the path.
+            - self.path: A dictionary mapping node ids to the OrderedNodeSet of nodes they lead to.
         """
-        
-        nodes = {}
-        neo4j_graph_connection.delete_all()
-       
-       # Build attack steps for Neo4j from all visited nodes.
-        nodes = self.create_neo4j_node(neo4j_graph_connection, self.visited, nodes)
-        if self.horizon and add_horizon:
-            nodes = self.create_neo4j_node(neo4j_graph_connection, self.horizon, nodes, is_horizon_node=True)
-
-        # Add edges to the attack graph in Neo4j.
-        for id in self.attackgraph_dictionary.keys():
-            if id in nodes.keys():
-                for link in self.path[id]:
-                    if link.id in nodes.keys():
-                        from_node = nodes[id]
-                        to_node = nodes[link.id]
-                        if (from_node['is_horizon_node'] == False and to_node['is_horizon_node'] == False) or \
-                        (from_node['is_horizon_node'] == False and to_node['is_horizon_node'] == True):
-                            relationship = Relationship(from_node, "Relationship", to_node)
-                            neo4j_graph_connection.create(relationship)
+        with self.profiler.phase('export_results'):
+            exporter.export(self.iter_result_nodes(add_horizon), self.iter_result_edges(add_horizon))
+            self.profiler.count('db_round_trips', exporter.round_trips)
+
+    def result_horizon(self, add_horizon):
+        """
+        Get the horizon nodes of the result that are not visited, as a dictionary {id: node}.
+        """
+        if not add_horizon:
+            return {}
+        return {node.id: node for node in self.horizon if node not in self.visited}
+
+    def build_node_record(self, node, is_horizon):
+        """
+        Build the exported record of an attack step, see attack_path.node_record.
+        """
+        cost = self.id_to_cost[node.id] if node.name != "firstSteps" else None
+        return attack_path.node_record(node, cost, is_horizon)
+
+    def iter_result_nodes(self, add_horizon=False):
+        """
+        Generate the records of all visited nodes, and the horizon nodes (optional).
+        """
+        for node in self.visited:
+            yield self.build_node_record(node, False)
+        for node in self.result_horizon(add_horizon).values():
+            yield self.build_node_record(node, True)
+
+    def iter_result_edges(self, add_horizon=False):
+        """
+        Generate the (from id, to id) path edges that start in a visited node and end in
+        a visited node, or a horizon node (optional).
+        """
+        horizon = self.result_horizon(add_horizon)
+        for node in self.visited:
+            for link in self.path.get(node.id, ()):
+                if link in self.visited or link.id in horizon:
+                    yield (node.id, link.id)
+
+    def build_neo4j_node(self, node_id, is_horizon):
+        """
+        Build the Neo4j node of an attack step.
+
+        Parameters:
+        - node_id: The id of the attack step.
+        - is_horizon: True if the attack step is in the attacker horizon.
+
+        Returns:
+        - node: A (key, labels, properties) tuple, see neo4j_export.Neo4jBatchExporter.
+        """
+        record = self.build_node_record(self.attackgraph_dictionary[node_id], is_horizon)
+        return (node_id, neo4j_export.record_labels(record), neo4j_export.record_properties(record))
+
+    def build_neo4j_graph(self, add_horizon=False):
+        """
+        Build the Neo4j nodes and relationships of the traversed path and attacker horizon (optional).
+
+        Parameters:
+        - add_horizon: Flag which if True, adds on the horizon.
+
+        Returns:
+        - nodes: A list of (key, labels, properties) tuples.
+        - edges: A list of (from key, to key) tuples.
+        """
+        nodes = [
+            (record["id"], neo4j_export.record_labels(record), neo4j_export.record_properties(record))
+            for record in self.iter_result_nodes(add_horizon)
+        ]
+        return nodes, list(self.iter_result_edges(add_horizon))
+
+    def sync_step_to_neo4j(self, neo4j_sync, attacked_node, added_nodes):
+        """
+        Write the changes of one step by step action to Neo4j: the attacked node leaves the
+        horizon, the nodes it enabled join the horizon, and the new path edges are added.
+        The work is proportional to the changed nodes, not to the size of the path.
+
+        Parameters:
+        - neo4j_sync: The neo4j_export.Neo4jDiffSync the path and horizon were uploaded with.
+        - attacked_node: The compromised AttackGraphNode.
+        - added_nodes: The AttackGraphNodes that were added to the horizon.
+        """
+        added_ids = {node.id for node in added_nodes}
+        nodes = [self.build_neo4j_node(attacked_node.id, False)]
+        nodes.extend(self.build_neo4j_node(node_id, True) for node_id in added_ids)
+
+        # Edges start in visited nodes: the attacked node, or the visited parents of the new horizon nodes.
+        edges = [
+            (attacked_node.id, link.id) for link in self.path[attacked_node.id]
+            if link.id in added_ids or link.id in neo4j_sync.nodes
+        ]
+        for node in added_nodes:
+            for parent in node.parents:
+                uploaded = neo4j_sync.nodes.get(parent.id)
+                if parent.id == attacked_node.id or (uploaded and not uploaded[1]["is_horizon_node"]):
+                    edges.append((parent.id, node.id))
+        neo4j_sync.update(nodes, edges)
     
-    def dijkstra(self):
+    def dijkstra(self, and_cost='sum', heuristic=None):
         """
-        Find the shortest path between two nodes using Dijkstra's algorithm with added 
-        conditions for processing 'and' nodes.
+        Find the shortest path from the start node to the target node with the AND/OR
+        shortest path engine, see shortest_path.shortest_attack_paths. An 'and' node is
+        only added to the path when all of its necessary parents are reached.
         Note: mal-toolbox attack surface is not used in this function!
-        
+
+        Parameters:
+        - and_cost: 'sum' or 'max', how the costs of the necessary parents of an 'and' node are combined
+          when searching. Default is 'sum'.
+        - heuristic: None for a Dijkstra search, or 'reverse' or 'landmarks' for an A* search with
+          the heuristic of heuristics.reverse_heuristic or the landmark tables of load_landmarks.
+          The number of expanded nodes is in self.shortest_path_result.expanded.
+
         Returns:
-        - cost: Total cost of the path.
+        - cost: Total cost of the path, 0 if the target node can not be reached or is not set.
+          Without a target node the search settles every reachable node, see compute_attack_costs.
+        """
+        def run():
+            if self.target_node is None:
+                self.shortest_path_result = self.search(and_cost=and_cost)
+                self.visited = attack_path.OrderedNodeSet()
+                self.path = attack_path.new_path()
+                return 0
+            self.shortest_path_result = self.search(self.target_node, and_cost, heuristic)
+            return self.path_to_target(self.target_node)
+
+        with self.profiler.phase('dijkstra'):
+            return self.cached_query(('dijkstra', self.target_node, and_cost, heuristic), run)
+
+    def load_landmarks(self, model_file=None, num_landmarks=8):
         """
-        node_ids = list(self.attackgraph_dictionary.keys())
-        open_set = []
-        heapq.heappush(open_set, (0, self.start_node))
-        came_from = {key: [] for key in node_ids}
+        Build the landmark tables used by dijkstra(heuristic='landmarks'). If a model file is
+        given, the tables are cached next to it and loaded from there while the compiled
+        graph is unchanged.
 
-        # The g_score is a map with large values.
-        g_score = dict.fromkeys(node_ids, 10000)
-        g_score[self.start_node] = 0
+        Parameters:
+        - model_file: The model file name, or None to not cache the tables.
+        - num_landmarks: The number of landmarks. Default is 8.
 
-        # Estimated score between each node and target.
-        h_score = dict.fromkeys(node_ids, 0)
-    
-        # For node n, f_score[n] = g_score[n] + h_score(n). f_score[n] represents our current best guess as to
-        # how cheap a path could be from start to finish if it goes through n.
-        f_score = dict.fromkeys(node_ids, 0)
-        f_score[self.start_node] = h_score[self.start_node]
-        
-        costs = self.id_to_cost
-        costs_copy = costs.copy()
-        current_node = self.start_node
-        while len(open_set) > 0:
-            # The current_node is the node in open_set having the lowest f_score value.
-            _, current_node = heapq.heappop(open_set)
-
-            # Stop when target node is found.
-            if current_node == self.target_node:
-                self.id_to_cost = costs_copy
-                return self.reconstruct_path(came_from, current_node, costs_copy)[0]
-
-            # Iterate over the attack surface nodes.
-            current_neighbors = self.attackgraph_dictionary[current_node].children
-            for neighbor in current_neighbors:
-                tentative_g_score = g_score[current_node] + costs[neighbor.id]
-
-                # Try the neighbor node with a lower g_score than the previous node.
-                if tentative_g_score < g_score[neighbor.id]:
-
-                    # Add the node to the path.
-                    if maltoolbox.attackgraph.query.is_node_traversable_by_attacker(neighbor, self.attacker):
-                        came_from[neighbor.id].append(current_node)
-                        g_score[neighbor.id] = tentative_g_score
-                        f_score[neighbor.id] = tentative_g_score + h_score[neighbor.id] # TODO calculate the h_score for all nodes
-                        self.attacker.compromise(neighbor)
-                        if neighbor.id not in open_set:
-                            heapq.heappush(open_set, (f_score[neighbor.id], neighbor.id))
-
-                    # If 'and' node was not added to the path,
-                    # update the node cost and keep track of the path.
-                    elif neighbor.type == 'and':
-                        costs[neighbor.id] = tentative_g_score
-                        came_from[neighbor.id].append(current_node)
-
-                # If a necessary 'and' node was not added to the path and g_scores are equal,
-                # update the node cost and keep track of the path.
-                elif neighbor.type == 'and' and self.attackgraph_dictionary[current_node].is_necessary == True:
-                    costs[neighbor.id] = tentative_g_score
-                    came_from[neighbor.id].append(current_node)
-        return 0
-
-    def reconstruct_path(self, came_from, current, costs):
-        """
-        Reconstructs the backwards attack path from the start node to the given node with recursion.
-
-        This method is used in the context of a Djikstra's algorithm to reconstruct
-        the optimal path from the target node to the start node, considering a set
-        of costs associated with each node in the path.
+        Returns:
+        - landmark_heuristic: The heuristics.LandmarkHeuristic instance.
+        """
+        graph = self.get_compiled_graph()
+        if model_file is None:
+            self.landmark_heuristic = heuristics.LandmarkHeuristic.build(graph, num_landmarks)
+        else:
+            self.landmark_heuristic = heuristics.LandmarkHeuristic.load_or_build(
+                graph, model_file + heuristics.LANDMARK_CACHE_SUFFIX, num_landmarks
+            )
+        return self.landmark_heuristic
+
+    def compute_attack_costs(self, and_cost='sum'):
+        """
+        Compute the minimal attacker cost of every reachable attack step with one search from
+        the start node. The search result is kept, so that path_to_target can get the path to
+        any target afterwards without searching again.
 
         Parameters:
-        - came_from: A dictionary mapping nodes to their predecessors in the optimal path.
-        - current: The node for which the path needs to be reconstructed.
+        - and_cost: 'sum' or 'max', see dijkstra.
+
+        Returns:
+        - costs: A dictionary mapping the ids of all reachable attack steps to their minimal cost.
+        """
+        self.shortest_path_result = self.search(and_cost=and_cost)
+        return self.shortest_path_result.costs_by_id()
+
+    def cost_frontier(self, and_cost='sum'):
+        """
+        Compute the minimal attacker cost of every reachable attack step once, and get the
+        cost frontier that answers which attack steps are reachable for any budget, see
+        shortest_path.CostFrontier. This replaces one bfs or reachable_within_budget call
+        per budget in budget sweeps.
+
+        Parameters:
+        - and_cost: 'sum' or 'max', see dijkstra.
+
+        Returns:
+        - frontier: A CostFrontier of the compiled graph node indices.
+        """
+        result = self.shortest_path_result
+        graph = self.get_compiled_graph()
+        if result is None or not result.is_complete or result.and_cost != and_cost or \
+                result.sources != [graph.index(self.start_node)]:
+            self.compute_attack_costs(and_cost)
+        return self.shortest_path_result.cost_frontier()
+
+    def budget_sweep(self, budgets, and_cost='sum'):
+        """
+        Get the attack steps reachable within each of a list of budgets, following the
+        attack graph logic like reachable_within_budget, with a single search.
+
+        Parameters:
+        - budgets: A list of attacker cost budgets.
+        - and_cost: 'sum' or 'max', see dijkstra.
+
+        Returns:
+        - reachable: A dictionary mapping each budget to the list of the ids of the
+          reachable attack steps, the cheapest first.
+        """
+        frontier = self.cost_frontier(and_cost)
+        node_ids = self.get_compiled_graph().node_ids
+        return {budget: node_ids[frontier.reachable(budget)].tolist() for budget in budgets}
+
+    def path_to_target(self, target_node_id):
+        """
+        Reconstruct the shortest path to a target from the last search of dijkstra or
+        compute_attack_costs, and store it in self.visited and self.path. If the last search
+        stopped at another target, dijkstra is run for this target instead.
+
+        Parameters:
+        - target_node_id: The id of the target node.
+
+        Returns:
+        - cost: Total cost of the path, 0 if the target node can not be reached.
+        """
+        graph = self.get_compiled_graph()
+        target = graph.index(target_node_id)
+        start = graph.index(self.start_node)
+        result = self.shortest_path_result
+        if result is None or result.sources != [start] or \
+                (not result.is_complete and result.target != target):
+            self.set_target_node(target_node_id)
+            return self.dijkstra(result.and_cost if result is not None else 'sum')
+
+        self.visited = attack_path.OrderedNodeSet()
+        self.path = attack_path.new_path()
+        if not result.is_reached(target):
+            return 0
+        if target_node_id == self.start_node:
+            self.visited.add(self.attackgraph_dictionary[self.start_node])
+            return 0
+        with self.profiler.phase('reconstruct_path'):
+            came_from = {
+                graph.node_id(index): [graph.node_id(parent) for parent in parents]
+                for index, parents in result.came_from(target).items()
+            }
+            return self.reconstruct_path(came_from, target_node_id, self.id_to_cost)[0]
+
+    def reconstruct_path(self, came_from, target, costs):
+        """
+        Reconstruct the minimal attack path from the start node to a node, and add it to
+        self.visited and self.path.
+
+        The path is the sub-DAG of the nodes the target was reached from: the predecessor of
+        'or' nodes and all necessary parents of 'and' nodes. The nodes are put in topological
+        order with an iterative depth-first search, so a node shared by several branches
+        under 'and' nodes is processed once and deep paths do not hit the recursion limit.
+
+        Parameters:
+        - came_from: A dictionary mapping the nodes on the path to the list of their path
+          parents, see ShortestPathResult.came_from. The start node has no parents.
+        - target: The node the path is reconstructed to.
         - costs: A dictionary containing the costs associated with each node.
 
         Returns:
-        - cost: The total cost of the reconstructed path.
-        - old_current: The last node in the reconstructed path.
+        - cost: The total cost of the attack steps on the path, each attack step counted once.
+        - edges: The (parent id, child id) edges of the path, in topological order.
         """
+        # Depth-first search over the path parents. A node is added to the order after
+        # all of its parents, which are pushed on top of it.
+        order = []
+        seen = {target}
+        stack = [(target, False)]
+        while stack:
+            node_id, parents_done = stack.pop()
+            if parents_done:
+                order.append(node_id)
+                continue
+            stack.append((node_id, True))
+            for parent_id in came_from.get(node_id, ()):
+                if parent_id not in seen:
+                    seen.add(parent_id)
+                    stack.append((parent_id, False))
+
+        nodes = self.attackgraph_dictionary
         cost = 0
-        visited_set = set()
-        if current != self.start_node:
-            # Reconstruct the path backwards from current until the start node is reached.
-            while current in came_from.keys() and current != self.start_node:
-                old_current = current
-                # Get all parent nodes to current in the path.
-                current = came_from[current]
-                # Condition for 'and' nodes.       
-                if len(current) > 1:
-                    for node in current:
-                        if self.attackgraph_dictionary[node].is_necessary == True:
-                            path_cost, _= self.reconstruct_path(came_from, node, costs)
-                            cost += path_cost + costs[old_current]
-                            self.path[node].append(self.attackgraph_dictionary[old_current])
-                            visited_set.add(old_current)
-                            self.visited.append(self.attackgraph_dictionary[old_current])
-                    break
-                # Condition for 'or' nodes.
-                else:
-                    current = current[0]
-                    if old_current not in visited_set:
-                        visited_set.add(old_current)
-                        self.visited.append(self.attackgraph_dictionary[old_current])
-                        if self.attackgraph_dictionary[old_current] not in self.path[current]:
-                            cost += costs[old_current]
-                    if self.attackgraph_dictionary[old_current] not in self.path[current]:
-                        self.path[current].append(self.attackgraph_dictionary[old_current])
-                
-            self.visited.append(self.attackgraph_dictionary[self.start_node])
-            visited_set.add(self.start_node)
-        return cost, old_current
+        edges = []
+        for node_id in order:
+            node = nodes[node_id]
+            self.visited.add(node)
+            parent_ids = came_from.get(node_id)
+            if not parent_ids:
+                continue
+            cost += costs[node_id]
+            for parent_id in parent_ids:
+                self.path[parent_id].add(node)
+                edges.append((parent_id, node_id))
+        return cost, edges
 
     def get_costs(self):
         """
@@ -341,70 +837,75 @@ class AttackSimulation:
         - cost_dictionary: A dictionary containing all attack step ids as keys, and the cost as values.
         """
         if self.use_ttc == False:
-            cost_dictionary = help_functions.load_costs_from_file()
+            cost_dictionary = help_functions.load_costs_from_file(self.cost_file)
         elif self.use_ttc == True:
             cost_dictionary = self.get_cost_from_ttc()
         return cost_dictionary
 
     def get_cost_from_ttc(self):
-        cost_dictionary = {}
-        for attackgraph_node in self.attackgraph_instance.nodes:
-            ttc = attackgraph_node.ttc
-            if ttc == None or ttc == {}:
-                cost_dictionary[attackgraph_node.id] = 0
-            elif ttc != None:
-                cost_dictionary[attackgraph_node.id] = help_functions.cost_from_ttc(ttc, 100)
-        return cost_dictionary
+        """
+        Calculate the cost of all attack steps from their TTC distributions. All samples are
+        drawn in batches, see help_functions.sample_costs_from_ttc.
+
+        Return:
+        - cost_dictionary: A dictionary containing all attack step full names as keys, and the cost as values.
+        """
+        nodes = self.attackgraph_instance.nodes
+        costs = help_functions.sample_costs_from_ttc([node.ttc for node in nodes], 100, self.rng)
+        return {node.full_name: cost for node, cost in zip(nodes, costs.tolist())}
     
-    def random_path(self):
+    def random_path(self, seed=None):
         """
         Generate a random attack path in the attack graph, considering attacker cost budget and/or target node.
 
         This method explores a random path in the attack graph from the start node.
         It uses a random selection strategy among the attack surface nodes, considering the attacker's cost budget
-        and searching for a specific target node if provided.
+        and searching for a specific target node if provided. The attack surface is maintained incrementally on the
+        compiled attack graph, see traversal.AttackHorizon, and the attacker is not changed.
+
+        Parameters:
+        - seed: The seed of the random path, None to use the global random state. Default is None.
 
         Returns:
         - cost: The total cost of the random path.
         """
-        self.attacker.reached_attack_steps = [self.attackgraph_dictionary[self.start_node]]
-        self.visited = self.attacker.reached_attack_steps
-        self.horizon = maltoolbox.attackgraph.query.get_attack_surface(self.attacker)
-        horizon_set = {node.id for node in self.horizon}
-        visited_set = {node.id for node in self.visited}
+        def run():
+            graph = self.get_compiled_graph()
+            target = graph.index(self.target_node) if self.target_node is not None else None
+            rng = random.Random(seed) if seed is not None else random
+            cost, visited, edges = traversal.random_path(
+                graph, graph.index(self.start_node), self.attacker_cost_budget, target, rng
+            )
+            self.add_compiled_path(visited, edges)
+            return cost
+
+        # Without a seed every path is different, and is not cached.
+        with self.profiler.phase('random_path'):
+            if seed is None:
+                return run()
+            return self.cached_query(('random_path', self.target_node, self.attacker_cost_budget, seed), run)
+
+    def random_path_batch(self, num_trials, seed=None, max_workers=None):
+        """
+        Run many independent random path trials with the target node and attacker cost budget of
+        the simulation, see monte_carlo.run_random_paths. The trials run on the compiled attack graph
+        and do not change the attacker, the attack graph or self.visited and self.path.
 
-        costs = self.id_to_cost
-        cost = 0
-        while len(horizon_set-visited_set) > 0:
-            node = random.choice(list(self.horizon))
-
-            # Attack unvisited node in the horizon.
-            if node not in self.visited:
-
-                # Check if the cost is within cost budget (if the cost budget was specified).
-                if self.attacker_cost_budget != None and cost+costs[node.id] > self.attacker_cost_budget:
-                    break
-                
-                # Find a parent node and update path.
-                parent_node_id = self.start_node
-                for parent_node in node.parents:
-                    if parent_node in self.attacker.reached_attack_steps:
-                        parent_node_id = parent_node.id
-                        break
-                self.path[parent_node_id].append(node)
-                self.visited.append(node)
-                visited_set.add(node.id)
-                self.attacker.compromise(node)
-                cost += costs[node.id]
-
-                # Check if the target node was selected (if the target node was specified).
-                if self.target_node != None and node.id == self.target_node:
-                    break
-                
-                # Update attack surface.
-                self.horizon = maltoolbox.attackgraph.query.get_attack_surface(self.attacker)
-                horizon_set = {node.id for node in self.horizon}
-        return cost
+        Parameters:
+        - num_trials: The number of trials.
+        - seed: The seed of the batch. Default is None.
+        - max_workers: The number of worker processes, None for one per CPU. Default is None.
+
+        Returns:
+        - result: A monte_carlo.MonteCarloResult with the cost, target hit and path length per trial,
+          result.summary() gives summary statistics.
+        """
+        graph = self.get_compiled_graph()
+        target = graph.index(self.target_node) if self.target_node is not None else None
+        return monte_carlo.run_random_paths(
+            graph, graph.index(self.start_node), num_trials, self.attacker_cost_budget,
+            target, seed, max_workers
+        )
 
     def bfs(self):
         """
@@ -413,23 +914,60 @@ class AttackSimulation:
         This method explores the attack graph starting from the specified start node,
         considering a cost budget for the attacker. It calculates the total cost of the
         paths within the budget and returns the final cost. Note that this method does not 
-        consider all attack graph logic.
+        consider all attack graph logic, and that a node is explored again for every path
+        that reaches it. See reachable_within_budget for the attack steps reachable within
+        the budget following the attack graph logic.
 
         Returns:
         - cost: The total cost of the paths explored within the attacker's cost budget.
         """
-        # Start BFS from the start node with distance 0.
-        node = self.attackgraph_dictionary[self.start_node]
-        queue = deque([(node, 0)])  
-        self.visited = [node]
-        costs = self.id_to_cost
-        while queue:
-            node, cost = queue.popleft()
-            # Explore the horizon of the current node.
-            for child_node in node.children:
-                next_cost = cost + costs[child_node.id]
-                if next_cost <= self.attacker_cost_budget:
-                    self.visited.append(child_node)
-                    queue.append((child_node, next_cost))
-                    self.path[node.id].append(child_node)
-        return cost
+        with self.profiler.phase('bfs'):
+            if self.use_compiled_graph:
+                graph = self.get_compiled_graph()
+                cost, visited, edges = traversal.bfs(
+                    graph, graph.index(self.start_node), self.attacker_cost_budget
+                )
+                self.add_compiled_path(visited, edges)
+                return cost
+
+            # Start BFS from the start node with distance 0.
+            node = self.attackgraph_dictionary[self.start_node]
+            queue = deque([(node, 0)])  
+            self.visited = attack_path.OrderedNodeSet([node])
+            costs = self.id_to_cost
+            while queue:
+                node, cost = queue.popleft()
+                # Explore the horizon of the current node.
+                for child_node in node.children:
+                    next_cost = cost + costs[child_node.id]
+                    if next_cost <= self.attacker_cost_budget:
+                        self.visited.add(child_node)
+                        queue.append((child_node, next_cost))
+                        self.path[node.id].add(child_node)
+            return cost
+
+    def reachable_within_budget(self, and_cost='sum'):
+        """
+        Get all attack steps the attacker can reach within the attacker cost budget, following
+        the attack graph logic: an 'and' attack step is only reached when all of its necessary
+        parents are reached. Every attack step is settled at most once at its minimal cost, see
+        shortest_path.shortest_attack_paths, so the time is O((V+E) log V) and the memory O(V).
+
+        The visited attack steps are stored in self.visited ordered by cost, and the edges from
+        the parents they were reached from in self.path.
+
+        Parameters:
+        - and_cost: 'sum' or 'max', how the costs of the parents of 'and' nodes are combined.
+
+        Returns:
+        - cost: The highest minimal cost of the reachable attack steps.
+        """
+        def run():
+            result = self.search(and_cost=and_cost, budget=self.attacker_cost_budget)
+            reached = result.reached_by_cost()
+            edges = [(parent, index) for index in reached.tolist() for parent in result.path_parents(index)]
+            self.add_compiled_path(reached, edges)
+            return result.cost_of(int(reached[-1])) if len(reached) else 0
+
+        with self.profiler.phase('reachable_within_budget'):
+            return self.cached_query(('reachability', self.attacker_cost_budget, and_cost), run)
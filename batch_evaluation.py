@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import cost_table
+import constants
+import help_functions
+import shortest_path
+from compiled_graph import CompiledAttackGraph
+
+# The compiled graph and the search state of a worker process, set by _init_worker.
+_worker_graph = None
+_worker_state = None
+
+def attack_step_nodes(attackgraph):
+    """
+    Get the nodes of an attack graph without the attacker nodes that AttackSimulation adds,
+    which have no asset.
+    """
+    return [node for node in attackgraph.nodes if node.asset is not None]
+
+def load_id_to_cost(attackgraph, cost_file=constants.COST_FILE):
+    """
+    Load the attack step costs of an attack graph keyed by node id, like AttackSimulation
+    does when use_ttc is False.
+
+    Parameters:
+    - attackgraph: The AttackGraph.
+    - cost_file: The json file, or the cost table, with the attack step costs.
+
+    Returns:
+    - id_to_cost: A dictionary or a cost_table.CostTable mapping node ids to costs.
+    """
+    if cost_table.is_cost_table(cost_file):
+        return cost_table.CostTable.load(cost_file)
+    return {
+        attackgraph.get_node_by_full_name(full_name).id: cost
+        for full_name, cost in help_functions.load_costs_from_file(cost_file).items()
+    }
+
+def evaluate_sources(graph, sources, and_cost='sum', budget=None, state=None):
+    """
+    Run one search from a set of entry points. The entry points are reached at their own
+    cost, as if they were the children of an attacker node. The attacker node of
+    AttackSimulation is not a parent of its entry points, see shortest_path.iter_attack_paths,
+    so like there an 'and' entry point with necessary parents is only reached when its
+    parents are, and the costs are those of AttackSimulation.compute_attack_costs.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - sources: The indices of the entry points.
+    - and_cost: 'sum' or 'max', see shortest_path.shortest_attack_paths.
+    - budget: The attacker cost budget, or None.
+    - state: A shortest_path.SearchState of the graph to reuse, or None.
+
+    Returns:
+    - result: A ShortestPathResult.
+    """
+    sources = [
+        source for source in sources
+        if not (graph.is_gated[source] and graph.necessary_parent_count[source])
+    ]
+    return shortest_path.shortest_attack_paths(
+        graph, sources, and_cost=and_cost, budget=budget, source_costs=graph.cost[sources].tolist(), state=state
+    )
+
+def _init_worker(graph):
+    global _worker_graph, _worker_state
+    _worker_graph = graph
+    _worker_state = shortest_path.SearchState(shortest_path.SearchCore(graph))
+
+def _evaluate_worker_sources(sources, and_cost, budget):
+    # The graph is not sent back, the caller already has it.
+    result = evaluate_sources(_worker_graph, sources, and_cost, budget, _worker_state)
+    cost, predecessor, settled, touched = result.stored_arrays()
+    return (result.sources, cost, predecessor, settled, result.expanded,
+            result.heap_pushes, result.heap_pops, result.peak_frontier, touched)
+
+class BatchEvaluator:
+    """
+    Evaluates many attackers, each given by its entry points, against one compiled attack
+    graph. Unlike AttackSimulation, nothing is added to the AttackGraph and no Attacker is
+    compromised, every evaluation only has its own search state, so the graph is built once
+    and the evaluations can run in parallel.
+    """
+
+    def __init__(self, graph, full_name_index):
+        """
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - full_name_index: A dictionary mapping attack step full names to node indices.
+        """
+        self.graph = graph
+        self.full_name_index = full_name_index
+
+    @classmethod
+    def from_attackgraph(cls, attackgraph, cost_file=constants.COST_FILE):
+        """
+        Compile an attack graph with the costs of a cost file.
+
+        Parameters:
+        - attackgraph: The AttackGraph, it is not changed.
+        - cost_file: The json file, or the cost table, with the attack step costs.
+
+        Returns:
+        - evaluator: The BatchEvaluator.
+        """
+        nodes = attack_step_nodes(attackgraph)
+        graph = CompiledAttackGraph.from_attackgraph(nodes, load_id_to_cost(attackgraph, cost_file))
+        return cls(graph, {node.full_name: graph.index(node.id) for node in nodes})
+
+    def sources(self, model, entry_point_attack_steps):
+        """
+        Get the node indices of a set of entry points.
+
+        Parameters:
+        - model: The Model the asset ids are looked up in.
+        - entry_point_attack_steps: The entry points in the format of
+          help_functions.add_entry_points_to_attacker, [[asset id, [attack step names]], ...].
+
+        Returns:
+        - sources: A sorted list of node indices.
+
+        Raises:
+        - KeyError: If an entry point is not in the attack graph.
+        """
+        sources = set()
+        for asset_id, attack_steps in entry_point_attack_steps:
+            asset = model.get_asset_by_id(asset_id)
+            if asset is None:
+                raise KeyError(f"There is no asset with id {asset_id} in the model")
+            for attack_step in attack_steps:
+                full_name = asset.name + ':' + attack_step
+                if full_name not in self.full_name_index:
+                    raise KeyError(f"The entry point {full_name!r} is not in the attack graph")
+                sources.add(self.full_name_index[full_name])
+        return sorted(sources)
+
+    def evaluate(self, model, configurations, and_cost='sum', budget=None, max_workers=None):
+        """
+        Compute the minimal attacker costs of every reachable attack step for each set of
+        entry points.
+
+        Parameters:
+        - model: The Model the asset ids of the entry points are looked up in.
+        - configurations: A list of entry point sets, see sources.
+        - and_cost: 'sum' or 'max', see shortest_path.shortest_attack_paths.
+        - budget: The attacker cost budget, or None.
+        - max_workers: The number of worker processes, None for one per CPU. With 1, or a
+          single configuration, the searches run in this process.
+
+        Returns:
+        - results: A list with the ShortestPathResult of each configuration, in order.
+        """
+        all_sources = [self.sources(model, entry_points) for entry_points in configurations]
+        if max_workers == 1 or len(all_sources) <= 1:
+            state = shortest_path.SearchState(shortest_path.SearchCore(self.graph))
+            return [evaluate_sources(self.graph, sources, and_cost, budget, state) for sources in all_sources]
+
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(self.graph,)) as executor:
+            futures = [
+                executor.submit(_evaluate_worker_sources, sources, and_cost, budget)
+                for sources in all_sources
+            ]
+            return [
+                shortest_path.ShortestPathResult(
+                    self.graph, sources, cost, predecessor, settled, and_cost, None, expanded, budget, *counters
+                )
+                for sources, cost, predecessor, settled, expanded, *counters in (future.result() for future in futures)
+            ]
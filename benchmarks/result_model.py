@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maltoolbox.attackgraph import Attacker, AttackGraph, AttackGraphNode
+
+from attack_simulation import AttackSimulation
+
+# Reconstruction and export may grow at most this much from the smallest to the largest graph.
+MAX_GROWTH = 3.0
+
+def build_simulation(num_nodes, path_length):
+    """
+    Build an AttackSimulation on a synthetic attack graph: a chain of path_length 'or'
+    attack steps from the entry point to the target, ending in an 'and' step with two
+    necessary parents, and num_nodes - path_length attack steps that are not connected.
+
+    Returns:
+    - attack_simulation: The AttackSimulation, with the target node set.
+    """
+    attackgraph = AttackGraph()
+    chain = []
+    for i in range(path_length):
+        node = AttackGraphNode(type='or', name=f'step{i}', ttc={})
+        attackgraph.add_node(node)
+        if chain:
+            chain[-1].children.append(node)
+            node.parents.append(chain[-1])
+        chain.append(node)
+    target = AttackGraphNode(type='and', name='target', ttc={})
+    attackgraph.add_node(target)
+    for parent in (chain[-1], chain[len(chain) // 2]):
+        parent.children.append(target)
+        target.parents.append(parent)
+    for i in range(num_nodes - path_length):
+        attackgraph.add_node(AttackGraphNode(type='or', name=f'other{i}', ttc={}))
+
+    attacker = Attacker('attacker', entry_points=[chain[0]], reached_attack_steps=[chain[0]])
+    attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=True, rng=0)
+    attack_simulation.set_target_node(target.id)
+    return attack_simulation
+
+def time_result(attack_simulation, repeats=5):
+    """
+    Time the path reconstruction and the Neo4j export of a computed search.
+
+    Returns:
+    - seconds: The best time of the repeats.
+    """
+    attack_simulation.compute_attack_costs()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        attack_simulation.path_to_target(attack_simulation.target_node)
+        attack_simulation.build_neo4j_graph()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    path_length = 2000
+    timings = []
+    for num_nodes in (10000, 100000, 400000):
+        attack_simulation = build_simulation(num_nodes, path_length)
+        seconds = time_result(attack_simulation)
+        timings.append(seconds)
+        print(f"nodes={num_nodes:>7} path={len(attack_simulation.visited):>5} "
+              f"reconstruct+export={seconds * 1000:8.2f} ms")
+
+    growth = timings[-1] / timings[0]
+    print(f"growth from the smallest to the largest graph: {growth:.2f}x (limit {MAX_GROWTH}x)")
+    if growth > MAX_GROWTH:
+        print("REGRESSION: reconstruction and export scale with the graph size")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The cold start target of a headless query on a cached attack graph, in seconds: starting
+# Python, the imports, loading the graph and the query.
+COLD_START_TARGET = 0.5
+
+# Modules that are only imported when Neo4j is used.
+NEO4J_MODULES = ('py2neo', 'maltoolbox.ingestors.neo4j')
+
+# The headless query that is timed.
+HEADLESS_QUERY = ["cli.py", "--algorithm", "dijkstra", "--target", "Data:4:accessDecryptedData"]
+
+def time_command(args, repeats):
+    """
+    Run a Python command in new processes and time it.
+
+    Parameters:
+    - args: The arguments of the Python interpreter.
+    - repeats: The number of runs.
+
+    Returns:
+    - seconds: The best wall time of the runs.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def loaded_neo4j_modules(module):
+    """
+    Get the NEO4J_MODULES that importing a module loads.
+    """
+    code = f"import sys, {module}; print(' '.join(name for name in {NEO4J_MODULES!r} if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return output.split()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the start of the interactive and headless entry points.")
+    parser.add_argument("--repeats", type=int, default=5, help="The runs per command, the best time is kept. Default is 5.")
+    parser.add_argument("--target", type=float, default=COLD_START_TARGET,
+                        help=f"The cold start target of a headless query on a cached graph in seconds. Default is {COLD_START_TARGET}.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    failures = []
+    timings = {
+        "python": time_command(["-c", "pass"], args.repeats),
+        "import attack_simulation": time_command(["-c", "import attack_simulation"], args.repeats),
+        "import main": time_command(["-c", "import main"], args.repeats),
+        "import cli": time_command(["-c", "import cli"], args.repeats),
+        "headless query": time_command(HEADLESS_QUERY, 1),
+    }
+    with tempfile.TemporaryDirectory() as graph_cache:
+        cached_query = HEADLESS_QUERY + ["--graph-cache", graph_cache]
+        # The first run builds the cache entry.
+        time_command(cached_query, 1)
+        timings["headless query, cached graph"] = time_command(cached_query, args.repeats)
+
+    for name, seconds in timings.items():
+        print(f"{name:<32} {seconds * 1000:9.1f} ms")
+    cold_start = timings["headless query, cached graph"]
+    print(f"cold start of a headless query on a cached graph: {cold_start:.3f} s (target {args.target} s)")
+    if cold_start > args.target:
+        failures.append("the headless cold start is above the target")
+    for module in ("main", "cli", "attack_simulation"):
+        loaded = loaded_neo4j_modules(module)
+        if loaded:
+            failures.append(f"import {module} loads {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from maltoolbox.attackgraph import Attacker, AttackGraph, AttackGraphNode
+
+from attack_simulation import AttackSimulation
+import constants
+import help_functions
+
+# The generators of synthetic benchmark graphs.
+GENERATORS = ('attack_graph', 'corelang')
+
+# The assets of one unit of a synthetic coreLang model, see generate_corelang_model.
+UNIT_ASSETS = ('Application', 'Data', 'Credentials', 'Identity', 'User', 'SoftwareVulnerability')
+
+# The defenses of the assets of a unit that differ from the coreLang defaults.
+UNIT_DEFENSES = {'Credentials': {'unique': 0.0}, 'User': {'noPasswordReuse': 0.0}}
+
+# The number of cheapest attack steps within the bfs budget, see time_queries.
+BFS_REACHABLE = 100
+
+# A phase may get at most this much slower than in the baseline before compare reports it.
+MAX_SLOWDOWN = 1.5
+
+def generate_attack_graph(num_nodes, fan_out=3, and_density=0.1, cycle_rate=0.05, seed=0):
+    """
+    Generate a synthetic attack graph. Node 0 is the entry point, every node has fan_out
+    children among the next 10 * fan_out nodes, or with probability cycle_rate among the
+    nodes before it, which closes a cycle. A share and_density of the nodes are 'and' steps.
+    The TTC of every step is one of the named distributions of help_functions.
+
+    Parameters:
+    - num_nodes: The number of attack steps.
+    - fan_out: The number of children of every attack step.
+    - and_density: The share of 'and' attack steps.
+    - cycle_rate: The probability that a child is chosen among the earlier attack steps.
+    - seed: The seed of the generator.
+
+    Returns:
+    - attackgraph: The AttackGraph.
+    - attacker: The Attacker with node 0 as entry point.
+    """
+    rng = np.random.default_rng(seed)
+    ttc_names = list(help_functions.TTC_DISTRIBUTIONS)
+    node_types = np.where(rng.random(num_nodes) < and_density, 'and', 'or')
+    node_types[0] = 'or'
+    ttcs = rng.integers(0, len(ttc_names), num_nodes)
+
+    attackgraph = AttackGraph()
+    nodes = []
+    for i in range(num_nodes):
+        node = AttackGraphNode(
+            type=str(node_types[i]), name=f'step{i}',
+            ttc={'type': 'function', 'name': ttc_names[ttcs[i]], 'arguments': []}
+        )
+        attackgraph.add_node(node)
+        nodes.append(node)
+
+    window = 10 * fan_out
+    offsets = rng.integers(1, window + 1, (num_nodes, fan_out))
+    backwards = rng.random((num_nodes, fan_out)) < cycle_rate
+    for i, node in enumerate(nodes):
+        children = set()
+        for offset, backward in zip(offsets[i].tolist(), backwards[i].tolist()):
+            child = i - offset if backward else i + offset
+            if 0 < child < num_nodes and child != i:
+                children.add(child)
+        for child in sorted(children):
+            node.children.append(nodes[child])
+            nodes[child].parents.append(node)
+
+    attacker = Attacker('attacker', entry_points=[nodes[0]], reached_attack_steps=[nodes[0]])
+    return attackgraph, attacker
+
+def generate_corelang_model(num_assets, fan_out=2, cycle_rate=0.05, seed=0):
+    """
+    Generate a synthetic coreLang model in the format of constants.MODEL_FILE. The model is made
+    of units of UNIT_ASSETS: an application that contains encrypted data, the credentials of
+    the data with the identity and user of the credentials, and a vulnerability of the
+    application. Every application executes fan_out applications of the next 10 * fan_out
+    units, or with probability cycle_rate of the units before it. The attacker starts with
+    the credentials and full access to the application of the first unit. The credentials
+    are not unique and the users reuse passwords, like in constants.MODEL_FILE, so the attack
+    spreads to the executed applications.
+
+    Parameters:
+    - num_assets: The number of assets, rounded down to whole units.
+    - fan_out: The number of applications every application executes.
+    - cycle_rate: The probability that an executed application is in an earlier unit.
+    - seed: The seed of the generator.
+
+    Returns:
+    - model: The model as a dictionary.
+    """
+    rng = random.Random(seed)
+    num_units = max(1, num_assets // len(UNIT_ASSETS))
+    assets = {}
+    associations = []
+
+    def asset_id(unit, asset_type):
+        return unit * len(UNIT_ASSETS) + UNIT_ASSETS.index(asset_type)
+
+    for unit in range(num_units):
+        for asset_type in UNIT_ASSETS:
+            assets[str(asset_id(unit, asset_type))] = {"name": f"{asset_type} {unit}", "type": asset_type}
+            if asset_type in UNIT_DEFENSES:
+                assets[str(asset_id(unit, asset_type))]["defenses"] = dict(UNIT_DEFENSES[asset_type])
+        application, data, credentials = (asset_id(unit, name) for name in ('Application', 'Data', 'Credentials'))
+        identity, user, vulnerability = (asset_id(unit, name) for name in ('Identity', 'User', 'SoftwareVulnerability'))
+        associations += [
+            {"AppContainment": {"containedData": [data], "containingApp": [application]}},
+            {"EncryptionCredentials": {"encryptCreds": [credentials], "encryptedData": [data]}},
+            {"IdentityCredentials": {"identities": [identity], "credentials": [credentials]}},
+            {"UserAssignedIdentities": {"users": [user], "userIds": [identity]}},
+            {"ApplicationVulnerability_SoftwareVulnerability_Application": {
+                "vulnerabilities": [vulnerability], "application": [application]}},
+        ]
+
+    window = 10 * fan_out
+    for unit in range(num_units):
+        executed = set()
+        for _ in range(fan_out):
+            offset = rng.randint(1, window)
+            other = unit - offset if rng.random() < cycle_rate else unit + offset
+            if 0 <= other < num_units and other != unit:
+                executed.add(asset_id(other, 'Application'))
+        if executed:
+            associations.append({"AppExecution": {
+                "hostApp": [asset_id(unit, 'Application')], "appExecutedApps": sorted(executed)
+            }})
+
+    attacker_id = str(len(assets))
+    return {
+        "metadata": {"name": f"Synthetic model {num_assets}", "langVersion": "1.0.0", "langID": "org.mal-lang.coreLang",
+                     "malVersion": "0.1.0-SNAPSHOT", "info": "Created by benchmarks/suite.py."},
+        "assets": assets,
+        "associations": associations,
+        "attackers": {attacker_id: {"name": f"Attacker:{attacker_id}", "entry_points": {
+            str(asset_id(0, 'Credentials')): {"attack_steps": ["attemptCredentialsReuse"]},
+            str(asset_id(0, 'Application')): {"attack_steps": ["fullAccess"]},
+        }}},
+    }
+
+class DryRunCursor:
+
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+class DryRunTransaction:
+    """
+    A Neo4j transaction that only returns ids for the created nodes, used to time the
+    client side of an upload without a database.
+    """
+
+    def __init__(self):
+        self.next_id = 0
+
+    def run(self, cypher, parameters=None):
+        records = []
+        if "RETURN" in cypher:
+            for row in parameters["rows"]:
+                records.append({"key": row["key"], "id": self.next_id})
+                self.next_id += 1
+        return DryRunCursor(records)
+
+class DryRunConnection:
+
+    def delete_all(self):
+        pass
+
+    def begin(self):
+        return DryRunTransaction()
+
+    def commit(self, tx):
+        pass
+
+    def rollback(self, tx):
+        pass
+
+class PhaseTimer:
+    """
+    Times the phases of a benchmark run, and traces their peak memory with tracemalloc
+    if trace_memory is True. Tracing makes the phases slower.
+    """
+
+    def __init__(self, trace_memory=False, repeats=1):
+        self.trace_memory = trace_memory
+        self.repeats = repeats
+        self.phases = {}
+
+    def run(self, name, function, repeats=None):
+        """
+        Run a phase repeats times and record the best time and the peak memory.
+
+        Returns:
+        - value: The value returned by the last run of function.
+        """
+        best = float('inf')
+        peak = 0
+        for _ in range(repeats or self.repeats):
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            value = function()
+            best = min(best, time.perf_counter() - start)
+            if self.trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        self.phases[name] = {"seconds": best}
+        if self.trace_memory:
+            self.phases[name]["peak_bytes"] = peak
+        return value
+
+def time_queries(attack_simulation, timer):
+    """
+    Time the algorithms of an AttackSimulation. The target is the reachable attack step with
+    the highest cost and the reachability budget the median of the costs of the reachable
+    attack steps. bfs explores every path within its budget, so its time grows exponentially
+    with the budget, its budget is the cost of the BFS_REACHABLE cheapest attack steps for
+    every graph size. It never ends on a cycle of attack steps without cost, so it is skipped
+    on graphs with such attack steps, e.g. coreLang graphs with TTC costs.
+    """
+    timer.run("get_cost_from_ttc", attack_simulation.get_cost_from_ttc, repeats=1)
+    graph = timer.run("compile", attack_simulation.compile_graph, repeats=1)
+    costs = timer.run("compute_attack_costs", attack_simulation.compute_attack_costs)
+    reachable = sorted(costs.items(), key=lambda item: item[1])
+    reachable_costs = [cost for _, cost in reachable]
+
+    attack_simulation.set_target_node(reachable[-1][0])
+
+    def dijkstra():
+        attack_simulation.shortest_path_result = None
+        return attack_simulation.dijkstra()
+
+    timer.run("dijkstra", dijkstra)
+    timer.run("random_path", lambda: attack_simulation.random_path(seed=0))
+    attack_simulation.set_target_node(None)
+    free_steps = (graph.cost == 0) & graph.is_traversable
+    free_steps[graph.index(attack_simulation.start_node)] = False
+    if free_steps.any():
+        timer.phases["bfs"] = {"skipped": f"{int(free_steps.sum())} attack steps without cost"}
+    else:
+        attack_simulation.set_attacker_cost_budget(reachable_costs[min(BFS_REACHABLE, len(reachable_costs)) - 1])
+        timer.run("bfs", attack_simulation.bfs)
+    attack_simulation.set_attacker_cost_budget(float(np.median(reachable_costs)))
+    timer.run("reachable_within_budget", attack_simulation.reachable_within_budget)
+    timer.run("upload_graph_to_neo4j", lambda: attack_simulation.upload_graph_to_neo4j(DryRunConnection()))
+    return {"num_nodes": graph.num_nodes, "num_edges": graph.num_edges, "num_reachable": len(reachable),
+            "num_exported": len(attack_simulation.visited)}
+
+def run_benchmark(generator, size, fan_out, and_density, cycle_rate, seed, trace_memory=False, repeats=3):
+    """
+    Generate a synthetic graph and time the graph build and every algorithm on it.
+
+    Parameters:
+    - generator: One of GENERATORS, 'attack_graph' generates the attack steps directly with
+      generate_attack_graph, 'corelang' generates a coreLang model with generate_corelang_model
+      and builds its attack graph with mal-toolbox.
+    - size: The number of attack steps, or of assets for 'corelang'.
+    - fan_out, and_density, cycle_rate, seed: The generator settings, and_density is only
+      used by 'attack_graph'.
+    - trace_memory: Trace the peak memory of every phase.
+    - repeats: The number of runs of the query phases, the best time is kept.
+
+    Returns:
+    - run: A dictionary with the settings, the graph size and the phases.
+    """
+    timer = PhaseTimer(trace_memory, repeats)
+    if generator == 'attack_graph':
+        attackgraph, attacker = timer.run(
+            "build", lambda: generate_attack_graph(size, fan_out, and_density, cycle_rate, seed), repeats=1
+        )
+    else:
+        from maltoolbox.wrappers import create_attack_graph
+        import maltoolbox.attackgraph.analyzers.apriori
+
+        model = generate_corelang_model(size, fan_out, cycle_rate, seed)
+        with tempfile.TemporaryDirectory() as directory:
+            model_file = os.path.join(directory, "model.json")
+            with open(model_file, 'w') as file:
+                json.dump(model, file)
+
+            def build():
+                attackgraph = create_attack_graph(constants.MAR_ARCHIVE, model_file)
+                maltoolbox.attackgraph.analyzers.apriori.calculate_viability_and_necessity(attackgraph)
+                return attackgraph
+
+            attackgraph = timer.run("build", build, repeats=1)
+        attacker = attackgraph.attackers[0]
+    attack_simulation = timer.run(
+        "attack_simulation", lambda: AttackSimulation(attackgraph, attacker, use_ttc=True, rng=seed), repeats=1
+    )
+    run = {"generator": generator, "size": size, "fan_out": fan_out, "and_density": and_density,
+           "cycle_rate": cycle_rate, "seed": seed}
+    run.update(time_queries(attack_simulation, timer))
+    run["phases"] = timer.phases
+    run["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return run
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_key(run):
+    return tuple(run[key] for key in ("generator", "size", "fan_out", "and_density", "cycle_rate", "seed"))
+
+def compare(baseline, current, max_slowdown=MAX_SLOWDOWN):
+    """
+    Compare the phase times of two benchmark results.
+
+    Returns:
+    - regressions: A list of (run key, phase, baseline seconds, current seconds) of the phases
+      that are more than max_slowdown times slower.
+    """
+    baseline_runs = {run_key(run): run for run in baseline["runs"]}
+    regressions = []
+    for run in current["runs"]:
+        old_run = baseline_runs.get(run_key(run))
+        if old_run is None:
+            continue
+        for phase, timing in run["phases"].items():
+            old_seconds = old_run["phases"].get(phase, {}).get("seconds")
+            if old_seconds and timing.get("seconds", 0) > max_slowdown * old_seconds:
+                regressions.append((run_key(run), phase, old_seconds, timing["seconds"]))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the graph build and the algorithms on synthetic attack graphs.")
+    parser.add_argument("--generator", choices=GENERATORS, default='attack_graph', help="The graph generator. Default is attack_graph.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="The numbers of attack steps, or of assets for corelang. Default is 1000 10000 100000.")
+    parser.add_argument("--fan-out", dest="fan_out", type=int, default=3, help="The children per attack step, or executed applications per application. Default is 3.")
+    parser.add_argument("--and-density", dest="and_density", type=float, default=0.1, help="The share of 'and' attack steps of attack_graph. Default is 0.1.")
+    parser.add_argument("--cycle-rate", dest="cycle_rate", type=float, default=0.05, help="The probability that an edge points backwards. Default is 0.05.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the generator. Default is 0.")
+    parser.add_argument("--repeats", type=int, default=3, help="The runs per query phase, the best time is kept. Default is 3.")
+    parser.add_argument("--trace-memory", dest="trace_memory", action="store_true", help="Trace the peak memory of every phase, slows the phases down.")
+    parser.add_argument("--output", help="The JSON file the results are written to.")
+    parser.add_argument("--compare", help="A JSON file of an earlier run, exit with an error if a phase got slower.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.trace_memory:
+        tracemalloc.start()
+    result = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "trace_memory": args.trace_memory,
+        "runs": [],
+    }
+    for size in args.sizes:
+        run = run_benchmark(args.generator, size, args.fan_out, args.and_density, args.cycle_rate,
+                            args.seed, args.trace_memory, args.repeats)
+        result["runs"].append(run)
+        print(f"{args.generator} size={size} nodes={run['num_nodes']} edges={run['num_edges']} reachable={run['num_reachable']}")
+        for phase, timing in run["phases"].items():
+            if "skipped" in timing:
+                print(f"  {phase:<24} skipped: {timing['skipped']}")
+                continue
+            memory = f" peak={timing['peak_bytes'] / 2**20:8.1f} MiB" if "peak_bytes" in timing else ""
+            print(f"  {phase:<24} {timing['seconds'] * 1000:10.2f} ms{memory}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare(json.load(file), result)
+        for key, phase, old_seconds, seconds in regressions:
+            print(f"REGRESSION {key} {phase}: {old_seconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+
+import constants
+import exporters
+import graph_cache
+import instrumentation
+import shortest_path
+import traversal
+
+# The algorithms a query can run.
+ALGORITHMS = ('dijkstra', 'random_path', 'bfs', 'reachability')
+
+# The job settings and their defaults, the command line arguments override the job file.
+JOB_DEFAULTS = {
+    "model": constants.MODEL_FILE,
+    "mar_archive": constants.MAR_ARCHIVE,
+    "cost_file": constants.COST_FILE,
+    "use_ttc": False,
+    "ttc_seed": None,
+    "attacker": 0,
+    "exporter": None,
+    "output": constants.EXPORT_PATH,
+    "results": None,
+    "neo4j_ingest": False,
+    "graph_cache": None,
+    "profile": None,
+    "queries": [],
+}
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
+
+    Parameters:
+    - argv: The arguments, None for sys.argv.
+
+    Returns:
+    - args: The argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run attack graph queries without interaction. The attack graph is built once and "
+                    "all queries run against it. Each query writes one JSON line to the results."
+    )
+    parser.add_argument("--job", help="JSON job file with the settings below and a list of queries.")
+    parser.add_argument("--model", help=f"The model file. Default is {constants.MODEL_FILE}.")
+    parser.add_argument("--mar-archive", dest="mar_archive", help=f"The MAL language archive. Default is {constants.MAR_ARCHIVE}.")
+    parser.add_argument("--cost-file", dest="cost_file", help=f"The json file or the cost table (name.costs.npy) with the attack step costs. Default is {constants.COST_FILE}.")
+    parser.add_argument("--use-ttc", dest="use_ttc", action="store_const", const=True, help="Sample the costs from the TTC distributions instead.")
+    parser.add_argument("--ttc-seed", dest="ttc_seed", type=int, help="The seed of the TTC samples.")
+    parser.add_argument("--attacker", type=int, help="The index of the attacker in the model. Default is 0.")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, help="The algorithm of the query given on the command line.")
+    parser.add_argument("--target", action="append", default=[], help="A target attack step id or full name, can be repeated.")
+    parser.add_argument("--budget", action="append", type=float, default=[], help="An attacker cost budget, can be repeated.")
+    parser.add_argument("--seed", action="append", type=int, default=[], help="A random path seed, can be repeated.")
+    parser.add_argument("--exporter", choices=exporters.EXPORTER_NAMES, help="Export the result of every query.")
+    parser.add_argument("--output", help="The output path of the exported results, the query number is appended. Default is results.")
+    parser.add_argument("--results", help="The JSON Lines file of the query results. Default is stdout.")
+    parser.add_argument("--neo4j-ingest", dest="neo4j_ingest", action="store_const", const=True,
+                        help="Upload the model and attack graph to Neo4j first. Skipped by default.")
+    parser.add_argument("--graph-cache", dest="graph_cache",
+                        help="Cache directory of compiled attack graphs. With a cached graph the model is not parsed "
+                             "and the queries run on the memory-mapped graph. Not used with --use-ttc or --neo4j-ingest.")
+    parser.add_argument("--profile", help="Write the phase timings and counters of the run to this file, in the Prometheus "
+                                          "text format if it ends with .prom, otherwise as JSON. Every result gets the counters of its query.")
+    return parser.parse_args(argv)
+
+def load_job(args):
+    """
+    Combine the defaults, the job file and the command line arguments into a job.
+
+    Parameters:
+    - args: The argparse.Namespace of parse_args.
+
+    Returns:
+    - job: A dictionary with the settings of JOB_DEFAULTS.
+    """
+    job = dict(JOB_DEFAULTS)
+    if args.job:
+        with open(args.job, 'r') as file:
+            job.update(json.load(file))
+    for key in JOB_DEFAULTS:
+        value = getattr(args, key, None)
+        if value is not None:
+            job[key] = value
+    if args.algorithm:
+        job["queries"] = list(job["queries"]) + [{
+            "algorithm": args.algorithm, "targets": args.target, "budgets": args.budget, "seeds": args.seed
+        }]
+    return job
+
+def expand_queries(queries):
+    """
+    Expand the queries of a job into single queries. A query has an algorithm and optional
+    lists of targets, budgets and seeds, and is expanded into every combination of them.
+
+    Parameters:
+    - queries: A list of query dictionaries.
+
+    Returns:
+    - queries: A list of dictionaries with an algorithm, a target, a budget and a seed.
+    """
+    expanded = []
+    for query in queries:
+        algorithm = query["algorithm"]
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"The algorithm must be one of {ALGORITHMS}, not {algorithm!r}")
+        targets = query.get("targets") or [None]
+        budgets = query.get("budgets") or [None]
+        seeds = query.get("seeds") or [None]
+        for target, budget, seed in itertools.product(targets, budgets, seeds):
+            expanded.append({"algorithm": algorithm, "target": target, "budget": budget, "seed": seed})
+    return expanded
+
+def resolve_attack_step(attack_simulation, target):
+    """
+    Get the id of an attack step given by id or full name, or None if it does not exist.
+    """
+    if isinstance(target, int) or str(target).isdigit():
+        target_id = int(target)
+        return target_id if target_id in attack_simulation.attackgraph_dictionary else None
+    node = attack_simulation.attackgraph_instance.get_node_by_full_name(target)
+    return node.id if node is not None else None
+
+def build_attack_simulation(job, profiler=None):
+    """
+    Build the attack graph and the AttackSimulation of a job.
+
+    Parameters:
+    - job: The job dictionary, see load_job.
+    - profiler: The instrumentation.Profiler of the run, or None.
+
+    Returns:
+    - attack_simulation: The AttackSimulation.
+    """
+    # Imported here, a cached graph does not need mal-toolbox, and only the ingest needs py2neo.
+    import maltoolbox.attackgraph.analyzers.apriori
+    from maltoolbox.wrappers import create_attack_graph
+    from attack_simulation import AttackSimulation
+
+    profiler = profiler if profiler is not None else instrumentation.DISABLED
+    with profiler.phase('build_attack_graph'):
+        attackgraph = create_attack_graph(job["mar_archive"], job["model"])
+        maltoolbox.attackgraph.analyzers.apriori.calculate_viability_and_necessity(attackgraph)
+    if job["neo4j_ingest"]:
+        import maltoolbox.ingestors.neo4j
+        maltoolbox.ingestors.neo4j.ingest_attack_graph(attackgraph, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=True)
+        maltoolbox.ingestors.neo4j.ingest_model(attackgraph.model, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=False)
+    attacker = attackgraph.attackers[job["attacker"]]
+    return AttackSimulation(
+        attackgraph, attacker, use_ttc=job["use_ttc"], rng=job["ttc_seed"], cost_file=job["cost_file"],
+        profiler=profiler
+    )
+
+class CompiledQueryRunner:
+    """
+    Runs queries directly on a compiled attack graph, without the attack graph objects. It is
+    the one implementation of the query algorithms: run_job runs it on a graph from the graph
+    cache, see graph_cache.py, or on the compiled graph of an AttackSimulation, and the query
+    server runs one per thread. The last result is kept for export.
+    """
+
+    def __init__(self, graph, start, index, node_record=None, profiler=None, search_core=None):
+        """
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - start: The index of the attacker node.
+        - index: A function that gets the index of an attack step id or full name, and
+          raises KeyError for unknown attack steps.
+        - node_record: A function that gets the exported record of a node index, or None if
+          the results are not exported.
+        - profiler: The instrumentation.Profiler of the run, or None.
+        - search_core: The shortest_path.SearchCore of the graph to share, or None to build one.
+        """
+        self.graph = graph
+        self.start = start
+        self.index = index
+        self.node_record = node_record
+        self.profiler = profiler if profiler is not None else instrumentation.DISABLED
+        self.search_core = search_core
+        self.shortest_path_result = None
+        self.search_state = None
+        self.visited = []
+        self.edges = []
+
+    @classmethod
+    def from_graph_cache_entry(cls, entry, profiler=None):
+        """
+        Create a runner on a graph_cache.GraphCacheEntry.
+        """
+        return cls(entry.graph, entry.start, entry.index, entry.node_record, profiler)
+
+    @classmethod
+    def from_attack_simulation(cls, attack_simulation, profiler=None):
+        """
+        Create a runner on the compiled graph of an AttackSimulation, the attack steps are
+        looked up and exported from its attack graph.
+        """
+        graph = attack_simulation.get_compiled_graph()
+        nodes = attack_simulation.attackgraph_dictionary
+
+        def index(attack_step):
+            node_id = resolve_attack_step(attack_simulation, attack_step)
+            if node_id is None:
+                raise KeyError(attack_step)
+            return graph.index(node_id)
+
+        def node_record(index):
+            return attack_simulation.build_node_record(nodes[graph.node_id(index)], False)
+
+        return cls(graph, graph.index(attack_simulation.start_node), index, node_record, profiler)
+
+    def search(self, budget=None):
+        """
+        Run a search from the attacker node, reusing the search state of earlier queries.
+        """
+        if self.search_state is None:
+            if self.search_core is None:
+                self.search_core = shortest_path.SearchCore(self.graph)
+            self.search_state = shortest_path.SearchState(self.search_core)
+        with self.profiler.phase('search'):
+            result = shortest_path.shortest_attack_paths(self.graph, [self.start], budget=budget, state=self.search_state)
+        self.profiler.record_search(result)
+        return result
+
+    def answer(self, query):
+        """
+        Run the algorithm of a query, and keep the indices of the visited nodes in
+        self.visited and the (parent, child) index pairs of the path in self.edges.
+
+        Parameters:
+        - query: A dictionary with an algorithm, a target, a budget and a seed, see expand_queries.
+
+        Returns:
+        - answer: A dictionary with the cost and whether the target was reached, or an error.
+        """
+        graph = self.graph
+        target = None
+        if query.get("target") is not None:
+            try:
+                target = self.index(query["target"])
+            except KeyError:
+                return {"error": f"Unknown attack step {query['target']!r}"}
+        algorithm = query.get("algorithm")
+        budget = query.get("budget")
+
+        if algorithm == 'dijkstra':
+            if target is None:
+                return {"error": "dijkstra needs a target"}
+            # One search settles all targets, later targets only reconstruct their path.
+            if self.shortest_path_result is None:
+                self.shortest_path_result = self.search()
+            search = self.shortest_path_result
+            self.visited, self.edges, cost = [], [], 0.0
+            if search.is_reached(target):
+                came_from = search.came_from(target)
+                self.visited = list(dict.fromkeys([target] + list(came_from) + [self.start]))
+                self.edges = [(parent, child) for child, parents in came_from.items() for parent in parents]
+                cost = search.path_cost(target)
+        elif algorithm == 'random_path':
+            rng = random.Random(query["seed"]) if query.get("seed") is not None else random
+            cost, self.visited, self.edges = traversal.random_path(graph, self.start, budget, target, rng)
+        elif algorithm in ('bfs', 'reachability'):
+            if budget is None:
+                return {"error": f"{algorithm} needs a budget"}
+            if algorithm == 'bfs':
+                cost, self.visited, self.edges = traversal.bfs(graph, self.start, budget)
+                self.visited = list(dict.fromkeys(self.visited))
+            else:
+                search = self.search(budget)
+                self.visited = search.reached_by_cost().tolist()
+                self.edges = [(parent, index) for index in self.visited for parent in search.path_parents(index)]
+                cost = search.cost_of(self.visited[-1]) if self.visited else 0.0
+        else:
+            return {"error": f"The algorithm must be one of {ALGORITHMS}, not {algorithm!r}"}
+        return {"cost": float(cost), "target_reached": target is not None and target in self.visited}
+
+    def run(self, query):
+        """
+        Run one query.
+
+        Parameters:
+        - query: A dictionary with an algorithm, a target, a budget and a seed.
+
+        Returns:
+        - result: A dictionary with the query, the cost, whether the target was reached,
+          the number of visited attack steps and the run time in seconds, or an error.
+        """
+        start = time.perf_counter()
+        result = dict(query, **self.answer(query))
+        if "error" not in result:
+            result["visited"] = len(self.visited)
+            result["seconds"] = time.perf_counter() - start
+        return result
+
+    def export(self, exporter):
+        """
+        Write the result of the last query with an exporter.
+        """
+        node_id = self.graph.node_id
+        with self.profiler.phase('export_results'):
+            exporter.export(
+                (self.node_record(index) for index in self.visited),
+                ((node_id(parent), node_id(child)) for parent, child in dict.fromkeys(self.edges))
+            )
+            self.profiler.count('db_round_trips', exporter.round_trips)
+
+def create_job_exporter(job, query_number, neo4j_graph_connection):
+    """
+    Create the exporter of a query, the file exporters write to the output path with the query number appended.
+    """
+    return exporters.create_exporter(job["exporter"], f"{job['output']}.{query_number}", neo4j_graph_connection)
+
+def write_profile(profiler, path):
+    """
+    Write the totals of a profiler, in the Prometheus text format if the path ends with .prom, otherwise as JSON.
+    """
+    with open(path, 'w') as file:
+        file.write(profiler.to_prometheus() if path.endswith('.prom') else profiler.to_json())
+
+def run_job(job, results_file):
+    """
+    Run all queries of a job against one attack graph build and write the results.
+
+    Parameters:
+    - job: The job dictionary, see load_job.
+    - results_file: The open file the JSON result lines are written to.
+
+    Returns:
+    - results: The list of query results.
+    """
+    profiler = instrumentation.Profiler() if job["profile"] else instrumentation.DISABLED
+    if job["graph_cache"] and not job["use_ttc"] and not job["neo4j_ingest"]:
+        with profiler.phase('load_graph'):
+            entry = graph_cache.load_or_build(
+                job["graph_cache"], job["mar_archive"], job["model"], job["cost_file"],
+                lambda: build_attack_simulation(job, profiler), job["attacker"]
+            )
+        runner = CompiledQueryRunner.from_graph_cache_entry(entry, profiler)
+    else:
+        runner = CompiledQueryRunner.from_attack_simulation(build_attack_simulation(job, profiler), profiler)
+    neo4j_graph_connection = None
+    if job["exporter"] == 'neo4j':
+        from py2neo import Graph
+        neo4j_graph_connection = Graph(uri=constants.URI, user=constants.USERNAME, password=constants.PASSWORD, name=constants.DBNAME)
+
+    results = []
+    for query_number, query in enumerate(expand_queries(job["queries"])):
+        with profiler.phase('query') as record:
+            result = runner.run(query)
+            if job["exporter"] and "error" not in result:
+                runner.export(create_job_exporter(job, query_number, neo4j_graph_connection))
+        if profiler.enabled:
+            result["profile"] = record["counters"]
+        results_file.write(json.dumps(result) + '\n')
+        results_file.flush()
+        results.append(result)
+    if profiler.enabled:
+        write_profile(profiler, job["profile"])
+    return results
+
+def main(argv=None):
+    job = load_job(parse_args(argv))
+    if job["results"]:
+        with open(job["results"], 'w') as results_file:
+            run_job(job, results_file)
+    else:
+        run_job(job, sys.stdout)
+
+if __name__ == '__main__':
+    main()
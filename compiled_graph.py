@@ -0,0 +1,251 @@
+import hashlib
+import os
+
+import numpy as np
+
+# Node type codes used in CompiledAttackGraph.node_type, the index in the tuple is the code.
+NODE_TYPES = ('or', 'and', 'defense', 'exist', 'notExist')
+OR = NODE_TYPES.index('or')
+AND = NODE_TYPES.index('and')
+
+class CompiledAttackGraph:
+    """
+    A compact, array-backed view of an attack graph. The nodes get dense integer
+    indices and all node data is stored in numpy arrays:
+
+    - node_ids: The attack graph id of each node, sorted ascending.
+    - node_type: The type code of each node, see NODE_TYPES.
+    - is_necessary, is_viable: The necessity and viability flags of each node.
+    - cost: The cost of each node.
+    - child_offsets, child_targets: The children of node i are
+      child_targets[child_offsets[i]:child_offsets[i+1]] (CSR format).
+    - parent_offsets, parent_targets: The parents of each node in the same format.
+
+    The view is a snapshot, changes to the attack graph or the costs after
+    compilation are not reflected in it.
+    """
+
+    # The arrays written by save, the other arrays are computed from them.
+    ARRAYS = ('node_ids', 'node_type', 'is_necessary', 'is_viable', 'cost',
+              'child_offsets', 'child_targets', 'parent_offsets', 'parent_targets')
+
+    def __init__(self, node_ids, node_type, is_necessary, is_viable, cost,
+                 child_offsets, child_targets, parent_offsets, parent_targets):
+        self.node_ids = node_ids
+        self.node_type = node_type
+        self.is_necessary = is_necessary
+        self.is_viable = is_viable
+        self.cost = cost
+        self.child_offsets = child_offsets
+        self.child_targets = child_targets
+        self.parent_offsets = parent_offsets
+        self.parent_targets = parent_targets
+
+        # Nodes that an attacker can compromise at all.
+        self.is_traversable = is_viable & ((node_type == OR) | (node_type == AND))
+        # The number of necessary parents of each node.
+        edge_child = np.repeat(np.arange(len(node_ids)), np.diff(parent_offsets))
+        self.necessary_parent_count = np.bincount(
+            edge_child[is_necessary[parent_targets]], minlength=len(node_ids)
+        ).astype(np.int32)
+        # 'and' nodes that wait for their necessary parents, other nodes behave like 'or' nodes.
+        self.is_gated = (node_type == AND) & (self.necessary_parent_count > 0)
+        self._dense_ids = bool(len(node_ids) == 0 or \
+            (node_ids[0] == 0 and node_ids[-1] == len(node_ids) - 1))
+        self._unlisted_children = None
+
+    @classmethod
+    def from_attackgraph(cls, nodes, id_to_cost):
+        """
+        Compile attack graph nodes into a CompiledAttackGraph.
+
+        Parameters:
+        - nodes: The AttackGraphNode instances of the attack graph.
+        - id_to_cost: A dictionary, or a cost_table.CostTable, mapping node ids to costs, missing nodes get cost 0.
+
+        Returns:
+        - graph: The CompiledAttackGraph.
+        """
+        nodes = sorted(nodes, key=lambda node: node.id)
+        index_of = {node.id: i for i, node in enumerate(nodes)}
+        type_codes = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+
+        node_ids = np.fromiter((node.id for node in nodes), dtype=np.int64, count=len(nodes))
+        node_type = np.fromiter((type_codes[node.type] for node in nodes), dtype=np.int8, count=len(nodes))
+        is_necessary = np.fromiter((bool(node.is_necessary) for node in nodes), dtype=bool, count=len(nodes))
+        is_viable = np.fromiter((bool(node.is_viable) for node in nodes), dtype=bool, count=len(nodes))
+        if hasattr(id_to_cost, 'costs_of'):
+            # A cost_table.CostTable looks up all costs at once.
+            cost = id_to_cost.costs_of(node_ids)
+        else:
+            cost = np.fromiter((id_to_cost.get(node.id, 0) or 0 for node in nodes), dtype=np.float64, count=len(nodes))
+
+        child_offsets, child_targets = cls._build_csr([node.children for node in nodes], index_of)
+        parent_offsets, parent_targets = cls._build_csr([node.parents for node in nodes], index_of)
+        return cls(node_ids, node_type, is_necessary, is_viable, cost,
+                   child_offsets, child_targets, parent_offsets, parent_targets)
+
+    @classmethod
+    def from_edges(cls, node_type, cost, edges, is_necessary=None, is_viable=None):
+        """
+        Build a CompiledAttackGraph directly from arrays, the node ids are the indices.
+
+        Parameters:
+        - node_type: The type of each node, as type names or type codes.
+        - cost: The cost of each node.
+        - edges: The (parent, child) index pairs, as a sequence or an array of shape (E, 2).
+        - is_necessary: The necessity flag of each node, all True if None.
+        - is_viable: The viability flag of each node, all True if None.
+
+        Returns:
+        - graph: The CompiledAttackGraph.
+        """
+        num_nodes = len(cost)
+        if len(node_type) and isinstance(node_type[0], str):
+            node_type = [NODE_TYPES.index(name) for name in node_type]
+        node_type = np.asarray(node_type, dtype=np.int8)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        is_necessary = np.ones(num_nodes, dtype=bool) if is_necessary is None else np.asarray(is_necessary, dtype=bool)
+        is_viable = np.ones(num_nodes, dtype=bool) if is_viable is None else np.asarray(is_viable, dtype=bool)
+
+        child_offsets, child_targets = cls._csr_from_pairs(edges[:, 0], edges[:, 1], num_nodes)
+        parent_offsets, parent_targets = cls._csr_from_pairs(edges[:, 1], edges[:, 0], num_nodes)
+        return cls(np.arange(num_nodes, dtype=np.int64), node_type, is_necessary, is_viable,
+                   np.asarray(cost, dtype=np.float64), child_offsets, child_targets,
+                   parent_offsets, parent_targets)
+
+    @staticmethod
+    def _csr_from_pairs(sources, targets, num_nodes):
+        """
+        Build CSR offset and target arrays from (source, target) index arrays, keeping
+        the order of the pairs for each source.
+        """
+        order = np.argsort(sources, kind='stable')
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=offsets[1:])
+        return offsets, targets[order].astype(np.int32)
+
+    @staticmethod
+    def _build_csr(neighbor_lists, index_of):
+        """
+        Build CSR offset and target arrays from lists of neighbor nodes.
+        """
+        offsets = np.zeros(len(neighbor_lists) + 1, dtype=np.int64)
+        np.cumsum([len(neighbors) for neighbors in neighbor_lists], out=offsets[1:])
+        targets = np.fromiter(
+            (index_of[neighbor.id] for neighbors in neighbor_lists for neighbor in neighbors),
+            dtype=np.int32,
+            count=int(offsets[-1])
+        )
+        return offsets, targets
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.child_targets)
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes used by the arrays of the graph.
+        """
+        return sum(array.nbytes for array in vars(self).values() if isinstance(array, np.ndarray))
+
+    def fingerprint(self):
+        """
+        Get a hash of the graph structure, node flags and costs, used to detect if data
+        computed for a graph (e.g. landmark tables) still matches it. Both the child and the
+        parent arrays are hashed, the parents decide which nodes gate 'and' nodes.
+
+        Returns:
+        - fingerprint: A hex digest string.
+        """
+        digest = hashlib.sha256()
+        for array in (self.node_ids, self.node_type, self.is_necessary, self.is_viable, self.cost,
+                      self.child_offsets, self.child_targets, self.parent_offsets, self.parent_targets):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def save(self, directory):
+        """
+        Save the arrays of the graph as .npy files in a directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Load a graph saved with save.
+
+        Parameters:
+        - directory: The directory of the .npy files.
+        - mmap_mode: The numpy memory-map mode of the arrays, None to read them into memory.
+          The default 'r' maps the files read-only, so loading does not copy the arrays.
+
+        Returns:
+        - graph: The CompiledAttackGraph.
+        """
+        return cls(*(np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in cls.ARRAYS))
+
+    def index(self, node_id):
+        """
+        Get the dense index of an attack graph node id.
+
+        Parameters:
+        - node_id: The id of the node.
+
+        Returns:
+        - index: The index of the node.
+        """
+        if self._dense_ids:
+            index = node_id if 0 <= node_id < len(self.node_ids) else -1
+        else:
+            index = int(np.searchsorted(self.node_ids, node_id))
+        if index < 0 or index >= len(self.node_ids) or self.node_ids[index] != node_id:
+            raise KeyError(node_id)
+        return int(index)
+
+    def node_id(self, index):
+        """
+        Get the attack graph node id of a dense index.
+        """
+        return int(self.node_ids[index])
+
+    def children(self, index):
+        """
+        Get the child indices of a node as a list.
+        """
+        return self.child_targets[self.child_offsets[index]:self.child_offsets[index + 1]].tolist()
+
+    def unlisted_children(self):
+        """
+        Get the children that do not list a node among their parents, e.g. the entry points
+        of the attacker node that AttackSimulation adds. Such an edge lets the attacker reach
+        an 'or' child, but does not count as a necessary parent of an 'and' child.
+
+        Returns:
+        - unlisted: A dictionary mapping node indices to the set of their unlisted child indices,
+          nodes without unlisted children are left out.
+        """
+        if self._unlisted_children is None:
+            # Encode the (parent, child) pairs of both CSR arrays as parent * N + child.
+            num_nodes = len(self.node_ids)
+            nodes = np.arange(num_nodes, dtype=np.int64)
+            child_edges = np.repeat(nodes, np.diff(self.child_offsets)) * num_nodes + self.child_targets
+            parent_edges = self.parent_targets.astype(np.int64) * num_nodes + np.repeat(nodes, np.diff(self.parent_offsets))
+            unlisted = {}
+            for edge in child_edges[~np.isin(child_edges, parent_edges)].tolist():
+                unlisted.setdefault(edge // num_nodes, set()).add(edge % num_nodes)
+            self._unlisted_children = unlisted
+        return self._unlisted_children
+
+    def parents(self, index):
+        """
+        Get the parent indices of a node as a list.
+        """
+        return self.parent_targets[self.parent_offsets[index]:self.parent_offsets[index + 1]].tolist()
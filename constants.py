@@ -10,9 +10,20 @@ ATTACK_OPTIONS = {
     "1": "step by step attack",
     "2": "shortest path with dijkstra",
     "3": "random path",
-    "4": "breadth first search"
+    "4": "breadth first search",
+    "5": "reachability within cost budget"
     }
 
+# Result exporters, see exporters.create_exporter().
+EXPORTER_OPTIONS = {
+    "neo4j": "upload to the Neo4j database",
+    "jsonl": "JSON Lines files",
+    "graphml": "GraphML file",
+    "parquet": "Parquet files (requires pyarrow)",
+    "arrow": "Arrow IPC files (requires pyarrow)"
+    }
+EXPORT_PATH = "results"
+
 # Used in AttackSimulation.step_by_step_attack_simulation().
 STEP_BY_STEP_ATTACK_COMMANDS = {
     "1": "view horizon",
@@ -26,6 +37,9 @@ USERNAME = "neo4j"
 PASSWORD = "mgg12345!"
 DBNAME = "neo4j"
 
+# Upload the full model and attack graph to Neo4j before the simulation in main.py.
+NEO4J_INGEST = True
+
 MODEL_FILE = "assets/model_0.1.6.json"
 COST_FILE = "assets/costs.json"
 MAR_ARCHIVE = "assets/org.mal-lang.coreLang-1.0.0.mar"
@@ -0,0 +1,151 @@
+from collections.abc import Mapping
+import sys
+
+import numpy as np
+
+import help_functions
+
+# A cost table is stored as <name>.costs.npy with the costs and <name>.ids.npy with the
+# attack step ids, sorted ascending, of each cost.
+COSTS_SUFFIX = ".costs.npy"
+IDS_SUFFIX = ".ids.npy"
+
+def is_cost_table(path):
+    """
+    Return True if a cost file name is the costs file of a cost table.
+    """
+    return str(path).endswith(COSTS_SUFFIX)
+
+def ids_file(path):
+    """
+    Get the ids file of the cost table with the given costs file.
+    """
+    return path[:-len(COSTS_SUFFIX)] + IDS_SUFFIX
+
+def source_files(cost_file):
+    """
+    Get the files the costs of a cost file are read from: the file itself, and the ids
+    file for a cost table.
+    """
+    return [cost_file, ids_file(cost_file)] if is_cost_table(cost_file) else [cost_file]
+
+class CostTable(Mapping):
+    """
+    Attack step costs stored in two numpy arrays, the attack step ids sorted ascending and
+    the cost of each. It is a read-only mapping from ids to costs, so it can be used in
+    place of a {id: cost} dictionary, and the compiled graph takes all costs with one
+    vectorized lookup.
+    """
+
+    def __init__(self, ids, costs):
+        """
+        Parameters:
+        - ids: The attack step ids, sorted ascending.
+        - costs: The cost of each id.
+        """
+        if len(ids) != len(costs):
+            raise ValueError(f"The cost table has {len(ids)} ids but {len(costs)} costs")
+        self.ids = ids
+        self.costs = costs
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __getitem__(self, node_id):
+        position = int(np.searchsorted(self.ids, node_id))
+        if position == len(self.ids) or self.ids[position] != node_id:
+            raise KeyError(node_id)
+        return float(self.costs[position])
+
+    def costs_of(self, node_ids):
+        """
+        Get the costs of an array of attack step ids.
+
+        Parameters:
+        - node_ids: A numpy array of ids.
+
+        Returns:
+        - costs: A numpy array with the cost of each id, 0 for ids that are not in the table.
+        """
+        if len(self.ids) == 0:
+            return np.zeros(len(node_ids))
+        positions = np.minimum(np.searchsorted(self.ids, node_ids), len(self.ids) - 1)
+        found = self.ids[positions] == node_ids
+        return np.where(found, self.costs[positions], 0.0)
+
+    def save(self, cost_file):
+        """
+        Save the table, cost_file is the name of the costs file and must end with COSTS_SUFFIX.
+        """
+        if not is_cost_table(cost_file):
+            raise ValueError(f"The name of a cost table must end with {COSTS_SUFFIX}, not {cost_file!r}")
+        np.save(cost_file, np.asarray(self.costs, dtype=np.float64))
+        np.save(ids_file(cost_file), np.asarray(self.ids, dtype=np.int64))
+
+    @classmethod
+    def load(cls, cost_file, mmap_mode='r'):
+        """
+        Load a table saved with save. By default the arrays are memory-mapped read-only, so
+        the costs are not copied.
+
+        Parameters:
+        - cost_file: The costs file of the table.
+        - mmap_mode: The numpy memory-map mode, None to read the arrays into memory.
+
+        Returns:
+        - table: The CostTable.
+        """
+        try:
+            return cls(np.load(ids_file(cost_file), mmap_mode=mmap_mode), np.load(cost_file, mmap_mode=mmap_mode))
+        except FileNotFoundError as error:
+            raise FileNotFoundError(f"The cost table {cost_file} or its ids file does not exist") from error
+
+    @classmethod
+    def from_full_names(cls, full_name_to_cost, attackgraph):
+        """
+        Create a table from costs keyed by attack step full name, e.g. a json cost file.
+
+        Parameters:
+        - full_name_to_cost: A dictionary mapping attack step full names to costs.
+        - attackgraph: The AttackGraph the full names are looked up in.
+
+        Returns:
+        - table: The CostTable.
+        """
+        ids = np.empty(len(full_name_to_cost), dtype=np.int64)
+        costs = np.empty(len(full_name_to_cost), dtype=np.float64)
+        for i, (full_name, cost) in enumerate(full_name_to_cost.items()):
+            node = attackgraph.get_node_by_full_name(full_name)
+            if node is None:
+                raise KeyError(f"The attack step {full_name!r} of the cost file is not in the attack graph")
+            ids[i] = node.id
+            costs[i] = cost
+        order = np.argsort(ids, kind='stable')
+        return cls(ids[order], costs[order])
+
+def convert_cost_file(json_file, cost_file, mar_archive, model_file):
+    """
+    Convert a json cost file keyed by attack step full name to a cost table for the
+    attack graph of a model.
+
+    Parameters:
+    - json_file: The json cost file.
+    - cost_file: The costs file of the new table, ending with COSTS_SUFFIX.
+    - mar_archive: The MAL language archive.
+    - model_file: The model file.
+    """
+    from maltoolbox.wrappers import create_attack_graph
+
+    attackgraph = create_attack_graph(mar_archive, model_file)
+    table = CostTable.from_full_names(help_functions.load_costs_from_file(json_file), attackgraph)
+    table.save(cost_file)
+    return table
+
+if __name__ == '__main__':
+    if len(sys.argv) != 5:
+        print(f"Usage: python cost_table.py <costs.json> <name{COSTS_SUFFIX}> <mar archive> <model file>")
+        sys.exit(1)
+    convert_cost_file(*sys.argv[1:])
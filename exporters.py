@@ -0,0 +1,255 @@
+from array import array
+import json
+import tempfile
+
+import neo4j_export
+
+# Number of rows per record batch of the columnar exporter.
+ARROW_BATCH_SIZE = 10000
+
+# Number of edges an EdgeSpool buffers in memory before it writes them to its file.
+EDGE_SPOOL_BATCH = 2**16
+
+# The exporter names accepted by create_exporter.
+EXPORTER_NAMES = ('neo4j', 'jsonl', 'graphml', 'parquet', 'arrow')
+
+class ResultExporter:
+    """
+    Writes a traversal result: the attack step records, see attack_path.node_record, and
+    the (from id, to id) path edges. Both are iterables that are consumed once, nodes first,
+    so a file exporter writes them as they come without holding the result in memory.
+    """
+
+    # The database round-trips of the last export, none for the file exporters.
+    round_trips = 0
+
+    def export(self, nodes, edges):
+        """
+        Write a traversal result.
+
+        Parameters:
+        - nodes: An iterable of attack step records.
+        - edges: An iterable of (from id, to id) tuples.
+        """
+        raise NotImplementedError
+
+class EdgeSpool:
+    """
+    Spools (from id, to id) edges to a temporary file while the attack steps of a streamed
+    result are written, since the exporters write the edges after the attack steps. The edges
+    are written and read back in batches of 64-bit ids, so the memory does not grow with the
+    number of edges.
+    """
+
+    def __init__(self, batch_size=EDGE_SPOOL_BATCH):
+        self.file = tempfile.TemporaryFile()
+        self.batch_size = batch_size
+        self.batch = array('q')
+
+    def add(self, from_id, to_id):
+        self.batch.append(from_id)
+        self.batch.append(to_id)
+        if len(self.batch) >= 2 * self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.batch.tofile(self.file)
+        self.batch = array('q')
+
+    def __iter__(self):
+        self.flush()
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(16 * self.batch_size)
+            if not chunk:
+                break
+            ids = array('q')
+            ids.frombytes(chunk)
+            yield from zip(ids[0::2], ids[1::2])
+
+    def close(self):
+        self.file.close()
+
+class JsonLinesExporter(ResultExporter):
+    """
+    Writes the attack steps and the edges as JSON Lines files, one JSON object per line.
+    """
+
+    def __init__(self, nodes_path, edges_path):
+        """
+        Parameters:
+        - nodes_path: The file of the attack step records.
+        - edges_path: The file of the edges, with one {"from": id, "to": id} object per line.
+        """
+        self.nodes_path = nodes_path
+        self.edges_path = edges_path
+
+    def export(self, nodes, edges):
+        with open(self.nodes_path, 'w') as file:
+            for record in nodes:
+                file.write(json.dumps(record) + '\n')
+        with open(self.edges_path, 'w') as file:
+            for from_id, to_id in edges:
+                file.write(json.dumps({"from": from_id, "to": to_id}) + '\n')
+
+class GraphMLExporter(ResultExporter):
+    """
+    Writes the traversal result as a directed GraphML graph, with the attack step record
+    fields as node data. The ttc is written as JSON.
+    """
+
+    KEY_TYPES = {
+        'name': 'string', 'full_name': 'string', 'type': 'string', 'ttc': 'string',
+        'is_necessary': 'boolean', 'is_viable': 'boolean', 'is_horizon_node': 'boolean', 'cost': 'double'
+    }
+
+    def __init__(self, path):
+        """
+        Parameters:
+        - path: The GraphML file.
+        """
+        self.path = path
+
+    def export(self, nodes, edges):
+        # Imported here, xml.sax loads urllib which slows down the start of every run.
+        from xml.sax.saxutils import escape, quoteattr
+
+        with open(self.path, 'w') as file:
+            file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            file.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+            for key, key_type in self.KEY_TYPES.items():
+                file.write(f'  <key id="{key}" for="node" attr.name="{key}" attr.type="{key_type}"/>\n')
+            file.write('  <graph edgedefault="directed">\n')
+            for record in nodes:
+                file.write(f'    <node id={quoteattr(str(record["id"]))}>\n')
+                for key in self.KEY_TYPES:
+                    value = record[key]
+                    if value is None:
+                        continue
+                    if key == 'ttc':
+                        value = json.dumps(value)
+                    elif isinstance(value, bool):
+                        value = str(value).lower()
+                    file.write(f'      <data key="{key}">{escape(str(value))}</data>\n')
+                file.write('    </node>\n')
+            for from_id, to_id in edges:
+                file.write(f'    <edge source={quoteattr(str(from_id))} target={quoteattr(str(to_id))}/>\n')
+            file.write('  </graph>\n')
+            file.write('</graphml>\n')
+
+class ArrowExporter(ResultExporter):
+    """
+    Writes the attack steps and the edges as columnar Parquet or Arrow IPC files in record
+    batches. The ttc is written as JSON. Requires the optional pyarrow package.
+    """
+
+    def __init__(self, nodes_path, edges_path, file_format='parquet', batch_size=ARROW_BATCH_SIZE):
+        """
+        Parameters:
+        - nodes_path: The file of the attack step records.
+        - edges_path: The file of the edges, with the columns from and to.
+        - file_format: 'parquet' or 'arrow'.
+        - batch_size: The number of rows per record batch.
+        """
+        if file_format not in ('parquet', 'arrow'):
+            raise ValueError(f"file_format must be 'parquet' or 'arrow', not {file_format!r}")
+        try:
+            import pyarrow
+        except ImportError as error:
+            raise ImportError("The Parquet and Arrow exporters require pyarrow, install it with pip install pyarrow") from error
+        self.pyarrow = pyarrow
+        self.nodes_path = nodes_path
+        self.edges_path = edges_path
+        self.file_format = file_format
+        self.batch_size = batch_size
+
+    def node_schema(self):
+        pa = self.pyarrow
+        return pa.schema([
+            ('id', pa.int64()), ('name', pa.string()), ('full_name', pa.string()), ('type', pa.string()),
+            ('ttc', pa.string()), ('is_necessary', pa.bool_()), ('is_viable', pa.bool_()),
+            ('is_horizon_node', pa.bool_()), ('cost', pa.float64())
+        ])
+
+    def edge_schema(self):
+        pa = self.pyarrow
+        return pa.schema([('from', pa.int64()), ('to', pa.int64())])
+
+    def write_batches(self, path, schema, rows):
+        """
+        Write rows (dictionaries) to a file in record batches of batch_size rows.
+        """
+        pa = self.pyarrow
+        if self.file_format == 'parquet':
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            writer = pa.ipc.new_file(path, schema)
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == self.batch_size:
+                    writer.write_batch(pa.RecordBatch.from_pylist(batch, schema))
+                    batch = []
+            if batch:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema))
+        finally:
+            writer.close()
+
+    def export(self, nodes, edges):
+        self.write_batches(
+            self.nodes_path, self.node_schema(),
+            (dict(record, ttc=json.dumps(record["ttc"])) for record in nodes)
+        )
+        self.write_batches(
+            self.edges_path, self.edge_schema(),
+            ({"from": from_id, "to": to_id} for from_id, to_id in edges)
+        )
+
+class Neo4jExporter(ResultExporter):
+    """
+    Uploads the traversal result to Neo4j, see neo4j_export.Neo4jBatchExporter. Everything in
+    the database is deleted first.
+    """
+
+    def __init__(self, neo4j_graph_connection, batch_size=neo4j_export.NEO4J_BATCH_SIZE):
+        """
+        Parameters:
+        - neo4j_graph_connection: The Neo4j Graph instance.
+        - batch_size: The number of nodes or relationships written per statement.
+        """
+        self.neo4j_graph_connection = neo4j_graph_connection
+        self.batch_size = batch_size
+
+    def export(self, nodes, edges):
+        rows = [
+            (record["id"], neo4j_export.record_labels(record), neo4j_export.record_properties(record))
+            for record in nodes
+        ]
+        exporter = neo4j_export.Neo4jBatchExporter(self.neo4j_graph_connection, self.batch_size)
+        exporter.upload(rows, list(edges))
+        self.round_trips = exporter.round_trips
+
+def create_exporter(name, path=None, neo4j_graph_connection=None):
+    """
+    Create an exporter by name.
+
+    Parameters:
+    - name: One of EXPORTER_NAMES.
+    - path: The output path of the file exporters without extension, e.g. 'results'
+      gives results.nodes.jsonl and results.edges.jsonl, or results.graphml.
+    - neo4j_graph_connection: The Neo4j Graph instance of the neo4j exporter.
+
+    Returns:
+    - exporter: The ResultExporter.
+    """
+    if name == 'neo4j':
+        return Neo4jExporter(neo4j_graph_connection)
+    if name == 'jsonl':
+        return JsonLinesExporter(f"{path}.nodes.jsonl", f"{path}.edges.jsonl")
+    if name == 'graphml':
+        return GraphMLExporter(f"{path}.graphml")
+    if name in ('parquet', 'arrow'):
+        return ArrowExporter(f"{path}.nodes.{name}", f"{path}.edges.{name}", name)
+    raise ValueError(f"The exporter must be one of {EXPORTER_NAMES}, not {name!r}")
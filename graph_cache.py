@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from compiled_graph import CompiledAttackGraph, NODE_TYPES
+import cost_table
+
+# Bump when the layout of a cache entry changes, old entries are then never loaded.
+GRAPH_CACHE_VERSION = 1
+
+# Files in the cache directory and in each entry.
+DIGEST_INDEX_FILE = "digests.json"
+METADATA_FILE = "metadata.json"
+
+# Bytes read at a time when hashing a file.
+DIGEST_CHUNK_SIZE = 2**20
+
+def file_digest(path, digests=None):
+    """
+    Get the sha256 digest of a file. A file whose size and modification time match the
+    digest index is not read again.
+
+    Parameters:
+    - path: The file.
+    - digests: A dictionary {absolute path: [size, mtime_ns, digest]} that is used and
+      updated, or None.
+
+    Returns:
+    - digest: A hex digest string.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    if digests is not None and digests.get(path, [None])[:2] == signature:
+        return digests[path][2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(DIGEST_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    if digests is not None:
+        digests[path] = signature + [digest.hexdigest()]
+    return digest.hexdigest()
+
+def cache_key(cache_dir, mar_archive, model_file, cost_file, attacker=0):
+    """
+    Get the cache key of a compiled attack graph: a hash of the contents of the MAR archive,
+    the model file and the cost file, the attacker index and the cache version. Any change
+    of the inputs gives a new key, so a stale entry is never loaded.
+
+    Parameters:
+    - cache_dir: The cache directory, its digest index is used and updated.
+    - mar_archive: The MAL language archive.
+    - model_file: The model file.
+    - cost_file: The json file or the cost table with the attack step costs.
+    - attacker: The index of the attacker in the model.
+
+    Returns:
+    - key: A hex digest string.
+    """
+    index_file = os.path.join(cache_dir, DIGEST_INDEX_FILE)
+    digests = {}
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as file:
+            try:
+                digests = json.load(file)
+            except ValueError:
+                # An index written by an older version that was not replaced atomically.
+                digests = {}
+    parts = [GRAPH_CACHE_VERSION, attacker] + [
+        file_digest(path, digests) for path in [mar_archive, model_file] + cost_table.source_files(cost_file)
+    ]
+    write_digest_index(index_file, digests)
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def write_digest_index(index_file, digests):
+    """
+    Write the digest index to a temporary file in the cache directory and rename it over the
+    index, so a run reading it at the same time never sees a partly written index. When two
+    runs write it at once the last one wins, a lost digest only means a file is hashed again.
+    """
+    cache_dir = os.path.dirname(index_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    descriptor, temporary_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(digests, file)
+        os.replace(temporary_file, index_file)
+    except BaseException:
+        os.unlink(temporary_file)
+        raise
+
+class GraphCacheEntry:
+    """
+    A compiled attack graph with the metadata of its nodes, as stored in the cache.
+
+    Attributes:
+    - graph: The CompiledAttackGraph.
+    - names, full_names, ttcs: Byte string arrays with the name, full name and ttc (as JSON)
+      of each node.
+    - sorted_full_names, full_name_order: The full names in sorted order and the node index
+      of each, used to look up nodes by full name.
+    - start: The index of the attacker node.
+    """
+
+    METADATA_ARRAYS = ('names', 'full_names', 'ttcs', 'sorted_full_names', 'full_name_order')
+
+    def __init__(self, graph, names, full_names, ttcs, sorted_full_names, full_name_order, start):
+        self.graph = graph
+        self.names = names
+        self.full_names = full_names
+        self.ttcs = ttcs
+        self.sorted_full_names = sorted_full_names
+        self.full_name_order = full_name_order
+        self.start = start
+
+    @classmethod
+    def from_attack_simulation(cls, attack_simulation):
+        """
+        Create an entry from the compiled graph and the attack graph nodes of an AttackSimulation.
+        """
+        graph = attack_simulation.get_compiled_graph()
+        nodes = [attack_simulation.attackgraph_dictionary[node_id] for node_id in graph.node_ids.tolist()]
+        names = np.array([node.name.encode() for node in nodes], dtype=bytes)
+        full_names = np.array([node.full_name.encode() for node in nodes], dtype=bytes)
+        ttcs = np.array([json.dumps(node.ttc).encode() for node in nodes], dtype=bytes)
+        full_name_order = np.argsort(full_names, kind='stable')
+        return cls(graph, names, full_names, ttcs, full_names[full_name_order], full_name_order,
+                   graph.index(attack_simulation.start_node))
+
+    def save(self, directory, sources=None):
+        """
+        Save the entry as .npy files and a metadata file in a directory.
+
+        Parameters:
+        - directory: The directory.
+        - sources: The source files and attacker index the entry was built from, or None.
+        """
+        self.graph.save(directory)
+        for name in self.METADATA_ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+        with open(os.path.join(directory, METADATA_FILE), 'w') as file:
+            json.dump({"version": GRAPH_CACHE_VERSION, "start": self.start, "sources": sources}, file)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load an entry saved with save, all arrays are memory-mapped read-only.
+        """
+        with open(os.path.join(directory, METADATA_FILE), 'r') as file:
+            metadata = json.load(file)
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in cls.METADATA_ARRAYS]
+        return cls(CompiledAttackGraph.load(directory), *arrays, metadata["start"])
+
+    def index(self, attack_step):
+        """
+        Get the index of an attack step given by id or full name.
+
+        Parameters:
+        - attack_step: The id (an int or a string of digits) or the full name.
+
+        Returns:
+        - index: The index of the node.
+
+        Raises:
+        - KeyError: If there is no such attack step.
+        """
+        if isinstance(attack_step, int) or str(attack_step).isdigit():
+            return self.graph.index(int(attack_step))
+        full_name = attack_step.encode()
+        position = int(np.searchsorted(self.sorted_full_names, full_name))
+        if position == len(self.sorted_full_names) or self.sorted_full_names[position] != full_name:
+            raise KeyError(attack_step)
+        return int(self.full_name_order[position])
+
+    def node_record(self, index, is_horizon_node=False):
+        """
+        Get the exported record of a node, see attack_path.node_record.
+        """
+        graph = self.graph
+        return {
+            "id": graph.node_id(index),
+            "name": self.names[index].decode(),
+            "full_name": self.full_names[index].decode(),
+            "type": NODE_TYPES[graph.node_type[index]],
+            "ttc": json.loads(self.ttcs[index]),
+            "is_necessary": bool(graph.is_necessary[index]),
+            "is_viable": bool(graph.is_viable[index]),
+            "is_horizon_node": is_horizon_node,
+            "cost": float(graph.cost[index]) if index != self.start else None,
+        }
+
+def prune_stale_entries(cache_dir, sources, key):
+    """
+    Delete the entries of the cache that were built from the same source files as a new
+    entry, they can never be loaded again.
+    """
+    for name in os.listdir(cache_dir):
+        metadata_file = os.path.join(cache_dir, name, METADATA_FILE)
+        if name == key or not os.path.exists(metadata_file):
+            continue
+        with open(metadata_file, 'r') as file:
+            if json.load(file).get("sources") == sources:
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+def load_or_build(cache_dir, mar_archive, model_file, cost_file, build, attacker=0):
+    """
+    Load a compiled attack graph from the cache, or build and cache it if there is no
+    entry for the current contents of the input files.
+
+    Parameters:
+    - cache_dir: The cache directory.
+    - mar_archive: The MAL language archive.
+    - model_file: The model file.
+    - cost_file: The json file with the attack step costs.
+    - build: A function without arguments that returns the AttackSimulation of the inputs,
+      it is only called if the entry is not cached.
+    - attacker: The index of the attacker in the model.
+
+    Returns:
+    - entry: The GraphCacheEntry, memory-mapped from the cache.
+    """
+    key = cache_key(cache_dir, mar_archive, model_file, cost_file, attacker)
+    directory = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(directory, METADATA_FILE)):
+        return GraphCacheEntry.load(directory)
+
+    # Write to a temporary directory first, so a partly written entry is never loaded.
+    entry = GraphCacheEntry.from_attack_simulation(build())
+    sources = [os.path.abspath(path) for path in (mar_archive, model_file, cost_file)] + [attacker]
+    temporary_directory = tempfile.mkdtemp(dir=cache_dir)
+    entry.save(temporary_directory, sources)
+    try:
+        os.rename(temporary_directory, directory)
+    except OSError:
+        # Another process cached the same entry first.
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+    prune_stale_entries(cache_dir, sources, key)
+    return GraphCacheEntry.load(directory)
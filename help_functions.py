@@ -47,68 +47,114 @@ def calculate_cost_and_save_as_json(node_list, output_file):
     with open(output_file, 'w') as file:
         json.dump(costs_dict, file)
 
-def load_costs_from_file():
+def load_costs_from_file(cost_file=constants.COST_FILE):
     """
     Load cost from file.
+
+    Arguments:
+    cost_file       - the json file with the costs.
     
     Return:
     costs_dict      - dictionary
+
+    Raises:
+    FileNotFoundError   - if the cost file does not exist.
+    ValueError          - if the cost file is not a json object of costs.
     """
     try:
-        with open(constants.COST_FILE, 'r') as file:
+        with open(cost_file, 'r') as file:
             costs_dict = json.load(file)
-        return costs_dict
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Handle file not found or invalid JSON
-        return {}
+    except FileNotFoundError as error:
+        raise FileNotFoundError(f"The cost file {cost_file} does not exist") from error
+    except json.JSONDecodeError as error:
+        raise ValueError(f"The cost file {cost_file} is not valid json: {error}") from error
+    if not isinstance(costs_dict, dict):
+        raise ValueError(f"The cost file {cost_file} must contain a json object mapping attack step full names to costs")
+    return costs_dict
+
+# Upper bound used for the constant part of the uncertain TTC distributions.
+TTC_MAX_COST = 500
+
+# Number of samples drawn per numpy call in sample_costs_from_ttc.
+TTC_SAMPLE_CHUNK_SIZE = 2**20
+
+# The named TTC distributions as (exponential rate, bernoulli probability).
+TTC_DISTRIBUTIONS = {
+    "EasyAndCertain": (1, 0),
+    "EasyAndUncertain": (1, 0.5),
+    "HardAndCertain": (0.1, 0),
+    "HardAndUncertain": (0.1, 0.5),
+    "VeryHardAndCertain": (0.01, 0),
+    "VeryHardAndUncertain": (0.01, 0.5),
+}
+
+def ttc_parameters(ttc):
+    """
+    Get the sampling parameters of a TTC distribution.
+
+    Arguments:
+    ttc             - the ttc dictionary of an attack step.
 
-def cost_from_ttc(ttc, num_samples=100):
-    sum_of_samples = 0
+    Return:
+    parameters      - a tuple (exponential rate, bernoulli probability), or None
+                      if the distribution has no cost (empty, unknown or a defense).
+    """
+    if not ttc:
+        return None
     distribution = ttc['name']
-    for _ in range(num_samples):
-        sample = 0
-        if distribution == "EasyAndCertain":
-            # Generate sample for EasyAndCertain distribution.
-            sample = process_sample({'Exponential': 1})
-        elif distribution == "EasyAndUncertain":
-            # Generate sample for EasyAndUncertain distribution.
-            sample = process_sample({'Exponential': 1, 'Bernoulli': 0.5})
-        elif distribution == "HardAndCertain":
-            # Generate sample for HardAndCertain distribution.
-            sample = process_sample({'Exponential': 0.1})
-        elif distribution == "HardAndUncertain":
-            # Generate sample for HardAndUncertain distribution.
-            sample = process_sample({'Exponential': 0.1, 'Bernoulli': 0.5})
-        elif distribution == "VeryHardAndCertain":
-            # Generate sample for VeryHardAndCertain distribution.
-            sample = process_sample({'Exponential': 0.01})
-        elif distribution == "VeryHardAndUncertain":
-            # Generate sample for VeryHardAndUncertain distribution.
-            sample = process_sample({'Exponential': 0.01, 'Bernoulli': 0.5})
-        elif distribution == "Exponential":
-            # Generate sample for custom Exponential distribution.
-            scale = float(ttc['arguments'][0])
-            sample = process_sample({'Exponential': scale})
-        sum_of_samples += sample
-
-    cost = sum_of_samples / num_samples
-    return cost
-
-def process_sample(distribution):
-    MAX_COST = 500
-    # Generate a random sample for the given distribution
-    if 'Bernoulli' in distribution:
-        # Mixture of exponential and constant distribution
-        prob = distribution['Bernoulli']
-        scale = distribution['Exponential']
-        scale = 1/scale
-        sample = np.random.exponential(scale=scale) if np.random.choice([0, 1], p=[prob, 1 - prob]) else MAX_COST
-    else:
-        # Pure exponential distribution
-        scale = distribution['Exponential']
-        scale = 1/scale
-        sample = np.random.exponential(scale=scale)
-    return sample
+    if distribution == "Exponential":
+        return (float(ttc['arguments'][0]), 0)
+    return TTC_DISTRIBUTIONS.get(distribution)
+
+def sample_costs_from_ttc(ttcs, num_samples=100, rng=None):
+    """
+    Calculates the cost of many attack steps as the mean of samples drawn from their
+    TTC distributions. The attack steps are grouped by distribution and all samples
+    of a group are drawn with a few numpy calls.
+
+    Arguments:
+    ttcs            - a list of ttc dictionaries, one per attack step.
+    num_samples     - the number of samples per attack step.
+    rng             - a numpy.random.Generator, a seed or None.
+
+    Return:
+    costs           - a numpy array with the cost of each attack step, 0 for attack
+                      steps without a (known) TTC distribution.
+    """
+    rng = np.random.default_rng(rng)
+    costs = np.zeros(len(ttcs))
+
+    groups = {}
+    for index, ttc in enumerate(ttcs):
+        parameters = ttc_parameters(ttc)
+        if parameters is not None:
+            groups.setdefault(parameters, []).append(index)
+
+    rows_per_chunk = max(1, TTC_SAMPLE_CHUNK_SIZE // num_samples)
+    for (rate, prob), indices in groups.items():
+        indices = np.asarray(indices)
+        for start in range(0, len(indices), rows_per_chunk):
+            chunk = indices[start:start + rows_per_chunk]
+            samples = rng.exponential(scale=1/rate, size=(len(chunk), num_samples))
+            if prob:
+                # Mixture of exponential and constant distribution.
+                samples[rng.random(samples.shape) < prob] = TTC_MAX_COST
+            costs[chunk] = samples.mean(axis=1)
+    return costs
+
+def cost_from_ttc(ttc, num_samples=100, rng=None):
+    """
+    Calculates the cost of one attack step from samples drawn from its TTC distribution.
+
+    Arguments:
+    ttc             - the ttc dictionary of the attack step.
+    num_samples     - the number of samples.
+    rng             - a numpy.random.Generator, a seed or None.
+
+    Return:
+    cost            - the mean of the samples.
+    """
+    return sample_costs_from_ttc([ttc], num_samples, rng)[0]
 
 def add_entry_points_to_attacker(model, entry_point_attack_steps, attacker_index=0):
     for asset_id, attack_steps in entry_point_attack_steps:
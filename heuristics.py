@@ -0,0 +1,186 @@
+import heapq
+import os
+
+import numpy as np
+
+# Landmark tables are cached next to the model file with this suffix.
+LANDMARK_CACHE_SUFFIX = ".landmarks.npz"
+
+def plain_distances(graph, source, reverse=False):
+    """
+    Compute attack path costs from (or to) one node ignoring the 'and' logic, i.e. every
+    traversable node is treated as an 'or' node. The costs are lower bounds of the costs
+    computed by shortest_path.shortest_attack_paths.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - source: The index of the node to start from.
+    - reverse: If True, follow the parent edges and compute the cost from every node
+      to the source instead.
+
+    Returns:
+    - distances: A numpy array with the cost of every node, inf if not connected.
+    """
+    inf = float('inf')
+    distances = [inf] * graph.num_nodes
+    distances[source] = 0.0
+    done = bytearray(graph.num_nodes)
+    node_cost = graph.cost.tolist()
+    is_traversable = graph.is_traversable.tolist()
+    if reverse:
+        offsets, targets = graph.parent_offsets.tolist(), graph.parent_targets
+    else:
+        offsets, targets = graph.child_offsets.tolist(), graph.child_targets
+
+    open_set = [(0.0, source)]
+    while open_set:
+        distance, current = heapq.heappop(open_set)
+        if done[current]:
+            continue
+        done[current] = 1
+        # Moving forward costs the node entered, moving backward the node left.
+        step_cost = node_cost[current] if reverse else 0.0
+        for neighbor in targets[offsets[current]:offsets[current + 1]].tolist():
+            if done[neighbor] or not is_traversable[neighbor]:
+                continue
+            tentative = distance + (step_cost if reverse else node_cost[neighbor])
+            if tentative < distances[neighbor]:
+                distances[neighbor] = tentative
+                heapq.heappush(open_set, (tentative, neighbor))
+    return np.array(distances)
+
+def reverse_heuristic(graph, target):
+    """
+    Compute an admissible A* heuristic for a target with a reverse search that ignores
+    the 'and' logic.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - target: The index of the target node.
+
+    Returns:
+    - heuristic: A numpy array with a lower bound of the remaining cost from every node
+      to the target, inf for nodes that can not reach it.
+    """
+    return plain_distances(graph, target, reverse=True)
+
+class LandmarkHeuristic:
+    """
+    Landmark (ALT) distance tables for A* searches. For a set of landmark nodes the costs
+    from and to every node are stored once per graph, and a lower bound of the cost between
+    any node and a target follows from the triangle inequality.
+
+    Attributes:
+    - landmarks: The indices of the landmark nodes.
+    - from_landmark: Array (landmarks x nodes) with the cost from each landmark to every node.
+    - to_landmark: Array (landmarks x nodes) with the cost from every node to each landmark.
+    - fingerprint: The fingerprint of the graph the tables were built for.
+    """
+
+    def __init__(self, landmarks, from_landmark, to_landmark, fingerprint):
+        self.landmarks = landmarks
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, graph, num_landmarks=8, seed=None):
+        """
+        Select landmarks and compute their distance tables. The first landmark is a random
+        traversable node, every next one is the node farthest from the landmarks so far.
+
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - num_landmarks: The number of landmarks.
+        - seed: The seed used to select the first landmark.
+
+        Returns:
+        - heuristic: The LandmarkHeuristic.
+        """
+        candidates = np.flatnonzero(graph.is_traversable)
+        landmarks = []
+        from_landmark = []
+        to_landmark = []
+        closest = np.full(graph.num_nodes, np.inf)
+        if len(candidates):
+            landmark = int(np.random.default_rng(seed).choice(candidates))
+            for _ in range(min(num_landmarks, len(candidates))):
+                landmarks.append(landmark)
+                from_landmark.append(plain_distances(graph, landmark))
+                to_landmark.append(plain_distances(graph, landmark, reverse=True))
+                closest = np.minimum(closest, np.minimum(from_landmark[-1], to_landmark[-1]))
+                spread = np.where(np.isfinite(closest), closest, -1)[candidates]
+                landmark = int(candidates[np.argmax(spread)])
+                if spread.max() <= 0:
+                    break
+
+        shape = (len(landmarks), graph.num_nodes)
+        return cls(
+            np.array(landmarks, dtype=np.int64),
+            np.array(from_landmark).reshape(shape),
+            np.array(to_landmark).reshape(shape),
+            graph.fingerprint()
+        )
+
+    def for_target(self, target):
+        """
+        Get the A* heuristic of a target.
+
+        Parameters:
+        - target: The index of the target node.
+
+        Returns:
+        - heuristic: A numpy array with a lower bound of the remaining cost from every node
+          to the target, inf for nodes that can not reach it.
+        """
+        heuristic = np.zeros(self.from_landmark.shape[1])
+        with np.errstate(invalid='ignore'):
+            # cost(L, t) <= cost(L, v) + cost(v, t)
+            from_bound = self.from_landmark[:, [target]] - self.from_landmark
+            # cost(v, L) <= cost(v, t) + cost(t, L)
+            to_bound = self.to_landmark - self.to_landmark[:, [target]]
+        for bound in (from_bound, to_bound):
+            # inf - inf means the landmark tells nothing about the node.
+            bound = np.where(np.isnan(bound), 0, bound)
+            heuristic = np.maximum(heuristic, bound.max(axis=0, initial=0))
+        heuristic[target] = 0
+        return heuristic
+
+    def save(self, path):
+        """
+        Save the landmark tables to a .npz file.
+        """
+        np.savez(path, landmarks=self.landmarks, from_landmark=self.from_landmark,
+                 to_landmark=self.to_landmark, fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load landmark tables saved with save.
+        """
+        with np.load(path) as data:
+            return cls(data['landmarks'], data['from_landmark'], data['to_landmark'],
+                       str(data['fingerprint']))
+
+    @classmethod
+    def load_or_build(cls, graph, path, num_landmarks=8, seed=None):
+        """
+        Load the landmark tables of a graph from a file, or build and save them if the file
+        does not exist or was built for another graph.
+
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - path: The cache file, e.g. the model file name + LANDMARK_CACHE_SUFFIX.
+        - num_landmarks: The number of landmarks if the tables are built.
+        - seed: The seed used if the tables are built.
+
+        Returns:
+        - heuristic: The LandmarkHeuristic.
+        """
+        if os.path.exists(path):
+            heuristic = cls.load(path)
+            if heuristic.fingerprint == graph.fingerprint():
+                return heuristic
+        heuristic = cls.build(graph, num_landmarks, seed)
+        heuristic.save(path)
+        return heuristic
@@ -0,0 +1,172 @@
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import json
+import threading
+import time
+
+# The number of recent phase records a Profiler keeps.
+PROFILE_RECORDS = 1000
+
+# The prefix of the metric names in the Prometheus text format.
+PROMETHEUS_PREFIX = "mal_traverser"
+
+class Profiler:
+    """
+    Records the wall time of the phases of a run, e.g. the cost loading, the compilation,
+    the searches, the path reconstruction and the Neo4j upload, and counters such as the
+    expanded nodes, the relaxed edges, the heap pushes and pops and the database round-trips.
+
+    Every finished phase gives a record with its name, its time and the counters counted
+    while it ran, so a query phase has the counters of that query. The records of the
+    recent phases are kept and passed to the callback, and all phases and counters are
+    summed up in the totals. Phases can be nested, the counters then count for all open
+    phases of the thread.
+    """
+
+    enabled = True
+
+    def __init__(self, callback=None, max_records=PROFILE_RECORDS):
+        """
+        Parameters:
+        - callback: A function called with the record of every finished phase, or None.
+        - max_records: The number of recent records to keep.
+        """
+        self.callback = callback
+        self.records = deque(maxlen=max_records)
+        self.phases = {}
+        self.counters = {}
+        self.maxima = {}
+        self.lock = threading.Lock()
+        self.open_phases = threading.local()
+
+    def open_records(self):
+        records = getattr(self.open_phases, 'records', None)
+        if records is None:
+            records = self.open_phases.records = []
+        return records
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase in a with statement.
+
+        Parameters:
+        - name: The name of the phase.
+
+        Returns:
+        - record: A dictionary with the phase name, and the seconds and counters once the phase is done.
+        """
+        record = {"phase": name, "seconds": 0.0, "counters": {}}
+        open_records = self.open_records()
+        open_records.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            open_records.pop()
+            with self.lock:
+                calls, seconds = self.phases.get(name, (0, 0.0))
+                self.phases[name] = (calls + 1, seconds + record["seconds"])
+                self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def count(self, name, value=1):
+        """
+        Add to a counter of the open phases and of the totals.
+        """
+        for record in self.open_records():
+            counters = record["counters"]
+            counters[name] = counters.get(name, 0) + value
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def maximum(self, name, value):
+        """
+        Record the largest value of a measurement, e.g. the peak frontier size.
+        """
+        for record in self.open_records():
+            counters = record["counters"]
+            counters[name] = max(counters.get(name, value), value)
+        with self.lock:
+            self.maxima[name] = max(self.maxima.get(name, value), value)
+
+    def record_search(self, result):
+        """
+        Count the work of a search.
+
+        Parameters:
+        - result: The shortest_path.ShortestPathResult of the search.
+        """
+        self.count("searches")
+        self.count("nodes_expanded", result.expanded)
+        self.count("edges_relaxed", result.edges_relaxed())
+        self.count("heap_pushes", result.heap_pushes)
+        self.count("heap_pops", result.heap_pops)
+        self.maximum("peak_frontier", result.peak_frontier)
+
+    def summary(self):
+        """
+        Get the totals.
+
+        Returns:
+        - summary: A dictionary with the calls and seconds of every phase, the counters and the maxima.
+        """
+        with self.lock:
+            return {
+                "phases": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.phases.items()},
+                "counters": dict(self.counters),
+                "maxima": dict(self.maxima),
+            }
+
+    def to_json(self, records=False):
+        """
+        Get the totals, and the recent records (optional), as a JSON string.
+        """
+        content = self.summary()
+        if records:
+            with self.lock:
+                content["records"] = list(self.records)
+        return json.dumps(content)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        Get the totals in the Prometheus text exposition format.
+        """
+        summary = self.summary()
+        lines = [
+            f"# TYPE {prefix}_phase_seconds_total counter",
+            *(f'{prefix}_phase_seconds_total{{phase="{name}"}} {phase["seconds"]!r}' for name, phase in summary["phases"].items()),
+            f"# TYPE {prefix}_phase_calls_total counter",
+            *(f'{prefix}_phase_calls_total{{phase="{name}"}} {phase["calls"]}' for name, phase in summary["phases"].items()),
+        ]
+        for name, value in summary["counters"].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        for name, value in summary["maxima"].items():
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return '\n'.join(lines) + '\n'
+
+class DisabledProfiler:
+    """
+    A Profiler that records nothing, used when profiling is off. Every call returns at once,
+    and the phases are a shared empty context manager.
+    """
+
+    enabled = False
+    null_phase = nullcontext()
+
+    def phase(self, name):
+        return self.null_phase
+
+    def count(self, name, value=1):
+        pass
+
+    def maximum(self, name, value):
+        pass
+
+    def record_search(self, result):
+        pass
+
+# The profiler of simulations that are not profiled.
+DISABLED = DisabledProfiler()
@@ -1,8 +1,3 @@
-import maltoolbox.wrappers
-from py2neo import Graph
-import maltoolbox.attackgraph.attackgraph
-import maltoolbox.ingestors.neo4j
-import maltoolbox.language.classes_factory
 import maltoolbox.attackgraph.analyzers.apriori
 
 from maltoolbox.attackgraph import AttackGraphNode
@@ -10,15 +5,65 @@ from maltoolbox.wrappers import create_attack_graph
 
 from attack_simulation import AttackSimulation
 import constants
+import exporters
 import help_functions
 
 
-def main():
-    # Connect to Neo4j graph database.
-    print("Starting to connect to Neo4j database.")
-    neo4j_graph_connection = Graph(uri=constants.URI, user=constants.USERNAME, password=constants.PASSWORD, name=constants.DBNAME)
-    print("Successful connection to Neo4j database.")
+class Neo4jSession:
+    """
+    Connects to Neo4j, and uploads the model and attack graph if constants.NEO4J_INGEST is True,
+    the first time the connection is needed. py2neo and the mal-toolbox Neo4j ingestor are only
+    imported then, so runs that never export to Neo4j do not load them.
+    """
+
+    def __init__(self, attackgraph):
+        """
+        Parameters:
+        - attackgraph: The AttackGraph that is ingested.
+        """
+        self.attackgraph = attackgraph
+        self.neo4j_graph_connection = None
+
+    def connect(self):
+        """
+        Get the Neo4j Graph instance, it is connected on the first call.
+        """
+        if self.neo4j_graph_connection is not None:
+            return self.neo4j_graph_connection
+        from py2neo import Graph
+
+        # Upload the attack graph and model to Neo4j.
+        if constants.NEO4J_INGEST:
+            import maltoolbox.ingestors.neo4j
+            print("Starting uploading the model and attackgraph to Neo4j.")
+            maltoolbox.ingestors.neo4j.ingest_attack_graph(self.attackgraph, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=True)
+            maltoolbox.ingestors.neo4j.ingest_model(self.attackgraph.model, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=False)
+            print("The model and attackgraph is uploaded to Neo4j.")
+
+        # Connect to Neo4j graph database.
+        print("Starting to connect to Neo4j database.")
+        self.neo4j_graph_connection = Graph(uri=constants.URI, user=constants.USERNAME, password=constants.PASSWORD, name=constants.DBNAME)
+        print("Successful connection to Neo4j database.")
+        return self.neo4j_graph_connection
+
+def select_exporter(neo4j_session):
+    """
+    Ask where the results are exported to, Neo4j by default. Neo4j is only connected if it is chosen.
+
+    Parameters:
+    - neo4j_session: The Neo4jSession.
+
+    Returns:
+    - exporter: The exporters.ResultExporter.
+    """
+    help_functions.print_dictionary(constants.EXPORTER_OPTIONS)
+    exporter_name = input(f"Export the results to? {list(constants.EXPORTER_OPTIONS.keys())} (or press enter for neo4j): ")
+    if exporter_name not in constants.EXPORTER_OPTIONS:
+        exporter_name = "neo4j"
+    neo4j_graph_connection = neo4j_session.connect() if exporter_name == "neo4j" else None
+    return exporters.create_exporter(exporter_name, constants.EXPORT_PATH, neo4j_graph_connection)
 
+def main():
     # Generate mal-toolbox AttackGraph.
     attackgraph = create_attack_graph(constants.MAR_ARCHIVE, constants.MODEL_FILE)
 
@@ -45,11 +90,8 @@ def main():
     # Note: earlier all defenses had the setting is_necessary=False.
     maltoolbox.attackgraph.analyzers.apriori.calculate_viability_and_necessity(attackgraph)
 
-    # Upload the attack graph and model to Neo4j.
-    print("Starting uploading the model and attackgraph to Neo4j.")
-    maltoolbox.ingestors.neo4j.ingest_attack_graph(attackgraph, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=True)
-    maltoolbox.ingestors.neo4j.ingest_model(attackgraph.model, constants.URI, constants.USERNAME, constants.PASSWORD, constants.DBNAME, delete=False)
-    print("The model and attackgraph is uploaded to Neo4j.")
+    # Neo4j is connected, and the attack graph and model uploaded, when an export to Neo4j is chosen.
+    neo4j_session = Neo4jSession(attackgraph)
 
     # Create AttackSimulation.
     attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=False) 
@@ -63,8 +105,7 @@ def main():
     if user_input == attack_options[0]:
         # Traverse attack graph step by step.
         print(f"{constants.PINK}{constants.ATTACK_OPTIONS[user_input]}{constants.STANDARD}")
-        attack_simulation.step_by_step_attack_simulation(neo4j_graph_connection)
-        attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=True)
+        attack_simulation.step_by_step_attack_simulation(neo4j_session.connect())
 
     elif user_input == attack_options[1]:
         # Traverse attack graph with modified Dijkstra's algorithm - to get the shortest path.
@@ -74,7 +115,7 @@ def main():
             attack_simulation.set_target_node(target_node_id)
             cost = attack_simulation.dijkstra()
             print("The cost for the attacker for traversing the path", cost)
-            attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=False)
+            attack_simulation.export_results(select_exporter(neo4j_session))
 
     elif user_input == attack_options[2]:
         # Traverse attack graph with random algorithm - to get a random path.
@@ -90,7 +131,7 @@ def main():
         if attack_simulation.target_node != None and attack_simulation.target_node in attack_simulation.visited:
             print("The target was found.")
         print("The cost for the attacker for traversing the path", cost)
-        attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=False)
+        attack_simulation.export_results(select_exporter(neo4j_session))
 
     elif user_input == attack_options[3]:
         # Traverse attack graph with breadth first search to retrieve the subgraph within the attacker
@@ -101,7 +142,17 @@ def main():
             attack_simulation.set_attacker_cost_budget(int(attacker_cost_budget))
             cost = attack_simulation.bfs()
             print("The cost for the attacker for traversing the path", cost)
-            attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, add_horizon=False)
+            attack_simulation.export_results(select_exporter(neo4j_session))
+
+    elif user_input == attack_options[4]:
+        # Get all attack steps reachable within the attacker cost budget, following the attack graph logic.
+        print(f"{constants.PINK}{constants.ATTACK_OPTIONS[user_input]}{constants.STANDARD}")
+        attacker_cost_budget = input("Enter the attacker cost budget as integer: ")
+        if attacker_cost_budget != '':
+            attack_simulation.set_attacker_cost_budget(int(attacker_cost_budget))
+            cost = attack_simulation.reachable_within_budget()
+            print("The highest cost of the reachable attack steps", cost)
+            attack_simulation.export_results(select_exporter(neo4j_session))
 
 if __name__=='__main__':
     main()
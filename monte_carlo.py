@@ -0,0 +1,131 @@
+from concurrent.futures import ProcessPoolExecutor
+import random
+
+import numpy as np
+
+import traversal
+
+# Number of trials per task sent to a worker process.
+TRIALS_PER_TASK = 1000
+
+# The compiled graph of a worker process, set by _init_worker.
+_worker_graph = None
+
+class MonteCarloResult:
+    """
+    The results of a batch of random path trials.
+
+    Attributes:
+    - cost: The total cost of the random path of each trial.
+    - target_reached: Boolean array, True for the trials that reached the target.
+    - path_length: The number of attack steps compromised in each trial.
+    """
+
+    def __init__(self, cost, target_reached, path_length):
+        self.cost = cost
+        self.target_reached = target_reached
+        self.path_length = path_length
+
+    def summary(self):
+        """
+        Get summary statistics of the trials.
+
+        Returns:
+        - summary: A dictionary with the number of trials, the target hit rate and
+          statistics of the costs and path lengths.
+        """
+        summary = {"trials": len(self.cost)}
+        if not len(self.cost):
+            return summary
+        summary["target_hit_rate"] = float(self.target_reached.mean())
+        summary["cost_mean"] = float(self.cost.mean())
+        summary["cost_std"] = float(self.cost.std())
+        summary["cost_min"] = float(self.cost.min())
+        summary["cost_max"] = float(self.cost.max())
+        for percentile, value in zip((5, 50, 95), np.percentile(self.cost, (5, 50, 95))):
+            summary[f"cost_p{percentile}"] = float(value)
+        if self.target_reached.any():
+            summary["cost_mean_when_target_reached"] = float(self.cost[self.target_reached].mean())
+        summary["path_length_mean"] = float(self.path_length.mean())
+        return summary
+
+def trial_rng(entropy, trial):
+    """
+    Get the random number generator of a trial. Every trial has its own stream derived
+    from the batch entropy and the trial number, so the results do not depend on how
+    the trials are split between processes.
+    """
+    seed = np.random.SeedSequence([entropy, trial]).generate_state(2, dtype=np.uint64)
+    return random.Random(int(seed[0]) << 64 | int(seed[1]))
+
+def run_trials(graph, start, first_trial, num_trials, entropy, budget=None, target=None):
+    """
+    Run a range of random path trials in this process.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - start: The index of the start node.
+    - first_trial: The number of the first trial.
+    - num_trials: The number of trials.
+    - entropy: The entropy of the batch.
+    - budget: The attacker cost budget, or None.
+    - target: The index of the target node, or None.
+
+    Returns:
+    - result: A MonteCarloResult with the trials.
+    """
+    cost = np.zeros(num_trials)
+    target_reached = np.zeros(num_trials, dtype=bool)
+    path_length = np.zeros(num_trials, dtype=np.int32)
+    for i in range(num_trials):
+        rng = trial_rng(entropy, first_trial + i)
+        trial_cost, visited, _ = traversal.random_path(graph, start, budget, target, rng)
+        cost[i] = trial_cost
+        target_reached[i] = target is not None and visited[-1] == target
+        path_length[i] = len(visited) - 1
+    return MonteCarloResult(cost, target_reached, path_length)
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _run_worker_trials(start, first_trial, num_trials, entropy, budget, target):
+    return run_trials(_worker_graph, start, first_trial, num_trials, entropy, budget, target)
+
+def run_random_paths(graph, start, num_trials, budget=None, target=None, seed=None, max_workers=None):
+    """
+    Run independent random path trials, see traversal.random_path, in a process pool.
+    Every trial has its own random stream and state, nothing is shared between trials.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - start: The index of the start node.
+    - num_trials: The number of trials.
+    - budget: The attacker cost budget, or None.
+    - target: The index of the target node, or None.
+    - seed: The seed of the batch, the same seed gives the same results.
+    - max_workers: The number of worker processes, None for one per CPU. With 1, or at most
+      TRIALS_PER_TASK trials, the trials run in this process.
+
+    Returns:
+    - result: A MonteCarloResult with all trials in order.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    if max_workers == 1 or num_trials <= TRIALS_PER_TASK:
+        return run_trials(graph, start, 0, num_trials, entropy, budget, target)
+
+    tasks = [
+        (first_trial, min(TRIALS_PER_TASK, num_trials - first_trial))
+        for first_trial in range(0, num_trials, TRIALS_PER_TASK)
+    ]
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(graph,)) as executor:
+        futures = [
+            executor.submit(_run_worker_trials, start, first_trial, count, entropy, budget, target)
+            for first_trial, count in tasks
+        ]
+        results = [future.result() for future in futures]
+    return MonteCarloResult(
+        np.concatenate([result.cost for result in results]),
+        np.concatenate([result.target_reached for result in results]),
+        np.concatenate([result.path_length for result in results])
+    )
@@ -0,0 +1,263 @@
+from collections import ChainMap
+from itertools import groupby
+
+import attack_path
+
+# Default number of nodes or relationships written per UNWIND statement.
+NEO4J_BATCH_SIZE = 1000
+
+def record_labels(record):
+    """
+    Get the Neo4j labels of an attack step record: the asset name and id, and the horizon flag.
+
+    Parameters:
+    - record: The attack step record, see attack_path.node_record.
+
+    Returns:
+    - labels: A tuple of label strings.
+    """
+    asset_and_id = record["full_name"].split(':')
+    return (asset_and_id[0] + ':' + asset_and_id[1], str(record["is_horizon_node"]))
+
+def record_properties(record):
+    """
+    Get the Neo4j properties of an attack step record.
+
+    Parameters:
+    - record: The attack step record, see attack_path.node_record.
+
+    Returns:
+    - properties: A dictionary of properties, the node id is stored as full_name.
+    """
+    properties = {
+        "is_horizon_node": record["is_horizon_node"],
+        "name": record["name"],
+        "full_name": record["id"],
+        "type": record["type"],
+        "ttc": str(record["ttc"]),
+        "is_necessary": str(record["is_necessary"]),
+        "is_viable": str(record["is_viable"]),
+    }
+    if record["cost"] is not None:
+        properties["cost"] = str(record["cost"])
+    return properties
+
+def node_labels(node, is_horizon_node):
+    """
+    Get the Neo4j labels of an attack step, see record_labels.
+    """
+    return record_labels(attack_path.node_record(node, None, is_horizon_node))
+
+def node_properties(node, cost, is_horizon_node):
+    """
+    Get the Neo4j properties of an attack step, see record_properties.
+    """
+    return record_properties(attack_path.node_record(node, cost, is_horizon_node))
+
+def quote_label(label):
+    """
+    Quote a label for use in a Cypher statement.
+    """
+    return "`" + label.replace("`", "``") + "`"
+
+def batches(rows, batch_size):
+    """
+    Split a list into consecutive lists of at most batch_size elements.
+    """
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+class Neo4jBatchExporter:
+    """
+    Writes attack steps and relationships to Neo4j in chunked UNWIND statements inside an
+    explicit transaction, instead of one round-trip per node and relationship.
+
+    The connection only needs begin(), commit(tx), rollback(tx) and delete_all() like a py2neo Graph,
+    and the transaction run(cypher, parameters) returning a cursor with data(). Every one of
+    these calls is a round-trip to the database and is counted in round_trips.
+    """
+
+    def __init__(self, neo4j_graph_connection, batch_size=NEO4J_BATCH_SIZE):
+        """
+        Parameters:
+        - neo4j_graph_connection: The Neo4j Graph instance.
+        - batch_size: The number of nodes or relationships per statement.
+        """
+        self.neo4j_graph_connection = neo4j_graph_connection
+        self.batch_size = batch_size
+        self.round_trips = 0
+
+    def run(self, tx, cypher, parameters):
+        """
+        Run a statement in the open transaction.
+        """
+        self.round_trips += 1
+        return tx.run(cypher, parameters)
+
+    def begin(self):
+        self.round_trips += 1
+        return self.neo4j_graph_connection.begin()
+
+    def commit(self, tx):
+        self.round_trips += 1
+        self.neo4j_graph_connection.commit(tx)
+
+    def rollback(self, tx):
+        self.round_trips += 1
+        self.neo4j_graph_connection.rollback(tx)
+
+    def create_nodes(self, tx, nodes):
+        """
+        Create nodes with UNWIND statements, one or more per set of labels.
+
+        Parameters:
+        - tx: The open transaction.
+        - nodes: A list of (key, labels, properties) tuples.
+
+        Returns:
+        - neo4j_ids: A dictionary mapping the keys to the internal Neo4j ids of the nodes.
+        """
+        neo4j_ids = {}
+        nodes = sorted(nodes, key=lambda node: node[1])
+        for labels, group in groupby(nodes, key=lambda node: node[1]):
+            cypher = (
+                "UNWIND $rows AS row "
+                f"CREATE (n:{':'.join(quote_label(label) for label in labels)}) "
+                "SET n = row.properties "
+                "RETURN row.key AS key, id(n) AS id"
+            )
+            rows = [{"key": key, "properties": properties} for key, _, properties in group]
+            for batch in batches(rows, self.batch_size):
+                for record in self.run(tx, cypher, {"rows": batch}).data():
+                    neo4j_ids[record["key"]] = record["id"]
+        return neo4j_ids
+
+    def create_relationships(self, tx, edges, neo4j_ids, relationship_type="Relationship"):
+        """
+        Create relationships between nodes created by create_nodes with UNWIND statements.
+
+        Parameters:
+        - tx: The open transaction.
+        - edges: A list of (from key, to key) tuples.
+        - neo4j_ids: The dictionary returned by create_nodes.
+        - relationship_type: The relationship type.
+        """
+        cypher = (
+            "UNWIND $rows AS row "
+            "MATCH (a) WHERE id(a) = row.from "
+            "MATCH (b) WHERE id(b) = row.to "
+            f"CREATE (a)-[:{quote_label(relationship_type)}]->(b)"
+        )
+        rows = [{"from": neo4j_ids[from_key], "to": neo4j_ids[to_key]} for from_key, to_key in edges]
+        for batch in batches(rows, self.batch_size):
+            self.run(tx, cypher, {"rows": batch})
+
+    def upload(self, nodes, edges, delete=True):
+        """
+        Upload nodes and relationships in one transaction.
+
+        Parameters:
+        - nodes: A list of (key, labels, properties) tuples.
+        - edges: A list of (from key, to key) tuples.
+        - delete: If True, delete everything in the database first.
+
+        Returns:
+        - neo4j_ids: A dictionary mapping the node keys to the internal Neo4j ids.
+        """
+        if delete:
+            self.round_trips += 1
+            self.neo4j_graph_connection.delete_all()
+        tx = self.begin()
+        try:
+            neo4j_ids = self.create_nodes(tx, nodes)
+            self.create_relationships(tx, edges, neo4j_ids)
+        except Exception:
+            self.rollback(tx)
+            raise
+        self.commit(tx)
+        return neo4j_ids
+
+class Neo4jDiffSync(Neo4jBatchExporter):
+    """
+    Keeps a Neo4j database in sync with a result that changes step by step. It remembers
+    what was uploaded and writes only the changes: new nodes, nodes whose labels or
+    properties changed, removed nodes and new relationships.
+    """
+
+    def __init__(self, neo4j_graph_connection, batch_size=NEO4J_BATCH_SIZE):
+        super().__init__(neo4j_graph_connection, batch_size)
+        # The uploaded nodes as {key: (labels, properties)}, their Neo4j ids and the relationships.
+        self.nodes = {}
+        self.neo4j_ids = {}
+        self.edges = set()
+
+    def upload(self, nodes, edges, delete=True):
+        """
+        Upload all nodes and relationships, see Neo4jBatchExporter.upload, and remember them.
+        """
+        self.neo4j_ids = super().upload(nodes, edges, delete)
+        self.nodes = {key: (labels, properties) for key, labels, properties in nodes}
+        self.edges = set(edges)
+        return self.neo4j_ids
+
+    def update(self, nodes=(), edges=(), removed_nodes=()):
+        """
+        Write the changes of a step in one transaction.
+
+        Parameters:
+        - nodes: A list of (key, labels, properties) tuples, new nodes are created and
+          known nodes are updated if their labels or properties changed.
+        - edges: A list of (from key, to key) tuples, relationships that were not
+          uploaded before are created.
+        - removed_nodes: The keys of nodes to delete together with their relationships.
+        """
+        # The changes are collected first and only remembered once the transaction is
+        # committed, so a failed update can be retried.
+        updated_nodes = {}
+        new_nodes = {}
+        changed_nodes = {}
+        for key, labels, properties in nodes:
+            if key not in self.nodes:
+                new_nodes[key] = (key, labels, properties)
+            elif self.nodes[key] != (labels, properties):
+                changed_nodes.setdefault((self.nodes[key][0], labels), []).append(
+                    {"id": self.neo4j_ids[key], "properties": properties}
+                )
+            updated_nodes[key] = (labels, properties)
+        removed_keys = [key for key in dict.fromkeys(removed_nodes) if key in self.neo4j_ids]
+        removed_ids = [self.neo4j_ids[key] for key in removed_keys]
+        removed = set(removed_keys)
+        new_edges = [
+            edge for edge in dict.fromkeys(edges)
+            if edge not in self.edges and edge[0] not in removed and edge[1] not in removed
+        ]
+
+        if not (new_nodes or changed_nodes or removed_ids or new_edges):
+            return
+        tx = self.begin()
+        try:
+            if removed_ids:
+                self.run(tx, "UNWIND $ids AS id MATCH (n) WHERE id(n) = id DETACH DELETE n", {"ids": removed_ids})
+            for (old_labels, labels), rows in changed_nodes.items():
+                cypher = "UNWIND $rows AS row MATCH (n) WHERE id(n) = row.id "
+                removed_labels = [label for label in old_labels if label not in labels]
+                if removed_labels:
+                    cypher += f"REMOVE n:{':'.join(quote_label(label) for label in removed_labels)} "
+                cypher += f"SET n:{':'.join(quote_label(label) for label in labels)}, n = row.properties"
+                for batch in batches(rows, self.batch_size):
+                    self.run(tx, cypher, {"rows": batch})
+            new_ids = self.create_nodes(tx, list(new_nodes.values()))
+            self.create_relationships(tx, new_edges, ChainMap(new_ids, self.neo4j_ids))
+            self.commit(tx)
+        except Exception:
+            self.rollback(tx)
+            raise
+
+        self.nodes.update(updated_nodes)
+        self.neo4j_ids.update(new_ids)
+        if removed_keys:
+            for key in removed_keys:
+                del self.neo4j_ids[key]
+                self.nodes.pop(key, None)
+            self.edges = {edge for edge in self.edges if edge[0] in self.nodes and edge[1] in self.nodes}
+        self.edges.update(new_edges)
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import threading
+
+# The default limits of a QueryResultCache: the number of results, and their total size
+# counted in attack steps and edges.
+QUERY_CACHE_ENTRIES = 1024
+QUERY_CACHE_SIZE = 10**6
+
+class QueryResultCache:
+    """
+    A thread-safe LRU cache of query results. The least recently used results are evicted
+    when there are more than max_entries results or their total size is above max_size.
+
+    The key of a result starts with the fingerprint of the compiled graph it was computed on,
+    see CompiledAttackGraph.fingerprint, which covers the structure, the costs, the viability
+    and the necessity of the nodes. When the costs or defenses change and the graph is compiled
+    again, the results of the old graph are never returned, and are evicted over time or with
+    invalidate.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_ENTRIES, max_size=QUERY_CACHE_SIZE):
+        """
+        Parameters:
+        - max_entries: The maximum number of results.
+        - max_size: The maximum total size of the results.
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a result and mark it as recently used.
+
+        Parameters:
+        - key: A tuple whose first element is the graph fingerprint.
+
+        Returns:
+        - value: The result, or None if it is not cached.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=1):
+        """
+        Add a result and evict the least recently used results over the limits. A result
+        larger than max_size is not cached.
+
+        Parameters:
+        - key: A tuple whose first element is the graph fingerprint.
+        - value: The result, it must not be changed afterwards.
+        - size: The size of the result.
+        """
+        if size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_size:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, fingerprint=None):
+        """
+        Remove the results of a graph fingerprint, or all results if it is None.
+        """
+        with self.lock:
+            keys = [key for key in self.entries if fingerprint is None or key[0] == fingerprint]
+            for key in keys:
+                self.size -= self.entries.pop(key)[1]
+
+    def stats(self):
+        """
+        Get the hit and miss statistics.
+
+        Returns:
+        - stats: A dictionary with the hits, misses, hit rate, evictions, number of results
+          and their total size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "size": self.size,
+            }
@@ -0,0 +1,315 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import cli
+import constants
+import graph_cache
+import query_cache
+import shortest_path
+
+# The default address of the server, it only listens on the local machine.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+
+# The default number of threads that run queries.
+SERVER_WORKERS = 4
+
+# The number of recent query latencies the statistics are computed from.
+LATENCY_WINDOW = 1000
+
+# The query parameters each algorithm uses, the others do not change its result.
+ALGORITHM_PARAMETERS = {
+    'dijkstra': ('target',),
+    'random_path': ('target', 'budget', 'seed'),
+    'bfs': ('budget',),
+    'reachability': ('budget',),
+}
+
+class QueryEngine:
+    """
+    Answers queries on a compiled attack graph that is loaded once. The graph is only read
+    through a shared shortest_path.SearchCore and every thread has its own
+    cli.CompiledQueryRunner, so queries can run on many threads at once without changing
+    each other.
+    """
+
+    def __init__(self, graph, start, index, cache=None):
+        """
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - start: The index of the attacker node.
+        - index: A function that gets the index of an attack step id or full name, and
+          raises KeyError for unknown attack steps.
+        - cache: A query_cache.QueryResultCache for the results, or None.
+        """
+        self.graph = graph
+        self.start = start
+        self.index = index
+        self.search_core = shortest_path.SearchCore(graph)
+        self.runners = threading.local()
+        self.cache = cache
+        self.fingerprint = graph.fingerprint() if cache is not None else None
+
+    @classmethod
+    def from_attack_simulation(cls, attack_simulation, cache=None):
+        """
+        Create an engine from the compiled graph of an AttackSimulation.
+        """
+        runner = cli.CompiledQueryRunner.from_attack_simulation(attack_simulation)
+        return cls(runner.graph, runner.start, runner.index, cache)
+
+    @classmethod
+    def from_graph_cache_entry(cls, entry, cache=None):
+        """
+        Create an engine from a graph_cache.GraphCacheEntry.
+        """
+        return cls(entry.graph, entry.start, entry.index, cache)
+
+    @classmethod
+    def from_job(cls, job, cache=None):
+        """
+        Load the attack graph of a job, see cli.load_job, from the graph cache if it has one.
+        The cache is the query result cache, see __init__.
+        """
+        if job["graph_cache"] and not job["use_ttc"] and not job["neo4j_ingest"]:
+            entry = graph_cache.load_or_build(
+                job["graph_cache"], job["mar_archive"], job["model"], job["cost_file"],
+                lambda: cli.build_attack_simulation(job), job["attacker"]
+            )
+            return cls.from_graph_cache_entry(entry, cache)
+        return cls.from_attack_simulation(cli.build_attack_simulation(job), cache)
+
+    def runner(self):
+        """
+        Get the cli.CompiledQueryRunner of the current thread.
+        """
+        runner = getattr(self.runners, 'runner', None)
+        if runner is None:
+            runner = cli.CompiledQueryRunner(self.graph, self.start, self.index, search_core=self.search_core)
+            self.runners.runner = runner
+        return runner
+
+    def cache_key(self, query):
+        """
+        Get the result cache key of a query, with only the parameters its algorithm uses,
+        or None if the result is not cached. Random paths without a seed are all different.
+        """
+        algorithm = query.get("algorithm")
+        if self.cache is None or algorithm not in ALGORITHM_PARAMETERS or \
+                (algorithm == 'random_path' and query.get("seed") is None):
+            return None
+        parameters = {name: query.get(name) for name in ALGORITHM_PARAMETERS[algorithm]}
+        if parameters.get("target") is not None:
+            # An attack step given by id and by full name is the same query.
+            try:
+                parameters["target"] = self.index(parameters["target"])
+            except KeyError:
+                return None
+        return (self.fingerprint, self.start, algorithm) + tuple(parameters.values())
+
+    def answer(self, query):
+        """
+        Run one query.
+
+        Parameters:
+        - query: A dictionary with an algorithm, a target, a budget and a seed, see cli.expand_queries.
+
+        Returns:
+        - result: A dictionary with the query, the cost, whether the target was reached, the
+          ids of the visited attack steps, the (parent id, child id) edges of the path and the
+          run time in seconds, or an error.
+        """
+        result = dict(query)
+        start = time.perf_counter()
+        key = self.cache_key(query)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(result, **cached, seconds=time.perf_counter() - start)
+
+        runner = self.runner()
+        answer = runner.answer(query)
+        if "error" in answer:
+            return dict(result, **answer)
+        node_id = self.graph.node_id
+        answer["visited"] = [node_id(index) for index in runner.visited]
+        answer["edges"] = [(node_id(parent), node_id(child)) for parent, child in dict.fromkeys(runner.edges)]
+        if key is not None:
+            self.cache.put(key, answer, len(runner.visited) + len(answer["edges"]))
+        return dict(result, **answer, seconds=time.perf_counter() - start)
+
+class QueryStatistics:
+    """
+    Thread-safe counters of the queries of a server: the queue depth, the queries that are
+    running and the latency of the recent queries, from submission to result.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.latencies = []
+        self.window = window
+
+    def submitted(self):
+        """
+        Count a submitted query and get the queue depth before it.
+        """
+        with self.lock:
+            self.queued += 1
+            return self.queued - 1
+
+    def started(self):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+
+    def finished(self, latency):
+        with self.lock:
+            self.running -= 1
+            self.completed += 1
+            self.latencies.append(latency)
+            if len(self.latencies) > 2 * self.window:
+                del self.latencies[:-self.window]
+
+    def summary(self):
+        """
+        Get the statistics as a dictionary.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies[-self.window:])
+            summary = {"queue_depth": self.queued, "running": self.running, "completed": self.completed}
+        if latencies:
+            summary["latency_mean"] = sum(latencies) / len(latencies)
+            summary["latency_p50"] = latencies[len(latencies) // 2]
+            summary["latency_p95"] = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            summary["latency_max"] = latencies[-1]
+        return summary
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    A local HTTP server that answers JSON queries with a QueryEngine in a thread pool.
+
+    - POST /query with one query, or {"queries": [...]} in the job format of cli.py, streams
+      one JSON line per single query back as soon as it and the queries before it are done.
+      Each result has the latency from submission and the queue depth at submission.
+    - GET /stats returns the QueryStatistics summary, and the cache statistics if the engine has a cache.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, engine, address=(SERVER_HOST, SERVER_PORT), workers=SERVER_WORKERS):
+        super().__init__(address, QueryRequestHandler)
+        self.engine = engine
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers)
+        self.statistics = QueryStatistics()
+
+    def submit(self, query):
+        """
+        Submit a query to the thread pool.
+
+        Returns:
+        - future: A Future of the result.
+        """
+        submitted = time.perf_counter()
+        queue_depth = self.statistics.submitted()
+
+        def run():
+            self.statistics.started()
+            try:
+                result = self.engine.answer(query)
+            except Exception as error:
+                result = dict(query, error=f"{type(error).__name__}: {error}")
+            latency = time.perf_counter() - submitted
+            self.statistics.finished(latency)
+            result["latency"] = latency
+            result["queue_depth"] = queue_depth
+            return result
+
+        return self.executor.submit(run)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        summary = dict(self.server.statistics.summary(), workers=self.server.workers)
+        if self.server.engine.cache is not None:
+            summary["cache"] = self.server.engine.cache.stats()
+        self.send_json(200, summary)
+
+    def do_POST(self):
+        if self.path != "/query":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            queries = cli.expand_queries(request["queries"] if "queries" in request else [request])
+        except (ValueError, KeyError, TypeError) as error:
+            self.send_json(400, {"error": f"Invalid request: {error}"})
+            return
+
+        futures = [self.server.submit(query) for query in queries]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for future in futures:
+            self.wfile.write((json.dumps(future.result()) + '\n').encode())
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # The statistics replace the access log.
+        pass
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve attack graph queries over HTTP. The attack graph is loaded once and the "
+                    "queries run concurrently in a thread pool."
+    )
+    parser.add_argument("--model", default=constants.MODEL_FILE, help=f"The model file. Default is {constants.MODEL_FILE}.")
+    parser.add_argument("--mar-archive", dest="mar_archive", default=constants.MAR_ARCHIVE, help=f"The MAL language archive. Default is {constants.MAR_ARCHIVE}.")
+    parser.add_argument("--cost-file", dest="cost_file", default=constants.COST_FILE, help=f"The json file or the cost table with the attack step costs. Default is {constants.COST_FILE}.")
+    parser.add_argument("--attacker", type=int, default=0, help="The index of the attacker in the model. Default is 0.")
+    parser.add_argument("--graph-cache", dest="graph_cache", help="Cache directory of compiled attack graphs, see cli.py.")
+    parser.add_argument("--host", default=SERVER_HOST, help=f"The address to listen on. Default is {SERVER_HOST}.")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"The port to listen on. Default is {SERVER_PORT}.")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help=f"The number of query threads. Default is {SERVER_WORKERS}.")
+    parser.add_argument("--cache-entries", dest="cache_entries", type=int, default=query_cache.QUERY_CACHE_ENTRIES,
+                        help=f"The number of cached query results, 0 disables the cache. Default is {query_cache.QUERY_CACHE_ENTRIES}.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    job = dict(cli.JOB_DEFAULTS, model=args.model, mar_archive=args.mar_archive, cost_file=args.cost_file,
+               attacker=args.attacker, graph_cache=args.graph_cache)
+    cache = query_cache.QueryResultCache(args.cache_entries) if args.cache_entries > 0 else None
+    server = QueryServer(QueryEngine.from_job(job, cache), (args.host, args.port), args.workers)
+    print(f"Serving attack graph queries on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,560 @@
+import heapq
+
+import numpy as np
+
+# Ways of combining the costs of the necessary parents of an 'and' node.
+AND_COST_MODES = ('sum', 'max')
+
+class ShortestPathResult:
+    """
+    The result of shortest_attack_paths.
+
+    Attributes:
+    - graph: The CompiledAttackGraph that was searched.
+    - sources: The indices of the source nodes.
+    - cost: The minimal attacker cost of every node, inf for nodes that were not reached.
+    - predecessor: The parent index each 'or' node was reached from, -1 if none. For 'and'
+      nodes it is the necessary parent that was settled last.
+    - settled: Boolean array marking the nodes whose cost is final.
+    - and_cost: The mode used to combine the costs of the parents of 'and' nodes.
+    - target: The index of the node the search stopped at, None if all reachable nodes
+      were settled.
+    - expanded: The number of nodes the search settled and expanded.
+    - budget: The cost budget of the search, nodes with a higher cost were not reached. None
+      if there was no budget.
+    - heap_pushes: The number of entries pushed to the open set, the sources included.
+    - heap_pops: The number of entries popped from the open set, stale entries included.
+    - peak_frontier: The largest size of the open set.
+
+    A search that touched few nodes gives its result over the touched nodes only, and cost,
+    predecessor and settled are built over all nodes when they are first used. The methods
+    work on the touched nodes, so a query that reads its result through them takes time and
+    memory proportional to the nodes it touched, not to the size of the graph.
+    """
+
+    def __init__(self, graph, sources, cost, predecessor, settled, and_cost, target=None, expanded=0, budget=None,
+                 heap_pushes=0, heap_pops=0, peak_frontier=0, touched=None):
+        """
+        Parameters:
+        - cost, predecessor, settled: Arrays over all nodes, or over the touched nodes.
+        - touched: None, or an array of the indices of the nodes the search touched, in the
+          order of the cost, predecessor and settled arrays.
+        The other parameters are the attributes of the class.
+        """
+        self.graph = graph
+        self.sources = sources
+        self.and_cost = and_cost
+        self.target = target
+        self.expanded = expanded
+        self.budget = budget
+        self.heap_pushes = heap_pushes
+        self.heap_pops = heap_pops
+        self.peak_frontier = peak_frontier
+        self.touched = touched
+        if touched is None:
+            self._cost, self._predecessor, self._settled = cost, predecessor, settled
+        else:
+            self._cost = self._predecessor = self._settled = None
+            self.touched_cost, self.touched_predecessor, self.touched_settled = cost, predecessor, settled
+            self._position = None
+
+    def full_array(self, values, fill, dtype):
+        """
+        Build an array over all nodes from an array over the touched nodes.
+        """
+        array = np.full(self.graph.num_nodes, fill, dtype=dtype)
+        array[self.touched] = values
+        return array
+
+    @property
+    def cost(self):
+        if self._cost is None:
+            self._cost = self.full_array(self.touched_cost, np.inf, np.float64)
+        return self._cost
+
+    @property
+    def predecessor(self):
+        if self._predecessor is None:
+            self._predecessor = self.full_array(self.touched_predecessor, -1, np.int32)
+        return self._predecessor
+
+    @property
+    def settled(self):
+        if self._settled is None:
+            self._settled = self.full_array(self.touched_settled, False, bool)
+        return self._settled
+
+    def stored_arrays(self):
+        """
+        Get the cost, predecessor and settled arrays and the touched indices as given to
+        __init__, e.g. to send the result to another process without building the arrays
+        over all nodes.
+        """
+        if self.touched is None:
+            return self._cost, self._predecessor, self._settled, None
+        return self.touched_cost, self.touched_predecessor, self.touched_settled, self.touched
+
+    def position(self, index):
+        """
+        Get the position of a node in the touched arrays, or None if the search did not touch it.
+        """
+        if self._position is None:
+            self._position = {index: position for position, index in enumerate(self.touched.tolist())}
+        return self._position.get(index)
+
+    @property
+    def is_complete(self):
+        """
+        True if the search settled every reachable node.
+        """
+        return self.target is None and self.budget is None
+
+    def is_reached(self, index):
+        """
+        Return True if the node was settled by the search.
+        """
+        if self.touched is None:
+            return bool(self._settled[index])
+        position = self.position(index)
+        return position is not None and bool(self.touched_settled[position])
+
+    def cost_of(self, index):
+        """
+        Get the cost of a node, inf if it was not reached.
+        """
+        if self.touched is None:
+            return float(self._cost[index])
+        position = self.position(index)
+        return float(self.touched_cost[position]) if position is not None else float('inf')
+
+    def settled_nodes(self):
+        """
+        Get the settled nodes and their costs.
+
+        Returns:
+        - indices: A numpy array of the settled node indices, ascending.
+        - costs: A numpy array with the cost of each node.
+        """
+        if self.touched is None:
+            indices = np.flatnonzero(self._settled)
+            return indices, self._cost[indices]
+        order = np.argsort(self.touched, kind='stable')
+        order = order[self.touched_settled[order]]
+        return self.touched[order], self.touched_cost[order]
+
+    def costs_by_id(self):
+        """
+        Get the minimal attacker cost of every settled node.
+
+        Returns:
+        - costs: A dictionary mapping attack graph node ids to costs.
+        """
+        indices, costs = self.settled_nodes()
+        return dict(zip(self.graph.node_ids[indices].tolist(), costs.tolist()))
+
+    def path_parents(self, index):
+        """
+        Get the parents a node was reached from on its minimal attack path: all
+        necessary parents for 'and' nodes, otherwise the predecessor.
+
+        Parameters:
+        - index: The index of a settled node.
+
+        Returns:
+        - parents: A list of parent indices, empty for the source nodes.
+        """
+        graph = self.graph
+        if graph.is_gated[index]:
+            return [parent for parent in graph.parents(index) if graph.is_necessary[parent]]
+        if self.touched is None:
+            predecessor = int(self._predecessor[index])
+        else:
+            position = self.position(index)
+            predecessor = int(self.touched_predecessor[position]) if position is not None else -1
+        return [predecessor] if predecessor >= 0 else []
+
+    def edges_relaxed(self):
+        """
+        Get the number of edges the search relaxed, the edges out of the expanded nodes.
+        """
+        child_offsets = self.graph.child_offsets
+        indices, _ = self.settled_nodes()
+        relaxed = int((child_offsets[indices + 1] - child_offsets[indices]).sum())
+        if self.target is not None and self.is_reached(self.target):
+            # The search stopped at the target without expanding it.
+            relaxed -= int(child_offsets[self.target + 1] - child_offsets[self.target])
+        return relaxed
+
+    def reached_by_cost(self):
+        """
+        Get the settled nodes ordered by cost.
+
+        Returns:
+        - indices: A numpy array of node indices, the cheapest first.
+        """
+        indices, costs = self.settled_nodes()
+        return indices[np.argsort(costs, kind='stable')]
+
+    def came_from(self, target):
+        """
+        Collect the predecessors of all nodes on the minimal attack path to a target.
+
+        Parameters:
+        - target: The index of a settled node.
+
+        Returns:
+        - came_from: A dictionary mapping the indices of the nodes on the path to
+          the list of their path parents.
+        """
+        came_from = {}
+        stack = [target]
+        while stack:
+            index = stack.pop()
+            if index in came_from:
+                continue
+            parents = self.path_parents(index)
+            if parents:
+                came_from[index] = parents
+                stack.extend(parents)
+        return came_from
+
+    def path_cost(self, target):
+        """
+        Get the total cost of the attack steps on the minimal attack path to a target,
+        each attack step counted once even if several path branches share it.
+
+        Parameters:
+        - target: The index of a settled node.
+
+        Returns:
+        - cost: The total cost.
+        """
+        came_from = self.came_from(target)
+        return float(self.graph.cost[list(came_from)].sum()) if came_from else 0.0
+
+    def cost_frontier(self):
+        """
+        Get the cost frontier of the settled nodes, see CostFrontier.
+        """
+        return CostFrontier.from_result(self)
+
+class CostFrontier:
+    """
+    The minimal attacker cost of every reachable node, sorted ascending, so that the nodes
+    reachable within any budget are a prefix found with a binary search. A budget sweep
+    then costs O(log V) per budget after one search instead of one search per budget.
+
+    A node is reachable within a budget exactly when its minimal cost is within the budget,
+    since every node on its minimal attack path costs at most as much as the node.
+
+    Attributes:
+    - indices: The node indices, the cheapest first.
+    - costs: The minimal cost of each node in indices, ascending.
+    """
+
+    def __init__(self, indices, costs):
+        self.indices = indices
+        self.costs = costs
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        Create the frontier of a ShortestPathResult. The search must have settled every
+        node within the largest budget that will be asked for.
+        """
+        indices, costs = result.settled_nodes()
+        order = np.argsort(costs, kind='stable')
+        return cls(indices[order], costs[order])
+
+    def reachable(self, budget):
+        """
+        Get the nodes reachable within a budget.
+
+        Parameters:
+        - budget: The attacker cost budget.
+
+        Returns:
+        - indices: A numpy array of node indices, the cheapest first.
+        """
+        return self.indices[:int(np.searchsorted(self.costs, budget, side='right'))]
+
+    def reachable_counts(self, budgets):
+        """
+        Get the number of nodes reachable within each of a list of budgets.
+
+        Parameters:
+        - budgets: A list or numpy array of attacker cost budgets.
+
+        Returns:
+        - counts: A numpy array with the number of reachable nodes for each budget.
+        """
+        return np.searchsorted(self.costs, np.asarray(budgets, dtype=np.float64), side='right')
+
+    def curve(self):
+        """
+        Get the cumulative cost curve: the distinct costs and the number of nodes reachable
+        within each of them.
+
+        Returns:
+        - costs: A numpy array of the distinct costs, ascending.
+        - counts: A numpy array with the number of nodes with at most each cost.
+        """
+        costs, first = np.unique(self.costs, return_index=True)
+        counts = np.append(first[1:], len(self.costs))
+        return costs, counts
+
+class SearchCore:
+    """
+    Read-only flat list views of a CompiledAttackGraph used by shortest_attack_paths.
+    Indexing lists is faster than indexing numpy arrays one element at a time, and the
+    views are built once per graph instead of once per search. A search never changes
+    the core, so one core can be shared by many searches and threads.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.num_nodes = graph.num_nodes
+        self.node_cost = graph.cost.tolist()
+        self.is_traversable = graph.is_traversable.tolist()
+        self.is_necessary = graph.is_necessary.tolist()
+        self.is_gated = graph.is_gated.tolist()
+        self.child_offsets = graph.child_offsets.tolist()
+        self.child_targets = graph.child_targets.tolist()
+        self.necessary_parent_count = graph.necessary_parent_count.tolist()
+        self.unlisted_children = graph.unlisted_children()
+
+class SearchState:
+    """
+    The scratch state of a search on a SearchCore. The nodes a search writes to are
+    recorded, and reset restores only those, so searches can run back-to-back in time
+    proportional to the nodes they touch instead of the size of the graph. A state is
+    used by one search at a time, give every thread its own.
+    """
+
+    def __init__(self, core):
+        self.core = core
+        num_nodes = core.num_nodes
+        self.cost = [float('inf')] * num_nodes
+        self.predecessor = [-1] * num_nodes
+        self.settled = bytearray(num_nodes)
+        # Necessary parents that are not settled yet and their combined cost, for 'and' nodes.
+        self.remaining = list(core.necessary_parent_count)
+        self.parent_cost = [0.0] * num_nodes
+        self.is_touched = bytearray(num_nodes)
+        self.touched = []
+
+    def reset(self):
+        """
+        Restore the nodes touched by the last search.
+        """
+        inf = float('inf')
+        necessary_parent_count = self.core.necessary_parent_count
+        for index in self.touched:
+            self.cost[index] = inf
+            self.predecessor[index] = -1
+            self.settled[index] = 0
+            self.remaining[index] = necessary_parent_count[index]
+            self.parent_cost[index] = 0.0
+            self.is_touched[index] = 0
+        self.touched = []
+
+    def result_arrays(self):
+        """
+        Copy the cost, predecessor and settled state of a search to numpy arrays.
+
+        Returns:
+        - cost, predecessor, settled: Arrays over the touched nodes, or over all nodes when
+          most nodes were touched.
+        - touched: The array of the touched node indices, or None for arrays over all nodes.
+        """
+        if 4 * len(self.touched) > self.core.num_nodes:
+            # Converting the whole lists is faster when most nodes were touched.
+            return (np.array(self.cost), np.array(self.predecessor, dtype=np.int32),
+                    np.frombuffer(bytes(self.settled), dtype=bool), None)
+        touched = self.touched
+        return (np.array([self.cost[index] for index in touched], dtype=np.float64),
+                np.array([self.predecessor[index] for index in touched], dtype=np.int32),
+                np.array([self.settled[index] for index in touched], dtype=bool),
+                np.array(touched, dtype=np.int64))
+
+def shortest_attack_paths(graph, sources, target=None, and_cost='sum', heuristic=None, budget=None, source_costs=None, state=None):
+    """
+    Compute minimal attacker costs on a compiled attack graph with a Dijkstra search
+    that follows the attack graph logic, see iter_attack_paths.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - sources: The indices of the nodes the attacker starts from.
+    - target: The index of a node where the search stops once it is settled, or None
+      to settle every reachable node.
+    - and_cost: 'sum' or 'max', how the costs of the parents of 'and' nodes are combined.
+    - heuristic: An array with the A* heuristic of every node for the target, or None.
+    - budget: The attacker cost budget, or None.
+    - source_costs: The cost of each source, or None for cost 0.
+    - state: A SearchState of the graph that is reset and reused, or None to allocate a
+      new one. The graph is only read, so searches with their own states can run at once.
+
+    Returns:
+    - result: A ShortestPathResult.
+    """
+    if state is None:
+        state = SearchState(SearchCore(graph))
+    search = iter_attack_paths(graph, sources, target, and_cost, heuristic, budget, source_costs, state)
+    while True:
+        try:
+            next(search)
+        except StopIteration as stop:
+            expanded, heap_pushes, heap_pops, peak_frontier = stop.value
+            break
+
+    cost, predecessor, settled, touched = state.result_arrays()
+    return ShortestPathResult(
+        graph,
+        list(sources),
+        cost,
+        predecessor,
+        settled,
+        and_cost,
+        target,
+        expanded,
+        budget,
+        heap_pushes,
+        heap_pops,
+        peak_frontier,
+        touched
+    )
+
+def iter_attack_paths(graph, sources, target=None, and_cost='sum', heuristic=None, budget=None, source_costs=None, state=None):
+    """
+    Run a Dijkstra search that follows the attack graph logic on a compiled attack graph,
+    and yield every node when it is settled, the cheapest first.
+
+    An 'or' node costs its own cost plus the cost of its cheapest settled parent. An
+    'and' node is released only when all of its necessary parents are settled and costs
+    its own cost plus the sum or max of their costs. Edges from nodes that are not listed
+    as parents, e.g. from the attacker node to its entry points, do not count, so an 'and'
+    entry point is only reached through its necessary parents. Nodes that are not viable or are not
+    attack steps are never reached. Stale heap entries are skipped lazily when popped.
+
+    With a heuristic the search is an A* search towards the target. The heuristic must be
+    admissible, i.e. never larger than the remaining cost to the target, see heuristics.py.
+    Nodes with an infinite heuristic can not reach the target and are not searched.
+
+    With a budget only the nodes with a cost within the budget are settled, each at most
+    once, so the settled nodes are exactly the attack steps reachable within the budget.
+
+    The settled nodes are not collected, so the memory of the search is the search state
+    and the open set. The caller can stop the search at any time by not asking for more.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - sources: The indices of the nodes the attacker starts from.
+    - target: The index of a node where the search stops once it is settled, or None
+      to settle every reachable node.
+    - and_cost: 'sum' or 'max', how the costs of the parents of 'and' nodes are combined.
+    - heuristic: An array with the A* heuristic of every node for the target, or None.
+    - budget: The attacker cost budget, or None.
+    - source_costs: The cost of each source, or None for cost 0.
+    - state: A SearchState of the graph that is reset and reused, or None to allocate a
+      new one. It must not be used by another search until this one is done.
+
+    Returns:
+    - events: A generator of (index, cost, predecessor) tuples, the predecessor is -1 for the
+      sources, see ShortestPathResult.predecessor. When it is exhausted it returns the number
+      of expanded nodes, heap pushes, heap pops and the peak frontier size.
+    """
+    if and_cost not in AND_COST_MODES:
+        raise ValueError(f"and_cost must be one of {AND_COST_MODES}, not {and_cost!r}")
+    use_sum = and_cost == 'sum'
+    if state is None:
+        state = SearchState(SearchCore(graph))
+    elif state.core.graph is not graph:
+        raise ValueError("The search state belongs to another graph")
+    state.reset()
+
+    # The search state is kept in flat lists while searching, which is faster than
+    # indexing numpy arrays one element at a time, see SearchState.
+    core = state.core
+    inf = float('inf')
+    cost = state.cost
+    predecessor = state.predecessor
+    settled = state.settled
+    remaining = state.remaining
+    parent_cost = state.parent_cost
+    is_touched = state.is_touched
+    touched = state.touched
+
+    node_cost = core.node_cost
+    is_traversable = core.is_traversable
+    is_necessary = core.is_necessary
+    is_gated = core.is_gated
+    child_offsets = core.child_offsets
+    child_targets = core.child_targets
+    unlisted_children = core.unlisted_children
+    estimate = heuristic.tolist() if heuristic is not None else None
+    max_cost = budget if budget is not None else inf
+
+    # The open set holds (cost + heuristic, node) entries.
+    open_set = []
+    for i, source in enumerate(sources):
+        source_cost = float(source_costs[i]) if source_costs is not None else 0.0
+        if source_cost > max_cost:
+            continue
+        source = int(source)
+        if not is_touched[source]:
+            is_touched[source] = 1
+            touched.append(source)
+        cost[source] = min(cost[source], source_cost)
+        open_set.append((cost[source] + (estimate[source] if estimate else 0.0), source))
+    heapq.heapify(open_set)
+
+    # Only the pushes and the peak size are counted, the pops follow from the open set left.
+    pushes = peak_frontier = len(open_set)
+    expanded = 0
+    while open_set:
+        _, current = heapq.heappop(open_set)
+        if settled[current]:
+            continue
+        settled[current] = 1
+        expanded += 1
+        yield current, cost[current], predecessor[current]
+        if current == target:
+            break
+        current_cost = cost[current]
+
+        current_is_necessary = is_necessary[current]
+        current_unlisted = unlisted_children.get(current, ())
+        for child in child_targets[child_offsets[current]:child_offsets[current + 1]]:
+            if settled[child] or not is_traversable[child]:
+                continue
+            if not is_touched[child]:
+                is_touched[child] = 1
+                touched.append(child)
+            if is_gated[child]:
+                if not current_is_necessary or child in current_unlisted:
+                    continue
+                if use_sum:
+                    parent_cost[child] += current_cost
+                elif current_cost > parent_cost[child]:
+                    parent_cost[child] = current_cost
+                remaining[child] -= 1
+                if remaining[child] > 0:
+                    continue
+                tentative_cost = parent_cost[child] + node_cost[child]
+            else:
+                tentative_cost = current_cost + node_cost[child]
+
+            if tentative_cost < cost[child] and tentative_cost <= max_cost:
+                if estimate is None:
+                    heapq.heappush(open_set, (tentative_cost, child))
+                elif estimate[child] != inf:
+                    heapq.heappush(open_set, (tentative_cost + estimate[child], child))
+                else:
+                    continue
+                pushes += 1
+                if len(open_set) > peak_frontier:
+                    peak_frontier = len(open_set)
+                cost[child] = tentative_cost
+                predecessor[child] = current
+
+    return expanded, pushes, pushes - len(open_set), peak_frontier
@@ -1,13 +1,137 @@
+import concurrent.futures
+import contextlib
+import importlib.util
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
+import unittest.mock
+import urllib.request
+from xml.etree import ElementTree
+
+import numpy as np
 
 from maltoolbox.language import LanguageGraph, LanguageClassesFactory
 from maltoolbox.model import Model
-from maltoolbox.attackgraph import Attacker, AttackGraph
+from maltoolbox.attackgraph import Attacker, AttackGraph, AttackGraphNode
+import maltoolbox.attackgraph.query
 
 # Custom files.
+import attack_path
+import batch_evaluation
+import cli
 import constants
+import cost_table
+import exporters
+import graph_cache
 import help_functions
+import instrumentation
+import neo4j_export
+import query_cache
+import query_server
 from attack_simulation import AttackSimulation
+from compiled_graph import CompiledAttackGraph
+import traversal
+import heuristics
+import shortest_path
+
+class RecordingCursor:
+
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+
+class RecordingTransaction:
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, cypher, parameters=None):
+        self.graph.statements.append((cypher, parameters))
+        records = []
+        if "RETURN row.key AS key, id(n) AS id" in cypher:
+            for row in parameters["rows"]:
+                self.graph.nodes[len(self.graph.nodes)] = row["properties"]
+                records.append({"key": row["key"], "id": len(self.graph.nodes) - 1})
+        elif "CREATE (a)-" in cypher:
+            self.graph.relationships.extend((row["from"], row["to"]) for row in parameters["rows"])
+        elif "SET n:" in cypher:
+            for row in parameters["rows"]:
+                self.graph.nodes[row["id"]] = row["properties"]
+        elif "DETACH DELETE" in cypher:
+            for neo4j_id in parameters["ids"]:
+                del self.graph.nodes[neo4j_id]
+        return RecordingCursor(records)
+
+
+class RecordingGraph:
+    """
+    A local stand-in for a py2neo Graph that records the statements run on it. The first
+    failing_commits commits raise, and a rollback restores the nodes and relationships.
+    """
+
+    def __init__(self, failing_commits=0):
+        self.statements = []
+        self.nodes = {}
+        self.relationships = []
+        self.commits = 0
+        self.failing_commits = failing_commits
+        self.snapshot = None
+
+    def delete_all(self):
+        self.statements.append(("MATCH (n) DETACH DELETE n", None))
+        self.nodes = {}
+        self.relationships = []
+
+    def begin(self):
+        self.snapshot = (dict(self.nodes), list(self.relationships))
+        return RecordingTransaction(self)
+
+    def commit(self, tx):
+        if self.failing_commits:
+            self.failing_commits -= 1
+            raise ConnectionError("commit failed")
+        self.commits += 1
+
+    def rollback(self, tx):
+        self.nodes, self.relationships = self.snapshot
+
+
+def build_gated_entry_point_attackgraph():
+    """
+    Build the attack graph p -> e -> c, where e is an 'and' attack step with the necessary
+    parent p, and an attacker with e as its only entry point. p is never reached, so
+    mal-toolbox does not let the attacker traverse e or c.
+    """
+    attackgraph = AttackGraph()
+    nodes = {
+        name: AttackGraphNode(type=node_type, name=name, ttc={})
+        for name, node_type in (('p', 'or'), ('e', 'and'), ('c', 'or'))
+    }
+    for node in nodes.values():
+        attackgraph.add_node(node)
+    for parent, child in (('p', 'e'), ('e', 'c')):
+        nodes[parent].children.append(nodes[child])
+        nodes[child].parents.append(nodes[parent])
+    attacker = Attacker('attacker', entry_points=[nodes['e']], reached_attack_steps=[nodes['e']])
+    return attackgraph, attacker, nodes
+
+def run_job_results(job):
+    """
+    Run a cli.py job and get its results without the run times.
+    """
+    results = cli.run_job(job, io.StringIO())
+    for result in results:
+        result.pop("seconds", None)
+    return results
 
 def print_function_name(func):
     def wrapper(*args, **kwargs):
@@ -75,7 +199,7 @@ class TestAttackSimulation(unittest.TestCase):
         # Arrange
         target_attack_step = self.attackgraph.get_node_by_full_name("OS App:fullAccess").id
         entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
-        actual_cost = 19
+        actual_cost = 18
         expected_visited_full_names = {"OS App:attemptFullAccessFromSupplyChainCompromise", "OS App:bypassSupplyChainAuditing", "OS App:supplyChainAuditingBypassed", "OS App:fullAccessFromSupplyChainCompromise", "OS App:fullAccess"}
         expected_visited_ids = {
              self.attackgraph.get_node_by_full_name(name).id
@@ -123,6 +247,24 @@ class TestAttackSimulation(unittest.TestCase):
         expected_visited_ids.add(attack_simulation.start_node)
         self.assertEqual(visited, expected_visited_ids)
 
+    @print_function_name
+    def test_shortest_path_without_target(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attack_simulation = AttackSimulation(self.attackgraph, self.attackgraph.attackers[0], use_ttc=False)
+
+        # Act
+        cost = attack_simulation.dijkstra()
+        astar_cost = attack_simulation.dijkstra(heuristic='reverse')
+
+        # Assert
+        self.assertEqual(cost, 0)
+        self.assertEqual(astar_cost, 0)
+        self.assertEqual(len(attack_simulation.visited), 0)
+        self.assertTrue(attack_simulation.shortest_path_result.is_complete)
+
     @print_function_name
     def test_shortest_path_on_unreachable_attack_step(self):
         # Arrange
@@ -195,7 +337,7 @@ class TestAttackSimulation(unittest.TestCase):
     def test_shortest_path_on_one_possible_path_but_5_entry_points(self):
             # Arrange
             target_attack_step = self.attackgraph.get_node_by_full_name("Data:4:accessDecryptedData").id
-            actual_cost = 48
+            actual_cost = 39
             entry_point_attack_steps = [[5, ["attemptCredentialTheft", "attemptReadFromReplica", "guessCredentialsFromHash", "weakCredentials"]], [6, ["attemptUse"]]]
             self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
             self.attackgraph.attach_attackers()
@@ -209,6 +351,50 @@ class TestAttackSimulation(unittest.TestCase):
             # Assert
             self.assertEqual(cost, actual_cost)
         
+    @print_function_name
+    def test_shortest_path_cost_counts_every_step_once(self):
+        # Arrange
+        # The paths are built by hand as (target, entry points, steps), each step with its cost.
+        # Both contain an 'and' step whose necessary parents share steps, which are paid once.
+        paths = [
+            ("OS App:fullAccess", [[0, ["attemptFullAccessFromSupplyChainCompromise"]]], [
+                ("OS App:attemptFullAccessFromSupplyChainCompromise", 9),
+                ("OS App:bypassSupplyChainAuditing", 3),
+                ("OS App:supplyChainAuditingBypassed", 4),
+                ("OS App:fullAccessFromSupplyChainCompromise", 1),
+                ("OS App:fullAccess", 1),
+            ]),
+            ("Data:4:accessDecryptedData", [[5, ["attemptCredentialTheft", "attemptReadFromReplica", "guessCredentialsFromHash", "weakCredentials"]], [6, ["attemptUse"]]], [
+                ("Credentials:6:attemptUse", 9),
+                ("Credentials:6:use", 7),
+                ("Credentials:5:attemptReadFromReplica", 4),
+                ("Credentials:5:read", 5),
+                ("Credentials:5:attemptUse", 1),
+                ("Credentials:5:use", 9),
+                ("Data:4:accessDecryptedData", 4),
+            ]),
+        ]
+        expected_costs = [18, 39]
+
+        for (target, entry_point_attack_steps, steps), expected_cost in zip(paths, expected_costs):
+            self.setUp()
+            self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+            self.attackgraph.attach_attackers()
+            attacker = self.attackgraph.attackers[0]
+            attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+            attack_simulation.set_target_node(self.attackgraph.get_node_by_full_name(target).id)
+
+            # Act
+            cost = attack_simulation.dijkstra()
+
+            # Assert
+            step_costs = {full_name: attack_simulation.id_to_cost[self.attackgraph.get_node_by_full_name(full_name).id] for full_name, _ in steps}
+            self.assertEqual(step_costs, dict(steps))
+            self.assertEqual(sum(step_costs.values()), expected_cost)
+            self.assertEqual(cost, expected_cost)
+            visited_full_names = {node.full_name for node in attack_simulation.visited if node.name != "firstSteps"}
+            self.assertEqual(visited_full_names, set(step_costs))
+
     @print_function_name
     def test_random_path_with_infinate_cost_budget_on_reachable_node(self):
         # Arrange
@@ -318,5 +504,1270 @@ class TestAttackSimulation(unittest.TestCase):
                 # Assert
                 self.assertEqual(cost_1, cost_2)
 
+    @print_function_name
+    def test_ttc_costs_with_seeded_rng(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation_1 = AttackSimulation(self.attackgraph, attacker, use_ttc=True, rng=1)
+        attack_simulation_2 = AttackSimulation(self.attackgraph, attacker, use_ttc=True, rng=1)
+
+        # Assert
+        for node in self.attackgraph.nodes:
+            if node.name == "firstSteps":
+                continue
+            self.assertEqual(attack_simulation_1.id_to_cost[node.id], attack_simulation_2.id_to_cost[node.id])
+            if not node.ttc:
+                self.assertEqual(attack_simulation_1.id_to_cost[node.id], 0)
+
+    @print_function_name
+    def test_compiled_graph_matches_attack_graph(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False, use_compiled_graph=True)
+        graph = attack_simulation.compiled_graph
+
+        # Assert
+        self.assertEqual(graph.num_nodes, len(self.attackgraph.nodes))
+        for node in self.attackgraph.nodes:
+            index = graph.index(node.id)
+            self.assertEqual(graph.node_id(index), node.id)
+            self.assertEqual([graph.node_id(i) for i in graph.children(index)], [child.id for child in node.children])
+            self.assertEqual([graph.node_id(i) for i in graph.parents(index)], [parent.id for parent in node.parents])
+            self.assertEqual(graph.cost[index], attack_simulation.id_to_cost.get(node.id, 0))
+
+    @print_function_name
+    def test_shortest_path_on_compiled_graph(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("OS App:fullAccess").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        actual_cost = 18
+        expected_visited_full_names = {"OS App:attemptFullAccessFromSupplyChainCompromise", "OS App:bypassSupplyChainAuditing", "OS App:supplyChainAuditingBypassed", "OS App:fullAccessFromSupplyChainCompromise", "OS App:fullAccess"}
+        expected_visited_ids = {
+             self.attackgraph.get_node_by_full_name(name).id
+             for name in expected_visited_full_names
+        }
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False, use_compiled_graph=True)
+        attack_simulation.set_target_node(target_attack_step)
+        cost = attack_simulation.dijkstra()
+        visited = set([node.id for node in attack_simulation.visited])
+
+        # Assert
+        self.assertEqual(cost, actual_cost)
+        expected_visited_ids.add(attack_simulation.start_node)
+        self.assertEqual(visited, expected_visited_ids)
+
+    @print_function_name
+    def test_bfs_on_compiled_graph(self):
+        # Arrange
+        attacker_cost_budget = 12
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation_1 = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation_1.set_attacker_cost_budget(attacker_cost_budget)
+        cost_1 = attack_simulation_1.bfs()
+        attack_simulation_2 = AttackSimulation(self.attackgraph, attacker, use_ttc=False, use_compiled_graph=True)
+        attack_simulation_2.set_attacker_cost_budget(attacker_cost_budget)
+        cost_2 = attack_simulation_2.bfs()
+
+        # Assert
+        self.assertEqual(cost_1, cost_2)
+        self.assertEqual(
+            sorted(node.id for node in attack_simulation_1.visited if node.name != "firstSteps"),
+            sorted(node.id for node in attack_simulation_2.visited if node.name != "firstSteps")
+        )
+
+    @print_function_name
+    def test_random_path_on_compiled_graph(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("OS App:fullAccessFromSupplyChainCompromise").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        optimal_cost = 19
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False, use_compiled_graph=True)
+        attack_simulation.set_target_node(target_attack_step)
+        cost = attack_simulation.random_path()
+
+        # Assert
+        self.assertGreater(cost, optimal_cost)
+        self.assertIn(attack_simulation.attackgraph_dictionary[target_attack_step], attack_simulation.visited)
+
+    @print_function_name
+    def test_shortest_path_with_astar_heuristics(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        actual_cost = 79
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_target_node(target_attack_step)
+
+        # Act
+        cost = attack_simulation.dijkstra()
+        expanded = attack_simulation.shortest_path_result.expanded
+        reverse_cost = attack_simulation.dijkstra(heuristic='reverse')
+        reverse_expanded = attack_simulation.shortest_path_result.expanded
+        landmark_cost = attack_simulation.dijkstra(heuristic='landmarks')
+
+        # Assert
+        self.assertEqual(cost, actual_cost)
+        self.assertEqual(reverse_cost, actual_cost)
+        self.assertEqual(landmark_cost, actual_cost)
+        self.assertLess(reverse_expanded, expanded)
+
+    @print_function_name
+    def test_random_path_batch(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("OS App:fullAccessFromSupplyChainCompromise").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        reached_attack_steps = list(attacker.reached_attack_steps)
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_target_node(target_attack_step)
+
+        # Act
+        result = attack_simulation.random_path_batch(2500, seed=11, max_workers=2)
+        result_in_process = attack_simulation.random_path_batch(2500, seed=11, max_workers=1)
+        summary = result.summary()
+
+        # Assert
+        np.testing.assert_array_equal(result.cost, result_in_process.cost)
+        self.assertTrue(result.target_reached.all())
+        self.assertGreaterEqual(result.cost.min(), 17)
+        self.assertEqual(summary["trials"], 2500)
+        self.assertEqual(summary["target_hit_rate"], 1.0)
+        self.assertEqual(attacker.reached_attack_steps, reached_attack_steps)
+        self.assertEqual(attack_simulation.visited, [])
+
+    @print_function_name
+    def test_upload_graph_to_neo4j_in_batches(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_target_node(target_attack_step)
+        attack_simulation.dijkstra()
+        neo4j_graph_connection = RecordingGraph()
+
+        # Act
+        attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, batch_size=4)
+
+        # Assert
+        self.assertEqual(len(neo4j_graph_connection.nodes), 15)
+        self.assertEqual(len(neo4j_graph_connection.relationships), 14)
+        self.assertEqual(neo4j_graph_connection.commits, 1)
+        self.assertTrue(all("UNWIND $rows AS row" in cypher for cypher, _ in neo4j_graph_connection.statements[1:]))
+        self.assertTrue(all(len(parameters["rows"]) <= 4 for _, parameters in neo4j_graph_connection.statements[1:]))
+        self.assertIn("CREATE (n:`Credentials:9`:`False`)", "".join(cypher for cypher, _ in neo4j_graph_connection.statements))
+        full_names = {properties["full_name"] for properties in neo4j_graph_connection.nodes.values()}
+        self.assertEqual(full_names, {node.id for node in attack_simulation.visited})
+
+    @print_function_name
+    def test_step_by_step_syncs_only_changes_to_neo4j(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        neo4j_graph_connection = RecordingGraph()
+        # Attack the first horizon node three times, then return.
+        commands = ["2", "1"] * 3 + ["3"]
+
+        # Act
+        with unittest.mock.patch("builtins.input", side_effect=commands), contextlib.redirect_stdout(io.StringIO()):
+            attack_simulation.step_by_step_attack_simulation(neo4j_graph_connection)
+
+        # Assert
+        deletes = [cypher for cypher, _ in neo4j_graph_connection.statements if "DETACH DELETE" in cypher]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(neo4j_graph_connection.commits, 4)
+        nodes, edges = attack_simulation.build_neo4j_graph(add_horizon=True)
+        uploaded = {properties["full_name"]: properties["is_horizon_node"] for properties in neo4j_graph_connection.nodes.values()}
+        self.assertEqual(uploaded, {key: properties["is_horizon_node"] for key, _, properties in nodes})
+        full_names = {neo4j_id: properties["full_name"] for neo4j_id, properties in neo4j_graph_connection.nodes.items()}
+        relationships = {(full_names[a], full_names[b]) for a, b in neo4j_graph_connection.relationships}
+        self.assertEqual(relationships, set(edges))
+
+    @print_function_name
+    def test_failed_sync_update_is_retried(self):
+        # Arrange
+        neo4j_graph_connection = RecordingGraph()
+        neo4j_sync = neo4j_export.Neo4jDiffSync(neo4j_graph_connection)
+        neo4j_sync.upload([("a", ("A:0", "False"), {"full_name": "a"})], [])
+        nodes = [("b", ("B:1", "False"), {"full_name": "b"}), ("c", ("C:2", "True"), {"full_name": "c"})]
+        edges = [("a", "b"), ("b", "c")]
+        neo4j_graph_connection.failing_commits = 1
+
+        # Act
+        with self.assertRaises(ConnectionError):
+            neo4j_sync.update(nodes, edges)
+        state_after_failure = (dict(neo4j_sync.nodes), dict(neo4j_sync.neo4j_ids), set(neo4j_sync.edges))
+        neo4j_sync.update(nodes, edges)
+
+        # Assert
+        self.assertEqual(state_after_failure, ({"a": (("A:0", "False"), {"full_name": "a"})}, {"a": 0}, set()))
+        self.assertEqual(neo4j_graph_connection.commits, 2)
+        self.assertEqual(set(neo4j_sync.nodes), {"a", "b", "c"})
+        self.assertEqual(neo4j_sync.edges, set(edges))
+        full_names = {neo4j_id: properties["full_name"] for neo4j_id, properties in neo4j_graph_connection.nodes.items()}
+        self.assertEqual(sorted(full_names.values()), ["a", "b", "c"])
+        relationships = {(full_names[a], full_names[b]) for a, b in neo4j_graph_connection.relationships}
+        self.assertEqual(relationships, set(edges))
+
+    @print_function_name
+    def test_profiler(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        records = []
+        profiler = instrumentation.Profiler(callback=records.append)
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False, profiler=profiler)
+        attack_simulation.set_target_node(target_attack_step)
+        neo4j_graph_connection = RecordingGraph()
+
+        # Act
+        attack_simulation.dijkstra()
+        attack_simulation.upload_graph_to_neo4j(neo4j_graph_connection, batch_size=4)
+        summary = profiler.summary()
+
+        # Assert
+        self.assertEqual([record["phase"] for record in records], [
+            'get_costs', 'compile_graph', 'search', 'reconstruct_path', 'dijkstra', 'export_results', 'upload_graph_to_neo4j'
+        ])
+        result = attack_simulation.shortest_path_result
+        self.assertEqual(records[4]["counters"]["nodes_expanded"], result.expanded)
+        self.assertEqual(summary["counters"]["heap_pops"], result.heap_pops)
+        self.assertEqual(summary["maxima"]["peak_frontier"], result.peak_frontier)
+        # The statements, the transaction and its commit.
+        self.assertEqual(records[6]["counters"]["db_round_trips"], len(neo4j_graph_connection.statements) + 2)
+        self.assertEqual(json.loads(profiler.to_json())["phases"]["dijkstra"]["calls"], 1)
+        self.assertIn('mal_traverser_phase_calls_total{phase="search"} 1', profiler.to_prometheus())
+        self.assertIs(AttackSimulation(self.attackgraph, attacker, use_ttc=False).profiler, instrumentation.DISABLED)
+
+    @print_function_name
+    def test_path_result_is_ordered_sets(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_target_node(target_attack_step)
+
+        # Act
+        attack_simulation.dijkstra()
+
+        # Assert
+        visited_ids = [node.id for node in attack_simulation.visited]
+        self.assertEqual(len(visited_ids), len(set(visited_ids)))
+        self.assertIn(target_attack_step, attack_simulation.visited)
+        self.assertTrue(set(attack_simulation.path) <= set(visited_ids))
+        for node_id, links in attack_simulation.path.items():
+            self.assertIsInstance(links, attack_path.OrderedNodeSet)
+            self.assertTrue(all(link in attack_simulation.visited for link in links))
+
+    def run_dijkstra_for_export(self):
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_target_node(target_attack_step)
+        attack_simulation.dijkstra()
+        return attack_simulation
+
+    @print_function_name
+    def test_export_results_to_files(self):
+        # Arrange
+        attack_simulation = self.run_dijkstra_for_export()
+        _, neo4j_edges = attack_simulation.build_neo4j_graph()
+        visited = {node.id for node in attack_simulation.visited}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results")
+
+            # Act
+            attack_simulation.export_results(exporters.create_exporter("jsonl", path))
+            attack_simulation.export_results(exporters.create_exporter("graphml", path))
+
+            # Assert
+            with open(path + ".nodes.jsonl") as file:
+                records = [json.loads(line) for line in file]
+            with open(path + ".edges.jsonl") as file:
+                edges = [tuple(json.loads(line).values()) for line in file]
+            self.assertEqual({record["id"] for record in records}, visited)
+            self.assertFalse(any(record["is_horizon_node"] for record in records))
+            self.assertEqual(edges, neo4j_edges)
+            graphml = ElementTree.parse(path + ".graphml").getroot()
+            namespace = {"g": "http://graphml.graphdrawing.org/xmlns"}
+            self.assertEqual({int(node.get("id")) for node in graphml.iterfind(".//g:node", namespace)}, visited)
+            self.assertEqual(len(graphml.findall(".//g:edge", namespace)), len(neo4j_edges))
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    @print_function_name
+    def test_export_results_to_parquet(self):
+        # Arrange
+        import pyarrow.parquet
+        attack_simulation = self.run_dijkstra_for_export()
+        _, neo4j_edges = attack_simulation.build_neo4j_graph()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results")
+            exporter = exporters.ArrowExporter(path + ".nodes.parquet", path + ".edges.parquet", batch_size=4)
+
+            # Act
+            attack_simulation.export_results(exporter)
+
+            # Assert
+            nodes = pyarrow.parquet.read_table(path + ".nodes.parquet")
+            edges = pyarrow.parquet.read_table(path + ".edges.parquet")
+            self.assertEqual(sorted(nodes.column("id").to_pylist()), sorted(node.id for node in attack_simulation.visited))
+            self.assertEqual(list(zip(edges.column("from").to_pylist(), edges.column("to").to_pylist())), neo4j_edges)
+
+    @print_function_name
+    def test_cost_table_matches_json_costs(self):
+        # Arrange
+        target_attack_step = self.attackgraph.get_node_by_full_name("Credentials:9:propagateOneCredentialCompromised").id
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        with tempfile.TemporaryDirectory() as directory:
+            table_file = os.path.join(directory, "costs" + cost_table.COSTS_SUFFIX)
+            cost_table.CostTable.from_full_names(help_functions.load_costs_from_file(), self.attackgraph).save(table_file)
+
+            # Act
+            json_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+            table_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False, cost_file=table_file)
+            json_simulation.set_target_node(target_attack_step)
+            table_simulation.set_target_node(target_attack_step)
+            json_cost = json_simulation.dijkstra()
+            table_cost = table_simulation.dijkstra()
+
+            # Assert
+            self.assertIsInstance(table_simulation.id_to_cost.costs, np.memmap)
+            self.assertEqual(dict(table_simulation.id_to_cost), json_simulation.id_to_cost)
+            self.assertEqual(table_cost, json_cost)
+            np.testing.assert_array_equal(table_simulation.compiled_graph.cost, json_simulation.compiled_graph.cost)
+
+    @print_function_name
+    def test_reachable_within_budget(self):
+        # Arrange
+        attacker_cost_budget = 20
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_attacker_cost_budget(attacker_cost_budget)
+
+        # Act
+        cost = attack_simulation.reachable_within_budget()
+
+        # Assert
+        costs = attack_simulation.compute_attack_costs()
+        expected = {node_id for node_id, node_cost in costs.items() if node_cost <= attacker_cost_budget}
+        self.assertEqual({node.id for node in attack_simulation.visited}, expected)
+        self.assertEqual(cost, max(costs[node_id] for node_id in expected))
+        self.assertNotIn(self.attackgraph.get_node_by_full_name("OS App:fullAccessFromSupplyChainCompromise").id, expected)
+        for node in attack_simulation.visited:
+            if node.type == 'and':
+                self.assertTrue(all(parent in attack_simulation.visited for parent in node.parents if parent.is_necessary))
+
+    @print_function_name
+    def test_streaming_traversals(self):
+        # Arrange
+        attacker_cost_budget = 20
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        attack_simulation.set_attacker_cost_budget(attacker_cost_budget)
+        attack_simulation.reachable_within_budget()
+        reachable = [node.id for node in attack_simulation.visited]
+        attack_simulation.random_path(seed=3)
+        random_path = [node.id for node in attack_simulation.visited]
+
+        # Act
+        events = list(attack_simulation.iter_reachable_within_budget())
+        first_events = list(itertools.islice(attack_simulation.iter_reachable_within_budget(), 3))
+        random_events = list(attack_simulation.iter_random_path(seed=3))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results")
+            attack_simulation.export_events(attack_simulation.iter_reachable_within_budget(), exporters.create_exporter("jsonl", path))
+            with open(path + ".nodes.jsonl") as file:
+                exported = [json.loads(line)["id"] for line in file]
+            with open(path + ".edges.jsonl") as file:
+                exported_edges = [(edge["from"], edge["to"]) for edge in map(json.loads, file)]
+            attack_simulation.export_events(attack_simulation.iter_bfs(), exporters.create_exporter("jsonl", path), unique=False)
+            with open(path + ".nodes.jsonl") as file:
+                exported_bfs = [json.loads(line)["id"] for line in file]
+
+        # Assert
+        self.assertEqual([node.id for node, _, _ in events], reachable)
+        self.assertEqual([cost for _, cost, _ in events], sorted(cost for _, cost, _ in events))
+        self.assertIsNone(events[0][2])
+        self.assertTrue(all(node in parent.children for node, _, parent in events[1:]))
+        self.assertEqual(first_events, events[:3])
+        self.assertEqual([node.id for node, _, _ in random_events], random_path)
+        self.assertEqual(random_events[-1][1], attack_simulation.random_path(seed=3))
+        self.assertEqual(exported, reachable)
+        self.assertEqual(exported_edges, [(parent.id, node.id) for node, _, parent in events[1:]])
+        spool = exporters.EdgeSpool(batch_size=2)
+        for edge in exported_edges:
+            spool.add(*edge)
+        self.assertEqual(list(spool), exported_edges)
+        spool.close()
+        self.assertEqual(exported_bfs, list(dict.fromkeys(node.id for node, _, _ in attack_simulation.iter_bfs())))
+
+    @print_function_name
+    def test_batch_evaluation(self):
+        # Arrange
+        configurations = [
+            [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse"]], [8, ["attemptCredentialsReuse"]]],
+            [[0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]]]
+        ]
+        num_nodes = len(self.attackgraph.nodes)
+        evaluator = batch_evaluation.BatchEvaluator.from_attackgraph(self.attackgraph)
+
+        # Act
+        results = evaluator.evaluate(self.model, configurations)
+        parallel_results = evaluator.evaluate(self.model, configurations, max_workers=2)
+
+        # Assert
+        self.assertEqual(len(self.attackgraph.nodes), num_nodes)
+        self.assertEqual(self.model.attackers[0].entry_points, [])
+        for result, parallel_result in zip(results, parallel_results):
+            self.assertEqual(result.costs_by_id(), parallel_result.costs_by_id())
+        self.model = help_functions.add_entry_points_to_attacker(self.model, configurations[0])
+        self.attackgraph.attach_attackers()
+        attack_simulation = AttackSimulation(self.attackgraph, self.attackgraph.attackers[0], use_ttc=False)
+        expected = attack_simulation.compute_attack_costs()
+        del expected[attack_simulation.start_node]
+        self.assertEqual(results[0].costs_by_id(), expected)
+        self.assertNotEqual(results[1].costs_by_id(), expected)
+
+    @print_function_name
+    def test_batch_evaluation_matches_attack_simulation_on_and_entry_point(self):
+        for reach_parent in (False, True):
+            # Arrange
+            # The 'or' entry point q leads to p, the necessary parent of the 'and' entry point e.
+            attackgraph, attacker, nodes = build_gated_entry_point_attackgraph()
+            if reach_parent:
+                q = AttackGraphNode(type='or', name='q', ttc={})
+                attackgraph.add_node(q)
+                q.children.append(nodes['p'])
+                nodes['p'].parents.append(q)
+                attacker.entry_points.append(q)
+            id_to_cost = {node.id: 1 for node in attackgraph.nodes}
+            graph = CompiledAttackGraph.from_attackgraph(attackgraph.nodes, id_to_cost)
+            sources = [graph.index(node.id) for node in attacker.entry_points]
+            attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=True, rng=0)
+            attack_simulation.id_to_cost = {node.id: 1 for node in attackgraph.nodes}
+
+            # Act
+            result = batch_evaluation.evaluate_sources(graph, sources)
+            expected = attack_simulation.compute_attack_costs()
+            del expected[attack_simulation.start_node]
+
+            # Assert
+            self.assertEqual(result.costs_by_id(), expected)
+            self.assertEqual(nodes['c'].id in expected, reach_parent)
+
+    @print_function_name
+    def test_searches_have_no_side_effects(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        reached_attack_steps = list(attacker.reached_attack_steps)
+        id_to_cost = dict(attack_simulation.id_to_cost)
+        target = self.attackgraph.get_node_by_full_name("Data:4:accessDecryptedData").id
+        budgets = [5, 10, 20, 40, None] * 4
+
+        # Act
+        expected = [attack_simulation.search(budget=budget).costs_by_id() for budget in budgets]
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda budget: attack_simulation.search(budget=budget).costs_by_id(), budgets))
+        first_cost = attack_simulation.search(target).path_cost(attack_simulation.get_compiled_graph().index(target))
+        second_cost = attack_simulation.search(target).path_cost(attack_simulation.get_compiled_graph().index(target))
+
+        # Assert
+        self.assertEqual(results, expected)
+        self.assertEqual(first_cost, second_cost)
+        self.assertEqual(attacker.reached_attack_steps, reached_attack_steps)
+        self.assertEqual(dict(attack_simulation.id_to_cost), id_to_cost)
+        self.assertEqual(len(attack_simulation.visited), 0)
+        self.assertIsNone(attack_simulation.shortest_path_result)
+
+    @print_function_name
+    def test_query_cache(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attack_simulation = AttackSimulation(self.attackgraph, self.attackgraph.attackers[0], use_ttc=False)
+        cache = query_cache.QueryResultCache()
+        attack_simulation.set_query_cache(cache)
+        target = self.attackgraph.get_node_by_full_name("Data:4:accessDecryptedData").id
+        attack_simulation.set_target_node(target)
+
+        # Act
+        cost = attack_simulation.dijkstra()
+        visited, path = list(attack_simulation.visited), dict(attack_simulation.path)
+        cached_cost = attack_simulation.dijkstra()
+        cached_visited, cached_path = list(attack_simulation.visited), dict(attack_simulation.path)
+        first_stats = cache.stats()
+        attack_simulation.id_to_cost[target] += 100
+        attack_simulation.compile_graph()
+        changed_cost = attack_simulation.dijkstra()
+        attack_simulation.set_target_node(None)
+        attack_simulation.set_attacker_cost_budget(30)
+        random_costs = [attack_simulation.random_path(seed) for seed in (1, 1, 2, None)]
+
+        # Assert
+        self.assertEqual(cached_cost, cost)
+        self.assertEqual(cached_visited, visited)
+        self.assertEqual({key: list(value) for key, value in cached_path.items()}, {key: list(value) for key, value in path.items()})
+        self.assertEqual(first_stats["hits"], 1)
+        self.assertEqual(first_stats["misses"], 1)
+        self.assertEqual(changed_cost, cost + 100)
+        self.assertEqual(random_costs[0], random_costs[1])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 4)
+        cache.invalidate(attack_simulation.graph_fingerprint)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    @print_function_name
+    def test_query_cache_hit_restores_the_search(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        profiler = instrumentation.Profiler()
+        attack_simulation = AttackSimulation(self.attackgraph, self.attackgraph.attackers[0], use_ttc=False, profiler=profiler)
+        attack_simulation.set_query_cache(query_cache.QueryResultCache())
+        graph = attack_simulation.get_compiled_graph()
+        target = self.attackgraph.get_node_by_full_name("Data:4:accessDecryptedData").id
+        other_target = self.attackgraph.get_node_by_full_name("OS App:fullAccess").id
+        attack_simulation.set_target_node(target)
+        attack_simulation.dijkstra()
+        visited = [node.id for node in attack_simulation.visited]
+
+        # Act
+        attack_simulation.set_target_node(other_target)
+        attack_simulation.dijkstra()
+        attack_simulation.set_target_node(target)
+        cost = attack_simulation.dijkstra()
+        result = attack_simulation.shortest_path_result
+        searches = profiler.summary()["counters"]["searches"]
+        path_cost = attack_simulation.path_to_target(target)
+
+        # Assert
+        self.assertEqual(profiler.summary()["counters"]["query_cache_hits"], 1)
+        self.assertEqual(result.target, graph.index(target))
+        self.assertEqual(path_cost, cost)
+        self.assertEqual([node.id for node in attack_simulation.visited], visited)
+        self.assertEqual(profiler.summary()["counters"]["searches"], searches)
+
+    @print_function_name
+    def test_budget_sweep(self):
+        # Arrange
+        budgets = [0, 5, 20, 60]
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+
+        # Act
+        reachable = attack_simulation.budget_sweep(budgets)
+        frontier = attack_simulation.cost_frontier()
+
+        # Assert
+        for budget in budgets:
+            attack_simulation.set_attacker_cost_budget(budget)
+            attack_simulation.reachable_within_budget()
+            self.assertEqual(set(reachable[budget]), {node.id for node in attack_simulation.visited})
+        self.assertEqual(frontier.reachable_counts(budgets).tolist(), [len(reachable[budget]) for budget in budgets])
+        costs, counts = frontier.curve()
+        self.assertTrue(np.all(np.diff(costs) > 0))
+        self.assertEqual(counts[-1], len(frontier.indices))
+        self.assertEqual(counts.tolist(), frontier.reachable_counts(costs).tolist())
+
+    @print_function_name
+    def test_reconstruct_path_on_deep_and_diamonds(self):
+        # Arrange
+        # A chain of diamonds, the bottom of each is an 'and' step of both sides and the top of the next.
+        num_layers = 2000
+        attackgraph = AttackGraph()
+        top = AttackGraphNode(type='or', name='top', ttc={})
+        attackgraph.add_node(top)
+        entry_point = top
+        for layer in range(num_layers):
+            left = AttackGraphNode(type='or', name=f'left{layer}', ttc={})
+            right = AttackGraphNode(type='or', name=f'right{layer}', ttc={})
+            bottom = AttackGraphNode(type='and', name=f'bottom{layer}', ttc={})
+            for node in (left, right, bottom):
+                attackgraph.add_node(node)
+            for parent, child in ((top, left), (top, right), (left, bottom), (right, bottom)):
+                parent.children.append(child)
+                child.parents.append(parent)
+            top = bottom
+        attacker = Attacker('attacker', entry_points=[entry_point], reached_attack_steps=[entry_point])
+        attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=True, rng=0)
+        attack_simulation.id_to_cost = {node.id: 1 for node in attackgraph.nodes}
+        attack_simulation.set_target_node(top.id)
+
+        # Act
+        # With 'sum' the search cost of the bottoms doubles in every layer, the path cost does not.
+        cost = attack_simulation.dijkstra(and_cost='max')
+
+        # Assert
+        self.assertEqual(cost, 3 * num_layers + 1)
+        self.assertEqual(len(attack_simulation.visited), 3 * num_layers + 2)
+        self.assertEqual(sum(len(links) for links in attack_simulation.path.values()), 4 * num_layers + 1)
+        position = {node.id: i for i, node in enumerate(attack_simulation.visited)}
+        self.assertTrue(all(position[parent_id] < position[link.id] for parent_id, links in attack_simulation.path.items() for link in links))
+
+    @print_function_name
+    def test_and_entry_point_with_unreached_parent_is_not_reached(self):
+        # Arrange
+        attackgraph, attacker, nodes = build_gated_entry_point_attackgraph()
+        attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=True, rng=0)
+        attack_simulation.id_to_cost = {node.id: 1 for node in attackgraph.nodes}
+        attack_simulation.set_target_node(nodes['c'].id)
+        attack_simulation.set_attacker_cost_budget(10)
+        traversable = maltoolbox.attackgraph.query.is_node_traversable_by_attacker(nodes['e'], attacker)
+
+        # Act
+        cost = attack_simulation.dijkstra()
+        visited = list(attack_simulation.visited)
+        astar_cost = attack_simulation.dijkstra(heuristic='reverse')
+        astar_visited = list(attack_simulation.visited)
+        attack_simulation.reachable_within_budget()
+        reachable = [node.id for node in attack_simulation.visited]
+
+        # Assert
+        self.assertFalse(traversable)
+        self.assertEqual((cost, visited), (0, []))
+        self.assertEqual((astar_cost, astar_visited), (0, []))
+        self.assertEqual(reachable, [attack_simulation.start_node])
+
+    @print_function_name
+    def test_random_path_does_not_traverse_and_entry_point_with_unreached_parent(self):
+        # Arrange
+        attackgraph, attacker, nodes = build_gated_entry_point_attackgraph()
+        attack_simulation = AttackSimulation(attackgraph, attacker, use_ttc=True, rng=0)
+        attack_simulation.id_to_cost = {node.id: 1 for node in attackgraph.nodes}
+        graph = attack_simulation.get_compiled_graph()
+
+        # Act
+        horizon = traversal.AttackHorizon(graph, [graph.index(attack_simulation.start_node)])
+        cost = attack_simulation.random_path(seed=1)
+        visited = [node.id for node in attack_simulation.visited]
+        events = list(attack_simulation.iter_random_path(seed=1))
+
+        # Assert
+        self.assertEqual(len(horizon), 0)
+        self.assertEqual(cost, 0)
+        self.assertEqual(visited, [attack_simulation.start_node])
+        self.assertEqual([node.id for node, _, _ in events], [attack_simulation.start_node])
+
+    @print_function_name
+    def test_attack_costs_for_all_targets_in_one_search(self):
+        # Arrange
+        targets = {"OS App:fullAccess": 18, "Credentials:9:propagateOneCredentialCompromised": 79, "Credentials:5:extract": 0}
+        entry_point_attack_steps = [[5, ["attemptCredentialsReuse"]], [6, ["attemptCredentialsReuse", "guessCredentials"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]], [8, ["attemptCredentialsReuse"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+
+        # Act
+        attack_simulation = AttackSimulation(self.attackgraph, attacker, use_ttc=False)
+        costs = attack_simulation.compute_attack_costs()
+        result = attack_simulation.shortest_path_result
+        path_costs = {}
+        for full_name in targets:
+            target_id = self.attackgraph.get_node_by_full_name(full_name).id
+            path_costs[full_name] = attack_simulation.path_to_target(target_id)
+
+        # Assert
+        self.assertIs(attack_simulation.shortest_path_result, result)
+        self.assertEqual(path_costs, targets)
+        self.assertEqual(costs[attack_simulation.start_node], 0)
+        self.assertIn(self.attackgraph.get_node_by_full_name("OS App:fullAccess").id, costs)
+        self.assertNotIn(self.attackgraph.get_node_by_full_name("Credentials:5:extract").id, costs)
+        visited = set(node.full_name for node in attack_simulation.visited)
+        self.assertNotIn("Credentials:9:propagateOneCredentialCompromised", visited)
+
+    @print_function_name
+    def test_attack_horizon_matches_mal_toolbox_attack_surface(self):
+        # Arrange
+        entry_point_attack_steps = [[5, ["attemptCredentialTheft", "attemptReadFromReplica", "guessCredentialsFromHash", "weakCredentials"]], [6, ["attemptUse", "attemptCredentialsReuse"]], [0, ["softwareProductAbuse", "attemptFullAccessFromSupplyChainCompromise"]]]
+        self.model = help_functions.add_entry_points_to_attacker(self.model, entry_point_attack_steps)
+        self.attackgraph.attach_attackers()
+        attacker = self.attackgraph.attackers[0]
+        graph = CompiledAttackGraph.from_attackgraph(self.attackgraph.nodes, {})
+        horizon = traversal.AttackHorizon(graph, [graph.index(node.id) for node in attacker.reached_attack_steps])
+        rng = np.random.default_rng(3)
+
+        for _ in range(30):
+            # Act
+            expected = {
+                node.id for node in maltoolbox.attackgraph.query.get_attack_surface(attacker)
+                if not node.is_compromised_by(attacker)
+            }
+            actual = {graph.node_id(index) for index in horizon}
+
+            # Assert
+            self.assertEqual(actual, expected)
+            if not len(horizon):
+                break
+            index = horizon.nodes[rng.integers(len(horizon))]
+            attacker.compromise(self.attackgraph.get_node_by_id(graph.node_id(index)))
+            horizon.compromise(index)
+
+
+class TestCli(unittest.TestCase):
+
+    @print_function_name
+    def test_run_job_file(self):
+        # Arrange
+        job = {
+            "exporter": "jsonl",
+            "queries": [
+                {"algorithm": "dijkstra", "targets": ["Data:4:accessDecryptedData", "Unknown:1:step"]},
+                {"algorithm": "random_path", "budgets": [10, 20], "seeds": [1, 2]},
+                {"algorithm": "bfs", "budgets": [5]}
+            ]
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            job_file = os.path.join(directory, "job.json")
+            results_file = os.path.join(directory, "results.jsonl")
+            with open(job_file, 'w') as file:
+                json.dump(job, file)
+
+            # Act
+            cli.main(["--job", job_file, "--results", results_file, "--output", os.path.join(directory, "out"),
+                      "--profile", os.path.join(directory, "profile.prom")])
+
+            # Assert
+            with open(results_file) as file:
+                results = [json.loads(line) for line in file]
+            self.assertEqual([result["algorithm"] for result in results], ["dijkstra"] * 2 + ["random_path"] * 4 + ["bfs"])
+            self.assertTrue(results[0]["target_reached"])
+            self.assertIn("error", results[1])
+            self.assertTrue(all(result["cost"] <= result["budget"] for result in results[2:6]))
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.startswith("out.")),
+                             sorted(f"out.{i}.{kind}.jsonl" for i in (0, 2, 3, 4, 5, 6) for kind in ("nodes", "edges")))
+            self.assertGreater(results[0]["profile"]["nodes_expanded"], 0)
+            with open(os.path.join(directory, "profile.prom")) as file:
+                self.assertIn('mal_traverser_phase_calls_total{phase="query"} 7', file.read())
+
+
+    @print_function_name
+    def test_entry_points_do_not_import_neo4j(self):
+        # Arrange
+        code = "import sys, main, cli; print(sorted(name for name in ('py2neo', 'maltoolbox.ingestors.neo4j') if name in sys.modules))"
+
+        # Act
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout
+
+        # Assert
+        self.assertEqual(output.strip(), "[]")
+
+    @print_function_name
+    def test_graph_cache_gives_the_same_results(self):
+        # Arrange
+        job = {
+            "queries": [
+                {"algorithm": "dijkstra", "targets": ["Data:4:accessDecryptedData", "OS App:fullAccess", "Unknown:1:step"]},
+                {"algorithm": "random_path", "budgets": [20], "seeds": [1, 2]},
+                {"algorithm": "bfs", "budgets": [5]},
+                {"algorithm": "reachability", "budgets": [20]}
+            ]
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Act
+            results = run_job_results(dict(cli.JOB_DEFAULTS, **job))
+            cached_results = run_job_results(dict(cli.JOB_DEFAULTS, graph_cache=directory, **job))
+
+        # Assert
+        self.assertEqual(results[0]["cost"], 53)
+        self.assertEqual(cached_results, results)
+
+    @print_function_name
+    def test_graph_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Arrange
+            cache_dir = os.path.join(directory, "cache")
+            cost_file = os.path.join(directory, "costs.json")
+            with open(constants.COST_FILE) as source, open(cost_file, 'w') as file:
+                file.write(source.read())
+            job = dict(cli.JOB_DEFAULTS, cost_file=cost_file)
+            build = unittest.mock.Mock(side_effect=lambda: cli.build_attack_simulation(job))
+            args = (cache_dir, job["mar_archive"], job["model"], cost_file, build)
+
+            # Act
+            entry = graph_cache.load_or_build(*args)
+            cached_entry = graph_cache.load_or_build(*args)
+            with open(cost_file, 'a') as file:
+                file.write("\n")
+            rebuilt_entry = graph_cache.load_or_build(*args)
+
+            # Assert
+            self.assertEqual(build.call_count, 2)
+            self.assertIsInstance(cached_entry.graph.child_targets, np.memmap)
+            self.assertEqual(cached_entry.graph.fingerprint(), entry.graph.fingerprint())
+            self.assertEqual(rebuilt_entry.graph.fingerprint(), entry.graph.fingerprint())
+            self.assertEqual(len([name for name in os.listdir(cache_dir) if name != graph_cache.DIGEST_INDEX_FILE]), 1)
+            index = cached_entry.index("Data:4:accessDecryptedData")
+            self.assertEqual(cached_entry.node_record(index)["full_name"], "Data:4:accessDecryptedData")
+            self.assertEqual(cached_entry.index(str(cached_entry.graph.node_id(index))), index)
+            self.assertRaises(KeyError, cached_entry.index, "Data:4:unknown")
+
+    @print_function_name
+    def test_graph_cache_digest_index_is_replaced_atomically(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Arrange
+            job = dict(cli.JOB_DEFAULTS)
+            args = (directory, job["mar_archive"], job["model"], job["cost_file"])
+
+            # Act
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                keys = set(executor.map(lambda _: graph_cache.cache_key(*args), range(32)))
+            with open(os.path.join(directory, graph_cache.DIGEST_INDEX_FILE)) as file:
+                digests = json.load(file)
+
+            # Assert
+            self.assertEqual(len(keys), 1)
+            self.assertEqual(len(digests), 3)
+            self.assertEqual(os.listdir(directory), [graph_cache.DIGEST_INDEX_FILE])
+
+    @print_function_name
+    def test_query_engine_matches_cli_and_normalizes_cache_keys(self):
+        # Arrange
+        job = dict(cli.JOB_DEFAULTS)
+        attack_simulation = cli.build_attack_simulation(job)
+        engine = query_server.QueryEngine.from_attack_simulation(attack_simulation, query_cache.QueryResultCache())
+        target = "Data:4:accessDecryptedData"
+        target_id = str(attack_simulation.attackgraph_instance.get_node_by_full_name(target).id)
+        queries = [
+            {"algorithm": "dijkstra", "target": target, "budget": None, "seed": None},
+            {"algorithm": "dijkstra", "target": target, "budget": 10, "seed": 3},
+            {"algorithm": "dijkstra", "target": target_id, "budget": None, "seed": 1},
+            {"algorithm": "random_path", "target": None, "budget": 20, "seed": 1},
+        ]
+
+        # Act
+        answers = [engine.answer(query) for query in queries]
+        expected = run_job_results(dict(job, queries=[{"algorithm": "dijkstra", "targets": [target]},
+                                                      {"algorithm": "random_path", "budgets": [20], "seeds": [1]}]))
+
+        # Assert
+        self.assertEqual(engine.cache.stats()["hits"], 2)
+        self.assertEqual(engine.cache.stats()["misses"], 2)
+        self.assertTrue(all(answer["visited"] == answers[0]["visited"] for answer in answers[:3]))
+        for answer, expected_result in zip((answers[0], answers[3]), expected):
+            self.assertEqual(answer["cost"], expected_result["cost"])
+            self.assertEqual(len(answer["visited"]), expected_result["visited"])
+        self.assertTrue(answers[0]["edges"])
+
+    @print_function_name
+    def test_query_server(self):
+        # Arrange
+        engine = query_server.QueryEngine.from_job(dict(cli.JOB_DEFAULTS))
+        server = query_server.QueryServer(engine, ("127.0.0.1", 0), workers=4)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        queries = [
+            {"algorithm": "dijkstra", "targets": ["Data:4:accessDecryptedData", "Unknown:1:step"]},
+            {"algorithm": "reachability", "budgets": [5, 20]},
+            {"algorithm": "random_path", "budgets": [30], "seeds": [1, 2]}
+        ]
+        request = urllib.request.Request(url + "/query", json.dumps({"queries": queries}).encode())
+
+        # Act
+        try:
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                responses = list(executor.map(lambda _: urllib.request.urlopen(request).read(), range(4)))
+            with urllib.request.urlopen(url + "/stats") as response:
+                stats = json.load(response)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Assert
+        expected = [engine.answer(query) for query in cli.expand_queries(queries)]
+        for response in responses:
+            results = [json.loads(line) for line in response.decode().splitlines()]
+            self.assertEqual(len(results), len(expected))
+            for result, expected_result in zip(results, expected):
+                self.assertEqual(result.get("cost"), expected_result.get("cost"))
+                self.assertEqual(result.get("visited"), expected_result.get("visited"))
+                self.assertEqual(result.get("error"), expected_result.get("error"))
+                self.assertGreaterEqual(result["latency"], 0)
+                self.assertGreaterEqual(result["queue_depth"], 0)
+        self.assertEqual(expected[0]["cost"], 53)
+        self.assertEqual(stats["completed"], 4 * len(expected))
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertIn("latency_p95", stats)
+
+
+class TestQueryCache(unittest.TestCase):
+
+    @print_function_name
+    def test_lru_and_size_eviction(self):
+        # Arrange
+        cache = query_cache.QueryResultCache(max_entries=3, max_size=10)
+
+        # Act
+        for i in range(3):
+            cache.put(("graph", i), i, size=2)
+        cache.get(("graph", 0))
+        cache.put(("graph", 3), 3, size=2)
+        cache.put(("graph", 4), 4, size=6)
+        cache.put(("graph", 5), 5, size=11)
+
+        # Assert
+        self.assertIsNone(cache.get(("graph", 1)))
+        self.assertIsNone(cache.get(("graph", 2)))
+        self.assertIsNone(cache.get(("graph", 5)))
+        self.assertEqual(cache.get(("graph", 0)), 0)
+        self.assertEqual(cache.get(("graph", 3)), 3)
+        self.assertEqual(cache.get(("graph", 4)), 4)
+        self.assertEqual(cache.stats()["size"], 10)
+        self.assertEqual(cache.stats()["evictions"], 2)
+        self.assertEqual(cache.stats()["hits"], 4)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+class TestShortestPath(unittest.TestCase):
+
+    def setUp(self):
+        # 0: start, 1-2: two branches, 3: 'and' node of both branches, 4: target,
+        # 5: 'and' node with a parent that is never reached, 6: a non viable node.
+        node_types = ['or', 'or', 'or', 'and', 'or', 'and', 'or']
+        costs = [0, 2, 3, 1, 1, 1, 1]
+        edges = [(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (1, 5), (6, 5), (0, 6)]
+        is_viable = [True, True, True, True, True, True, False]
+        self.graph = CompiledAttackGraph.from_edges(node_types, costs, edges, is_viable=is_viable)
+
+    @print_function_name
+    def test_and_node_cost_is_sum_of_parents(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0], and_cost='sum')
+
+        # Assert
+        self.assertEqual(result.cost[3], 2 + 3 + 1)
+        self.assertEqual(result.cost[4], 7)
+        self.assertEqual(result.came_from(4), {4: [3], 3: [1, 2], 1: [0], 2: [0]})
+
+    @print_function_name
+    def test_and_node_cost_is_max_of_parents(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0], and_cost='max')
+
+        # Assert
+        self.assertEqual(result.cost[3], 3 + 1)
+        self.assertEqual(result.cost[4], 5)
+
+    @print_function_name
+    def test_and_node_with_unreached_parent_is_not_reached(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0])
+
+        # Assert
+        self.assertFalse(result.is_reached(5))
+        self.assertFalse(result.is_reached(6))
+        self.assertEqual(result.cost[5], float('inf'))
+
+    @print_function_name
+    def test_budget_limits_the_settled_nodes(self):
+        # Arrange
+        # Diamonds with a cycle back to the start, the legacy bfs explores every path.
+        num_layers = 30
+        edges = [(0, 1), (0, 2)]
+        for layer in range(num_layers):
+            top, left, right, bottom = 3 * layer, 3 * layer + 1, 3 * layer + 2, 3 * layer + 3
+            edges += [(left, bottom), (right, bottom), (bottom, bottom + 1), (bottom, bottom + 2), (bottom, 0)]
+        num_nodes = 3 * num_layers + 3
+        graph = CompiledAttackGraph.from_edges(['or'] * num_nodes, [1] * num_nodes, edges)
+        unbounded = shortest_path.shortest_attack_paths(graph, [0])
+
+        # Act
+        result = shortest_path.shortest_attack_paths(graph, [0], budget=20)
+        _, bfs_visited, _ = traversal.bfs(graph, 0, 8)
+
+        # Assert
+        np.testing.assert_array_equal(result.settled, unbounded.cost <= 20)
+        self.assertFalse(result.is_complete)
+        self.assertEqual(result.expanded, int(np.count_nonzero(unbounded.cost <= 20)))
+        self.assertEqual(result.reached_by_cost().tolist(), sorted(np.flatnonzero(result.settled).tolist(), key=lambda i: unbounded.cost[i]))
+        self.assertGreater(len(bfs_visited), 2 * len(set(bfs_visited)))
+
+    @print_function_name
+    def test_budget_respects_and_nodes(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0], budget=5)
+
+        # Assert
+        self.assertEqual(np.flatnonzero(result.settled).tolist(), [0, 1, 2])
+        self.assertTrue(shortest_path.shortest_attack_paths(self.graph, [0], budget=6).is_reached(3))
+
+    @print_function_name
+    def test_search_state_is_reset_between_searches(self):
+        # Arrange
+        state = shortest_path.SearchState(shortest_path.SearchCore(self.graph))
+        queries = [
+            dict(sources=[0]), dict(sources=[0], budget=5), dict(sources=[0], and_cost='max'),
+            dict(sources=[1], target=4), dict(sources=[2]), dict(sources=[0], target=1)
+        ]
+
+        # Act
+        results = [shortest_path.shortest_attack_paths(self.graph, state=state, **query) for query in queries]
+
+        # Assert
+        for query, result in zip(queries, results):
+            expected = shortest_path.shortest_attack_paths(self.graph, **query)
+            self.assertEqual(result.costs_by_id(), expected.costs_by_id())
+            self.assertEqual(result.predecessor.tolist(), expected.predecessor.tolist())
+        self.assertEqual(sorted(state.touched), [0, 1, 2])
+        state.reset()
+        self.assertEqual(state.remaining, self.graph.necessary_parent_count.tolist())
+        self.assertTrue(all(cost == float('inf') for cost in state.cost))
+
+    @print_function_name
+    def test_result_over_touched_nodes_matches_full_arrays(self):
+        # Arrange
+        # A chain of 100 nodes, a budget of 3 touches the first 5.
+        num_nodes = 100
+        graph = CompiledAttackGraph.from_edges(['or'] * num_nodes, [1] * num_nodes, [(i, i + 1) for i in range(num_nodes - 1)])
+
+        # Act
+        result = shortest_path.shortest_attack_paths(graph, [0], budget=3)
+        full = shortest_path.ShortestPathResult(
+            graph, [0], result.cost, result.predecessor, result.settled, 'sum', None, result.expanded, 3
+        )
+
+        # Assert
+        self.assertEqual(result.touched.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(result.costs_by_id(), full.costs_by_id())
+        self.assertEqual(result.reached_by_cost().tolist(), full.reached_by_cost().tolist())
+        self.assertEqual(result.edges_relaxed(), full.edges_relaxed())
+        self.assertEqual([result.is_reached(i) for i in range(6)], [full.is_reached(i) for i in range(6)])
+        self.assertEqual([result.cost_of(i) for i in range(6)], [0, 1, 2, 3, float('inf'), float('inf')])
+        self.assertEqual(result.came_from(3), full.came_from(3))
+        self.assertEqual(result.cost_frontier().reachable(2).tolist(), [0, 1, 2])
+
+    @print_function_name
+    def test_fingerprint_covers_the_parent_lists(self):
+        # Arrange
+        # The 'and' node 2 has the children edges of 0 and 1, in the other graph it only lists 0 as a parent.
+        graph = CompiledAttackGraph.from_edges(['or', 'or', 'and'], [0, 1, 1], [(0, 1), (0, 2), (1, 2)])
+        arrays = dict((name, getattr(graph, name)) for name in CompiledAttackGraph.ARRAYS)
+        arrays.update(parent_offsets=np.array([0, 0, 1, 2]), parent_targets=np.array([0, 0], dtype=np.int32))
+        other_graph = CompiledAttackGraph(**arrays)
+
+        # Act
+        costs = shortest_path.shortest_attack_paths(graph, [0]).costs_by_id()
+        other_costs = shortest_path.shortest_attack_paths(other_graph, [0]).costs_by_id()
+
+        # Assert
+        self.assertNotEqual(costs, other_costs)
+        self.assertNotEqual(graph.fingerprint(), other_graph.fingerprint())
+
+    @print_function_name
+    def test_search_counters(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0])
+        stopped = shortest_path.shortest_attack_paths(self.graph, [0], target=1)
+
+        # Assert
+        self.assertEqual(result.expanded, 5)
+        self.assertEqual(result.edges_relaxed(), 7)
+        self.assertEqual((result.heap_pushes, result.heap_pops, result.peak_frontier), (5, 5, 2))
+        self.assertEqual(stopped.edges_relaxed(), 3)
+        self.assertEqual((stopped.heap_pushes, stopped.heap_pops), (3, 2))
+
+    @print_function_name
+    def test_iter_attack_paths_yields_settled_nodes(self):
+        # Arrange
+        result = shortest_path.shortest_attack_paths(self.graph, [0])
+
+        # Act
+        events = list(shortest_path.iter_attack_paths(self.graph, [0]))
+
+        # Assert
+        self.assertEqual([index for index, _, _ in events], result.reached_by_cost().tolist())
+        self.assertEqual([(cost, predecessor) for index, cost, predecessor in events],
+                         [(result.cost[index], result.predecessor[index]) for index, _, _ in events])
+
+    @print_function_name
+    def test_search_stops_at_target(self):
+        # Act
+        result = shortest_path.shortest_attack_paths(self.graph, [0], target=1)
+
+        # Assert
+        self.assertTrue(result.is_reached(1))
+        self.assertFalse(result.is_reached(4))
+
+    @print_function_name
+    def test_astar_heuristics_find_the_same_costs_with_fewer_expansions(self):
+        # Arrange
+        rng = np.random.default_rng(5)
+        num_nodes = 2000
+        edges = np.stack([rng.integers(0, num_nodes, 6000), rng.integers(0, num_nodes, 6000)], axis=1)
+        node_types = (rng.random(num_nodes) < 0.2).astype(np.int8)
+        graph = CompiledAttackGraph.from_edges(node_types, rng.integers(1, 10, num_nodes), edges)
+        dijkstra_result = shortest_path.shortest_attack_paths(graph, [0])
+        targets = rng.choice(np.flatnonzero(dijkstra_result.settled), 10, replace=False)
+        landmarks = heuristics.LandmarkHeuristic.build(graph, num_landmarks=4, seed=1)
+
+        for target in targets.tolist():
+            # Act
+            plain = shortest_path.shortest_attack_paths(graph, [0], target)
+            reverse = shortest_path.shortest_attack_paths(graph, [0], target, heuristic=heuristics.reverse_heuristic(graph, target))
+            landmark = shortest_path.shortest_attack_paths(graph, [0], target, heuristic=landmarks.for_target(target))
+
+            # Assert
+            self.assertEqual(reverse.cost[target], dijkstra_result.cost[target])
+            self.assertEqual(landmark.cost[target], dijkstra_result.cost[target])
+            self.assertLessEqual(reverse.expanded, plain.expanded)
+
+    @print_function_name
+    def test_landmark_tables_are_cached_per_graph(self):
+        # Arrange
+        graph = CompiledAttackGraph.from_edges(['or', 'or', 'or'], [0, 1, 2], [(0, 1), (1, 2)])
+        other_graph = CompiledAttackGraph.from_edges(['or', 'or', 'or'], [0, 1, 5], [(0, 1), (1, 2)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.json" + heuristics.LANDMARK_CACHE_SUFFIX)
+
+            # Act
+            built = heuristics.LandmarkHeuristic.load_or_build(graph, path, num_landmarks=2)
+            loaded = heuristics.LandmarkHeuristic.load_or_build(graph, path, num_landmarks=2)
+            rebuilt = heuristics.LandmarkHeuristic.load_or_build(other_graph, path, num_landmarks=2)
+
+            # Assert
+            np.testing.assert_array_equal(built.from_landmark, loaded.from_landmark)
+            self.assertEqual(loaded.fingerprint, graph.fingerprint())
+            self.assertEqual(rebuilt.fingerprint, other_graph.fingerprint())
+            self.assertEqual(heuristics.LandmarkHeuristic.load(path).fingerprint, other_graph.fingerprint())
+            self.assertEqual(built.for_target(2)[0], 3)
+
+
+class TestAttackHorizon(unittest.TestCase):
+
+    @print_function_name
+    def test_and_node_is_added_when_all_necessary_parents_are_compromised(self):
+        # Arrange
+        # 3 is an 'and' node with necessary parents 1 and 2 and the unnecessary parent 4.
+        graph = CompiledAttackGraph.from_edges(
+            ['or', 'or', 'or', 'and', 'or'], [0, 1, 1, 1, 1],
+            [(0, 1), (0, 2), (1, 3), (2, 3), (4, 3)],
+            is_necessary=[True, True, True, True, False]
+        )
+
+        # Act
+        horizon = traversal.AttackHorizon(graph, [0])
+        horizon_at_start = sorted(horizon)
+        added_1 = horizon.compromise(1)
+        added_2 = horizon.compromise(2)
+
+        # Assert
+        self.assertEqual(horizon_at_start, [1, 2])
+        self.assertEqual(added_1, [])
+        self.assertEqual(added_2, [3])
+        self.assertEqual(list(horizon), [3])
+
+class TestHelpFunctions(unittest.TestCase):
+
+    @print_function_name
+    def test_sample_costs_from_ttc_means(self):
+        # Arrange
+        ttcs = [
+            {'type': 'function', 'name': 'EasyAndCertain', 'arguments': []},
+            {'type': 'function', 'name': 'HardAndUncertain', 'arguments': []},
+            {'type': 'function', 'name': 'VeryHardAndCertain', 'arguments': []},
+            {'type': 'function', 'name': 'Exponential', 'arguments': [0.5]},
+            {'type': 'function', 'name': 'Enabled', 'arguments': []},
+            None,
+        ]
+        expected_means = [1, 0.5 * 10 + 0.5 * help_functions.TTC_MAX_COST, 100, 2, 0, 0]
+
+        # Act
+        costs = help_functions.sample_costs_from_ttc(ttcs, num_samples=200000, rng=np.random.default_rng(7))
+
+        # Assert
+        np.testing.assert_allclose(costs, expected_means, rtol=0.02)
+
+    @print_function_name
+    def test_sample_costs_from_ttc_is_reproducible(self):
+        # Arrange
+        ttcs = [{'type': 'function', 'name': 'EasyAndUncertain', 'arguments': []}] * 10
+
+        # Act
+        costs_1 = help_functions.sample_costs_from_ttc(ttcs, rng=3)
+        costs_2 = help_functions.sample_costs_from_ttc(ttcs, rng=3)
+
+        # Assert
+        np.testing.assert_array_equal(costs_1, costs_2)
+        self.assertEqual(len(set(costs_1.tolist())), len(ttcs))
+
+    @print_function_name
+    def test_load_costs_from_file_raises_on_missing_or_invalid_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Arrange
+            invalid_file = os.path.join(directory, "invalid.json")
+            with open(invalid_file, 'w') as file:
+                file.write("{not json")
+
+            # Act and Assert
+            self.assertRaises(FileNotFoundError, help_functions.load_costs_from_file, os.path.join(directory, "missing.json"))
+            self.assertRaises(ValueError, help_functions.load_costs_from_file, invalid_file)
+
 if __name__ == '__main__':
     unittest.main()
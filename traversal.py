@@ -0,0 +1,205 @@
+from collections import deque
+import random
+
+class AttackHorizon:
+    """
+    The attack surface of an attacker on a compiled graph, maintained incrementally.
+
+    Compromising a node removes it from the horizon and adds only its children that it
+    enables: 'or' children directly and 'and' children once all of their necessary parents
+    are compromised, which is tracked with a counter of compromised necessary parents per
+    'and' node. Nodes that are not listed as parents of a child, e.g. the attacker node of
+    its entry points, do not count. The horizon is kept in a list with a position index, so adding, removing
+    and selecting a uniformly random node are O(1). All state is proportional to the nodes
+    touched, not to the graph size.
+    """
+
+    def __init__(self, graph, compromised=()):
+        """
+        Parameters:
+        - graph: The CompiledAttackGraph.
+        - compromised: The indices of the nodes that are compromised from the start.
+        """
+        self.graph = graph
+        self.compromised = set()
+        self.nodes = []
+        self._position = {}
+        self._satisfied = {}
+        for index in compromised:
+            self.compromise(index)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, index):
+        return index in self._position
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def add(self, index):
+        """
+        Add a node to the horizon, if it is not already in it.
+        """
+        if index not in self._position:
+            self._position[index] = len(self.nodes)
+            self.nodes.append(index)
+
+    def remove(self, index):
+        """
+        Remove a node from the horizon, if it is in it.
+        """
+        position = self._position.pop(index, None)
+        if position is None:
+            return
+        last = self.nodes.pop()
+        if last != index:
+            self.nodes[position] = last
+            self._position[last] = position
+
+    def choice(self, rng=random):
+        """
+        Select a uniformly random node of the horizon.
+
+        Parameters:
+        - rng: A random.Random instance, or the random module.
+        """
+        return self.nodes[rng.randrange(len(self.nodes))]
+
+    def compromise(self, index):
+        """
+        Compromise a node and update the horizon.
+
+        Parameters:
+        - index: The index of the node.
+
+        Returns:
+        - added: The indices of the nodes added to the horizon.
+        """
+        if index in self.compromised:
+            return []
+        self.compromised.add(index)
+        self.remove(index)
+
+        graph = self.graph
+        is_traversable = graph.is_traversable
+        is_necessary = bool(graph.is_necessary[index])
+        unlisted = graph.unlisted_children().get(index, ())
+        added = []
+        for child in graph.children(index):
+            if child in self.compromised or not is_traversable[child]:
+                continue
+            if graph.is_gated[child]:
+                if not is_necessary or child in unlisted:
+                    continue
+                satisfied = self._satisfied.get(child, 0) + 1
+                self._satisfied[child] = satisfied
+                if satisfied < graph.necessary_parent_count[child]:
+                    continue
+            if child not in self._position:
+                self.add(child)
+                added.append(child)
+        return added
+
+def iter_random_path(graph, start, budget=None, target=None, rng=random):
+    """
+    Generate a random attack path from the start node on a compiled graph, see
+    AttackSimulation.random_path, and yield every node when it is compromised.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - start: The index of the start node.
+    - budget: The attacker cost budget, or None.
+    - target: The index of the target node, or None.
+    - rng: A random.Random instance used to select the nodes.
+
+    Returns:
+    - events: A generator of (index, cost, parent) tuples with the total cost of the path
+      so far, the first is (start, 0, -1).
+    """
+    horizon = AttackHorizon(graph, [start])
+    costs = graph.cost
+    cost = 0
+    yield start, cost, -1
+    while horizon:
+        node = horizon.choice(rng)
+
+        # Check if the cost is within cost budget (if the cost budget was specified).
+        if budget is not None and cost + costs[node] > budget:
+            break
+
+        # Find a parent node and update path.
+        parent = start
+        for parent_index in graph.parents(node):
+            if parent_index in horizon.compromised:
+                parent = parent_index
+                break
+        horizon.compromise(node)
+        cost += float(costs[node])
+        yield node, cost, parent
+
+        # Check if the target node was selected (if the target node was specified).
+        if node == target:
+            break
+
+def random_path(graph, start, budget=None, target=None, rng=random):
+    """
+    Generate a random attack path from the start node on a compiled graph, see
+    iter_random_path.
+
+    Returns:
+    - cost: The total cost of the random path.
+    - visited: The indices of the visited nodes in the order they were compromised.
+    - edges: The (parent, child) index pairs of the path.
+    """
+    visited = []
+    edges = []
+    cost = 0
+    for node, cost, parent in iter_random_path(graph, start, budget, target, rng):
+        visited.append(node)
+        if parent >= 0:
+            edges.append((parent, node))
+    return cost, visited, edges
+
+def iter_bfs(graph, start, budget):
+    """
+    Perform the Breadth-First Search of AttackSimulation.bfs on a compiled graph, and yield
+    every node when it is explored. A node is explored again for every path that reaches it.
+
+    Parameters:
+    - graph: The CompiledAttackGraph.
+    - start: The index of the start node.
+    - budget: The attacker cost budget.
+
+    Returns:
+    - events: A generator of (index, cost, parent) tuples with the cost of the path the node
+      was explored on, the first is (start, 0, -1).
+    """
+    queue = deque([(start, 0)])
+    costs = graph.cost
+    yield start, 0, -1
+    while queue:
+        node, cost = queue.popleft()
+        for child in graph.children(node):
+            next_cost = cost + float(costs[child])
+            if next_cost <= budget:
+                queue.append((child, next_cost))
+                yield child, next_cost, node
+
+def bfs(graph, start, budget):
+    """
+    Perform the Breadth-First Search of AttackSimulation.bfs on a compiled graph, see iter_bfs.
+
+    Returns:
+    - cost: The cost of the last explored path.
+    - visited: The indices of the visited nodes.
+    - edges: The (parent, child) index pairs of the explored paths.
+    """
+    visited = []
+    edges = []
+    cost = 0
+    for node, cost, parent in iter_bfs(graph, start, budget):
+        visited.append(node)
+        if parent >= 0:
+            edges.append((parent, node))
+    return cost, visited, edges